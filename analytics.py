@@ -0,0 +1,267 @@
+"""Statistiques de ventes pour le tableau de bord : agrégats journaliers tenus à jour à chaque commande.
+
+Les panneaux (meilleures ventes, chiffre d'affaires par jour, alertes de stock) ne lisent que les
+tables daily_sales et product_daily_sales : leur coût dépend de la période affichée, pas du nombre
+de commandes. Usage : python analytics.py   (recalcule les agrégats depuis orders/order_items)
+"""
+import csv
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from database import SessionLocal
+from models import DailySales, Product, ProductDailySales
+
+ANALYTICS_WINDOW_DAYS = int(os.getenv("ANALYTICS_WINDOW_DAYS", "30"))
+TOP_SELLERS_LIMIT = 10
+# Vitesse de vente mesurée sur cette période ; alerte si le stock couvre moins de LOW_STOCK_DAYS jours.
+LOW_STOCK_VELOCITY_DAYS = int(os.getenv("LOW_STOCK_VELOCITY_DAYS", "14"))
+LOW_STOCK_DAYS = float(os.getenv("LOW_STOCK_DAYS", "7"))
+LOW_STOCK_LIMIT = 20
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024  # Taille des morceaux envoyés au client
+
+UPSERT_DAILY_SQL = text(
+    "INSERT INTO daily_sales (day, order_count, units, revenue_cents) VALUES (:day, :order_count, :units, :revenue_cents) "
+    "ON CONFLICT (day) DO UPDATE SET order_count = daily_sales.order_count + excluded.order_count, "
+    "units = daily_sales.units + excluded.units, revenue_cents = daily_sales.revenue_cents + excluded.revenue_cents"
+)
+UPSERT_PRODUCT_DAILY_SQL = text(
+    "INSERT INTO product_daily_sales (day, product_id, units, revenue_cents) VALUES (:day, :product_id, :units, :revenue_cents) "
+    "ON CONFLICT (day, product_id) DO UPDATE SET units = product_daily_sales.units + excluded.units, "
+    "revenue_cents = product_daily_sales.revenue_cents + excluded.revenue_cents"
+)
+
+# Historique antérieur aux agrégats : seules les commandes enregistrées (clients connectés) sont connues.
+REBUILD_SQL = [
+    text("DELETE FROM daily_sales"),
+    text("DELETE FROM product_daily_sales"),
+    text(
+        "INSERT INTO product_daily_sales (day, product_id, units, revenue_cents) "
+        "SELECT date(orders.created_at), order_items.product_id, sum(order_items.quantity), "
+        "sum(CAST(round(order_items.price_at_purchase * 100) AS INTEGER) * order_items.quantity) "
+        "FROM order_items JOIN orders ON orders.id = order_items.order_id "
+        "WHERE order_items.product_id IS NOT NULL GROUP BY 1, 2"
+    ),
+    text(
+        "INSERT INTO daily_sales (day, order_count, units, revenue_cents) "
+        "SELECT date(orders.created_at), count(*), sum(lines.units), sum(lines.revenue_cents) FROM orders "
+        "JOIN (SELECT order_id, sum(quantity) AS units, "
+        "sum(CAST(round(price_at_purchase * 100) AS INTEGER) * quantity) AS revenue_cents "
+        "FROM order_items GROUP BY order_id) AS lines ON lines.order_id = orders.id GROUP BY 1"
+    ),
+]
+
+
+@dataclass(frozen=True)
+class DayRevenue:
+    day: date
+    order_count: int
+    units: int
+    revenue: float
+
+
+@dataclass(frozen=True)
+class TopSeller:
+    product_id: int
+    name: str
+    units: int
+    revenue: float
+
+
+@dataclass(frozen=True)
+class StockAlert:
+    product_id: int
+    name: str
+    stock: int
+    daily_units: float
+    days_left: float
+
+
+def today():
+    # Même fuseau que Order.created_at (UTC)
+    return datetime.utcnow().date()
+
+
+def record_sales(db, orders, day=None):
+    """Ajoute des commandes aux agrégats, dans la transaction de l'appelant.
+
+    `orders` : une liste de lignes [(product_id, quantité, prix unitaire en centimes), ...] par commande.
+    Les lignes sont regroupées par produit avant l'écriture : une requête par table et par lot.
+    """
+    orders = [lines for lines in orders if lines]
+    if not orders:
+        return
+    day = (day or today()).isoformat()
+    products = {}
+    for lines in orders:
+        for product_id, quantity, unit_amount in lines:
+            units, revenue = products.get(product_id, (0, 0))
+            products[product_id] = (units + quantity, revenue + quantity * unit_amount)
+    db.execute(UPSERT_DAILY_SQL, {
+        "day": day,
+        "order_count": len(orders),
+        "units": sum(units for units, _ in products.values()),
+        "revenue_cents": sum(revenue for _, revenue in products.values()),
+    })
+    db.execute(UPSERT_PRODUCT_DAILY_SQL, [
+        {"day": day, "product_id": product_id, "units": units, "revenue_cents": revenue}
+        for product_id, (units, revenue) in sorted(products.items())
+    ])
+
+
+def revenue_by_day(db, days=ANALYTICS_WINDOW_DAYS):
+    """Chiffre d'affaires des `days` derniers jours, jours sans vente compris (du plus ancien au plus récent)."""
+    end = today()
+    start = end - timedelta(days=days - 1)
+    rows = {row.day: row for row in db.scalars(select(DailySales).where(DailySales.day >= start))}
+    result = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        result.append(DayRevenue(day, row.order_count, row.units, row.revenue_cents / 100) if row else DayRevenue(day, 0, 0, 0.0))
+    return result
+
+
+def top_sellers(db, days=ANALYTICS_WINDOW_DAYS, limit=TOP_SELLERS_LIMIT):
+    since = today() - timedelta(days=days - 1)
+    units = func.sum(ProductDailySales.units).label("units")
+    # Classement sur les seuls agrégats ; les noms ne sont joints que pour les `limit` premiers.
+    ranked = (
+        select(ProductDailySales.product_id, units, func.sum(ProductDailySales.revenue_cents).label("revenue_cents"))
+        .where(ProductDailySales.day >= since)
+        .group_by(ProductDailySales.product_id)
+        .order_by(units.desc(), ProductDailySales.product_id)
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.product_id, Product.name, ranked.c.units, ranked.c.revenue_cents)
+        .join(Product, Product.id == ranked.c.product_id)
+        .order_by(ranked.c.units.desc(), ranked.c.product_id)
+    ).all()
+    return [TopSeller(product_id, name, units, revenue / 100) for product_id, name, units, revenue in rows]
+
+
+def low_stock_alerts(db, velocity_days=LOW_STOCK_VELOCITY_DAYS, horizon_days=LOW_STOCK_DAYS, limit=LOW_STOCK_LIMIT):
+    """Produits dont le stock sera épuisé avant `horizon_days` au rythme de vente récent, les plus urgents d'abord."""
+    since = today() - timedelta(days=velocity_days - 1)
+    sold = (
+        select(ProductDailySales.product_id, func.sum(ProductDailySales.units).label("units"))
+        .where(ProductDailySales.day >= since)
+        .group_by(ProductDailySales.product_id)
+        .subquery()
+    )
+    daily_units = sold.c.units * 1.0 / velocity_days
+    rows = db.execute(
+        select(Product.id, Product.name, Product.stock, daily_units)
+        .join(sold, sold.c.product_id == Product.id)
+        .where(Product.stock < daily_units * horizon_days)
+        .order_by(Product.stock / daily_units, Product.id)
+        .limit(limit)
+    ).all()
+    return [
+        StockAlert(product_id, name, stock or 0, round(velocity, 2), round((stock or 0) / velocity, 1))
+        for product_id, name, stock, velocity in rows
+    ]
+
+
+def dashboard(db):
+    """Panneaux du tableau de bord administrateur."""
+    revenue = revenue_by_day(db)
+    return {
+        "days": ANALYTICS_WINDOW_DAYS,
+        "revenue": revenue,
+        "revenue_total": round(sum(day.revenue for day in revenue), 2),
+        "revenue_max": max((day.revenue for day in revenue), default=0),
+        "orders_total": sum(day.order_count for day in revenue),
+        "top_sellers": top_sellers(db),
+        "low_stock": low_stock_alerts(db),
+    }
+
+
+def export_rows(kind, days=None):
+    """Lignes d'export (dict) lues par lots depuis une session dédiée ; `days=None` : tout l'historique."""
+    since = today() - timedelta(days=days - 1) if days else date.min
+    if kind == "daily":
+        statement = (
+            select(DailySales.day, DailySales.order_count, DailySales.units,
+                   (DailySales.revenue_cents / 100.0).label("revenue"))
+            .where(DailySales.day >= since)
+            .order_by(DailySales.day)
+        )
+    elif kind == "products":
+        statement = (
+            select(ProductDailySales.day, ProductDailySales.product_id, Product.name, ProductDailySales.units,
+                   (ProductDailySales.revenue_cents / 100.0).label("revenue"))
+            .outerjoin(Product, Product.id == ProductDailySales.product_id)
+            .where(ProductDailySales.day >= since)
+            .order_by(ProductDailySales.day, ProductDailySales.product_id)
+        )
+    else:
+        raise ValueError("Export inconnu")
+
+    def rows():
+        with SessionLocal() as db:
+            for row in db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+                yield {**row._asdict(), "day": row.day.isoformat()}
+
+    return rows()
+
+
+def chunked(parts):
+    """Regroupe de petites chaînes en morceaux d'environ EXPORT_CHUNK_SIZE caractères."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_csv(rows):
+    def lines():
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    return chunked(lines())
+
+
+def stream_json(rows):
+    def parts():
+        yield "["
+        separator = ""
+        for row in rows:
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ","
+        yield "]"
+
+    return chunked(parts())
+
+
+def rebuild(db):
+    """Recalcule les agrégats depuis orders/order_items (historique antérieur, réparation)."""
+    for statement in REBUILD_SQL:
+        db.execute(statement)
+    db.commit()
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        rebuild(db)
+        print(f"✅ Agrégats de ventes recalculés ({db.scalar(select(func.count()).select_from(DailySales))} jours).")
@@ -1,12 +1,106 @@
-from passlib.context import CryptContext
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 
-# Utilisation de pbkdf2_sha256 qui est plus stable et ne nécessite pas d'outils de compilation complexe
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Nombre d'itérations pbkdf2 ; s'il change, les anciens hachages sont recalculés à la connexion.
+PBKDF2_ROUNDS = os.getenv("PBKDF2_ROUNDS")
+# Hachages exécutés en parallèle au maximum, et nombre de demandes autorisées à patienter.
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_HASH_MAX_QUEUE = int(os.getenv("AUTH_HASH_MAX_QUEUE", "64"))
+
+
+@cache
+def pwd_context():
+    """Contexte passlib, construit au premier hachage : les requêtes sans mot de passe ne paient pas son import."""
+    from passlib.context import CryptContext
+
+    # Utilisation de pbkdf2_sha256 qui est plus stable et ne nécessite pas d'outils de compilation complexe
+    options = {"pbkdf2_sha256__rounds": int(PBKDF2_ROUNDS)} if PBKDF2_ROUNDS else {}
+    return CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto", **options)
+
+
+class AuthBusyError(Exception):
+    """Trop de hachages en attente : la demande est refusée plutôt que mise en file."""
+
+
+class HashPool:
+    """Pool de threads borné pour les calculs pbkdf2, avec compteurs de file d'attente."""
+
+    def __init__(self, workers=AUTH_HASH_WORKERS, max_queue=AUTH_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Création paresseuse : les scripts qui n'utilisent que les fonctions synchrones n'ouvrent aucun thread.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth-hash")
+        return self._executor
+
+    def _call(self, fn, args):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.max_queue and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise AuthBusyError("File d'attente d'authentification pleine")
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._call, fn, args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+hash_pool = HashPool()
 
 def verify_password(plain_password, hashed_password):
     """Vérifie un mot de passe en clair par rapport à sa version hachée."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Hache un mot de passe."""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context().hash(password)
+
+def verify_and_update(plain_password, hashed_password):
+    """Vérifie le mot de passe et renvoie (valide, nouveau_hachage ou None si inchangé)."""
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+async def verify_password_async(plain_password, hashed_password):
+    """Comme verify_password, sans bloquer la boucle d'événements."""
+    return await hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Comme get_password_hash, sans bloquer la boucle d'événements."""
+    return await hash_pool.run(get_password_hash, password)
+
+async def verify_and_update_async(plain_password, hashed_password):
+    """Comme verify_and_update, sans bloquer la boucle d'événements."""
+    return await hash_pool.run(verify_and_update, plain_password, hashed_password)
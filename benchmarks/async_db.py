@@ -0,0 +1,95 @@
+"""Concurrence sur un seul worker : session synchrone dans la boucle vs AsyncSession.
+
+Usage : python -m benchmarks.async_db [--requests 50] [--concurrency 10]
+
+Chaque "requête" exécute une lecture lente. Avec l'ancien chemin (session synchrone appelée
+depuis un handler `async def`), la boucle d'événements est bloquée pendant chaque requête ;
+on mesure ce blocage avec une sonde qui se réveille toutes les 5 ms.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.mixed_load import percentile
+from database import Base, create_app_engine, create_async_app_engine
+
+# Lecture volontairement coûteuse (~quelques dizaines de ms) pour simuler une requête lente.
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c"
+)
+PROBE_INTERVAL = 0.005
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def run_path(name, handler, requests, concurrency):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    print(
+        f"{name:>6} : {requests / elapsed:7.1f} req/s  latence p50 {percentile(latencies, 50):.1f} ms  "
+        f"p99 {percentile(latencies, 99):.1f} ms  blocage boucle p99 {percentile(lags, 99):.1f} ms  "
+        f"max {max(lags, default=0):.1f} ms"
+    )
+
+
+async def main_async(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_app_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    async_engine = create_async_app_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSession = async_sessionmaker(bind=async_engine)
+    params = {"n": args.rows}
+
+    async def sync_handler():
+        # Ancien chemin : appel synchrone direct depuis la coroutine.
+        with Session() as db:
+            db.execute(SLOW_QUERY, params).scalar()
+
+    async def async_handler():
+        async with AsyncSession() as db:
+            (await db.execute(SLOW_QUERY, params)).scalar()
+
+    await run_path("sync", sync_handler, args.requests, args.concurrency)
+    await run_path("async", async_handler, args.requests, args.concurrency)
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=300000, help="taille de la lecture lente")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
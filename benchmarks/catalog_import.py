@@ -0,0 +1,137 @@
+"""Import, réimport et export d'un gros catalogue avec catalog_io.py ; débit et mémoire.
+
+Usage : python -m benchmarks.catalog_import [--rows 1000000] [--legacy-rows 20000] [--batch-size 5000] [--trace-memory]
+
+Le mode "legacy" reproduit create_products.py (un SELECT par nom puis un INSERT ou une mise à jour
+ORM) et reset_stock.py (chargement de tous les produits) sur un échantillon ; catalog_io fait des
+upserts par lots et un UPDATE ensembliste. Avec --trace-memory (tracemalloc, qui ralentit les
+mesures), le pic de mémoire Python doit être le même pour l'échantillon et pour le fichier complet ;
+la mémoire du processus (ru_maxrss) inclut en plus le cache de pages de SQLite, borné par
+SQLITE_CACHE_SIZE (le mmap est désactivé ici).
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("SQLITE_MMAP_SIZE", "0")
+
+from sqlalchemy import delete  # noqa: E402
+
+import catalog_io  # noqa: E402
+import migrations  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from models import Product  # noqa: E402
+from search import search_index  # noqa: E402
+
+WORDS = ["huile", "shampoing", "masque", "sérum", "crème", "baume", "karité", "coco", "argan", "ricin",
+         "boucles", "crépus", "nourrissant", "hydratant", "réparateur", "éclat", "brillance", "volume"]
+
+
+def write_catalog(path, rows, seed=42):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as stream:
+        writer = csv.writer(stream)
+        writer.writerow(["sku", "name", "price", "image", "message", "stock"])
+        for i in range(rows):
+            words = " ".join(rng.sample(WORDS, 3))
+            writer.writerow([f"SKU-{i:07d}", f"{words.capitalize()} {i}", round(rng.uniform(2, 80), 2),
+                             "bench.webp", f"Produit de test : {words}", rng.randrange(0, 100)])
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_import(db, path):
+    with open(path, newline="", encoding="utf-8") as stream:
+        for row in csv.DictReader(stream):
+            existing = db.query(Product).filter(Product.name == row["name"]).first()
+            if not existing:
+                db.add(Product(name=row["name"], price=float(row["price"]), image=row["image"],
+                               message=row["message"], stock=50))
+            else:
+                existing.image = row["image"]
+                existing.price = float(row["price"])
+    db.commit()
+
+
+def legacy_reset_stock(db):
+    for product in db.query(Product).all():
+        product.stock = 50
+    db.commit()
+
+
+def timed(label, rows, fn, trace_memory=False):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    memory = f"processus {max_rss_mb():4.0f} Mo"
+    if trace_memory:
+        memory = f"pic Python {tracemalloc.get_traced_memory()[1] / 1024 / 1024:6.1f} Mo | {memory}"
+        tracemalloc.stop()
+    print(f"[{label:<31}] {rows:>8} lignes en {elapsed:6.1f} s ({rows / elapsed:8.0f} lignes/s) | {memory}")
+
+
+def import_file(path, batch_size):
+    with SessionLocal() as db, open(path, newline="", encoding="utf-8") as stream:
+        report = catalog_io.import_products(db, catalog_io.read_rows(stream, "csv"), batch_size=batch_size)
+    assert report.upserted == report.read, report.errors
+
+
+def export_file(path):
+    with SessionLocal() as db, open(path, "w", newline="", encoding="utf-8") as stream:
+        catalog_io.write_rows(catalog_io.export_products(db), stream, "csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=catalog_io.IMPORT_BATCH_SIZE)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+    trace = args.trace_memory
+
+    migrations.upgrade(engine, log=lambda message: None)
+    search_index.configure(engine)
+    workdir = tempfile.mkdtemp()
+    sample, full = os.path.join(workdir, "sample.csv"), os.path.join(workdir, "full.csv")
+    write_catalog(sample, args.legacy_rows)
+    write_catalog(full, args.rows)
+
+    def legacy():
+        with SessionLocal() as db:
+            legacy_import(db, sample)
+
+    def legacy_stock():
+        with SessionLocal() as db:
+            legacy_reset_stock(db)
+
+    timed("legacy : import", args.legacy_rows, legacy, trace)
+    timed("legacy : stock à 50", args.legacy_rows, legacy_stock, trace)
+    with SessionLocal() as db:
+        db.execute(delete(Product))
+        db.commit()
+
+    timed("catalog_io : import échantillon", args.legacy_rows, lambda: import_file(sample, args.batch_size), trace)
+    timed("catalog_io : import", args.rows, lambda: import_file(full, args.batch_size), trace)
+    timed("catalog_io : réimport (màj)", args.rows, lambda: import_file(full, args.batch_size), trace)
+
+    def set_stock():
+        with SessionLocal() as db:
+            catalog_io.adjust_stock(db, set_to=50)
+
+    timed("catalog_io : stock à 50", args.rows, set_stock, trace)
+    timed("catalog_io : export", args.rows, lambda: export_file(os.path.join(workdir, "export.csv")), trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Temps de réponse du catalogue selon la profondeur de page, sur 100 000 produits.
+
+Usage : python -m benchmarks.catalog_pages [--products 100000] [--pages 1,10,100,1000,4000] [--repeat 20]
+
+Compare la pagination par OFFSET (temps croissant avec le numéro de page) à la pagination
+par clé de catalog_query.py (temps constant), pour chaque tri proposé.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+import catalog_query
+from catalog_query import SORTS, CatalogQuery
+from database import Base, create_app_engine
+from models import Product
+
+
+def seed(Session, product_count):
+    rng = random.Random(42)
+    with Session() as db:
+        for start in range(0, product_count, 10000):
+            db.execute(Product.__table__.insert(), [
+                {"name": f"Produit {rng.randrange(10 ** 6):06d}", "price": round(rng.uniform(2, 80), 2),
+                 "image": "bench.webp", "message": "Produit de test", "stock": rng.randrange(0, 5),
+                 "rating_avg": round(rng.uniform(0, 5), 1)}
+                for _ in range(start, min(start + 10000, product_count))
+            ])
+        db.commit()
+
+
+def offset_page(db, query, page_number):
+    column, descending = SORTS[query.sort]
+    order = (column.desc(), Product.id.desc()) if descending else (column, Product.id)
+    statement = select(Product).order_by(*order).offset((page_number - 1) * query.limit).limit(query.limit)
+    return db.scalars(statement).all()
+
+
+def cursors_for(db, query, pages):
+    """Parcourt le catalogue une fois pour connaître le curseur de chaque page mesurée."""
+    cursors = {1: None}
+    after = None
+    for page_number in range(2, max(pages) + 1):
+        after = catalog_query.fetch_page(db, CatalogQuery(sort=query.sort, after=after, limit=query.limit)).next_after
+        if after is None:
+            break
+        cursors[page_number] = after
+    return cursors
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--pages", default="1,10,100,1000,4000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    pages = [int(p) for p in args.pages.split(",")]
+
+    engine = create_app_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    started = time.perf_counter()
+    seed(Session, args.products)
+    print(f"{args.products} produits insérés en {time.perf_counter() - started:.1f} s")
+
+    with Session() as db:
+        for sort in SORTS:
+            query = CatalogQuery(sort=sort)
+            cursors = cursors_for(db, query, pages)
+            for page_number in pages:
+                if page_number not in cursors:
+                    continue
+                keyset = CatalogQuery(sort=sort, after=cursors[page_number])
+                keyset_ms = timed(lambda: catalog_query.fetch_page(db, keyset), args.repeat)
+                offset_ms = timed(lambda: offset_page(db, query, page_number), args.repeat)
+                print(f"[{sort:<10}] page {page_number:>5} : clé {keyset_ms:6.2f} ms | offset {offset_ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Messages traités par seconde : chaîne if/elif historique contre matcher compilé de chatbot.py.
+
+Usage : python -m benchmarks.chat_matcher [--messages 20000] [--extra-intents 0,50,200]
+
+La chaîne historique teste chaque mot-clé l'un après l'autre ; son coût croît avec le nombre
+d'intentions, alors que l'alternation compilée parcourt le message une seule fois. Des
+intentions fictives sont ajoutées pour simuler un fichier de configuration plus fourni.
+"""
+import argparse
+import json
+import random
+import time
+
+from chatbot import CHAT_INTENTS_PATH, IntentMatcher, normalize
+
+MESSAGES = [
+    "Bonjour, je voudrais des informations",
+    "Quels sont les délais de livraison pour Lyon ?",
+    "Comment faire un retour sur ma commande ?",
+    "Puis-je payer en plusieurs fois ?",
+    "Vous avez quoi comme produit pour cheveux secs ?",
+    "Je n'arrive pas à vous joindre par mail",
+    "Est-ce que le masque est encore disponible ?",
+    "Il fait beau aujourd'hui, non ?",
+    "Ma commande n'est toujours pas arrivée, que faire ?",
+    "Auriez-vous une recommandation pour des boucles définies et hydratées sans frisottis ?",
+]
+
+
+def load_config(extra_intents, rng):
+    with open(CHAT_INTENTS_PATH, encoding="utf-8") as f:
+        config = json.load(f)
+    # Les intentions fictives sont placées avant les vraies, comme une FAQ qui s'allonge.
+    fake = [
+        {"name": f"faq_{i}", "keywords": [f"motcle{i}x{k}" for k in range(4)], "response": f"Réponse {i}"}
+        for i in range(extra_intents)
+    ]
+    config["intents"] = fake + [i for i in config["intents"] if not i.get("product_lookup")]
+    return config
+
+
+def legacy_chain(config):
+    """Équivalent de l'ancien chat_endpoint : lower() puis `in` sur chaque mot-clé, dans l'ordre."""
+    chain = [(intent["keywords"], intent["response"]) for intent in config["intents"]]
+    fallback = config["fallback"]
+
+    def answer(message):
+        user_message = message.lower()
+        for keywords, response in chain:
+            for keyword in keywords:
+                if keyword in user_message:
+                    return response
+        return fallback
+    return answer
+
+
+def compiled_matcher(config):
+    matcher = IntentMatcher.from_config(config)
+
+    def answer(message):
+        intents = matcher.match(normalize(message))
+        return intents[0].response if intents else matcher.fallback
+    return answer
+
+
+def throughput(answer, messages):
+    started = time.perf_counter()
+    for message in messages:
+        answer(message)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--extra-intents", default="0,50,200")
+    args = parser.parse_args()
+    rng = random.Random(42)
+    messages = [rng.choice(MESSAGES) for _ in range(args.messages)]
+
+    for extra in (int(n) for n in args.extra_intents.split(",")):
+        config = load_config(extra, rng)
+        keywords = sum(len(i["keywords"]) for i in config["intents"])
+        legacy = throughput(legacy_chain(config), messages)
+        compiled = throughput(compiled_matcher(config), messages)
+        print(f"{len(config['intents']):>4} intentions / {keywords:>4} mots-clés : "
+              f"if/elif {legacy:10,.0f} msg/s | compilé {compiled:10,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
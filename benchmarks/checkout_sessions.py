@@ -0,0 +1,111 @@
+"""Création de sessions de paiement contre fake_stripe.py : débit et latence de l'accueil en parallèle.
+
+Usage : python -m benchmarks.checkout_sessions [--checkouts 40] [--latency 0.2] [--failure-rate 0.05]
+
+Compare l'appel synchrone historique (stripe.checkout.Session.create dans le handler async, qui
+bloque la boucle d'événements) au client asynchrone de payments.py. Chaque acheteur double-clique :
+la clé d'idempotence doit ramener les deux clics à une seule session.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+os.environ.setdefault("STRIPE_API_BASE", "http://127.0.0.1:12111")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # Tous les clients virtuels partagent 127.0.0.1
+
+import httpx  # noqa: E402
+import stripe  # noqa: E402
+
+import fake_stripe  # noqa: E402
+import main  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import Product  # noqa: E402
+from payments import PaymentClient  # noqa: E402
+
+
+def seed():
+    with SessionLocal() as db:
+        if not db.query(Product).first():
+            db.add_all(Product(name=f"Produit {i}", price=10.0 + i, image="bench.webp", stock=50) for i in range(20))
+            db.commit()
+
+
+class BlockingPayments(PaymentClient):
+    """Ancien comportement : appel Stripe synchrone, sans délai ni clé d'idempotence."""
+
+    async def create_checkout_session(self, owner, lines, success_url, cancel_url, metadata=None):
+        return stripe.checkout.Session.create(
+            api_key=self.api_key,
+            payment_method_types=["card"],
+            line_items=self.line_items(lines),
+            mode="payment",
+            success_url=success_url,
+            cancel_url=cancel_url,
+        )
+
+
+async def buyer(transport, index, durations):
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Le visiteur a déjà un panier (donc un cookie de session) avant d'acheter.
+        await client.post("/add-to-cart", data={"product_id": str(index % 20 + 1)})
+        started = time.perf_counter()
+        clicks = [
+            client.post("/create-checkout-session", data={"product_id": str(index % 20 + 1), "quantity": "1"})
+            for _ in range(2)
+        ]
+        responses = await asyncio.gather(*clicks)
+        durations.append(time.perf_counter() - started)
+        return {r.headers.get("location") for r in responses}
+
+
+async def browser(transport, stop, latencies):
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await client.get("/")
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+
+async def run(mode, checkouts):
+    main.payments = BlockingPayments() if mode == "blocking" else PaymentClient()
+    transport = httpx.ASGITransport(app=main.app)
+    stop, latencies, durations = asyncio.Event(), [], []
+    browsing = asyncio.create_task(browser(transport, stop, latencies))
+    started = time.perf_counter()
+    sessions = await asyncio.gather(*(buyer(transport, i, durations) for i in range(checkouts)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await browsing
+    duplicated = sum(len(urls) > 1 for urls in sessions)
+    print(f"[{mode:<8}] {checkouts / elapsed:6.1f} achats/s | GET / p50 {percentile(latencies, 50):7.1f} ms "
+          f"p99 {percentile(latencies, 99):7.1f} ms | doubles clics en 2 sessions : {duplicated}/{checkouts}")
+
+
+async def run_all(checkouts):
+    # Une seule boucle d'événements : le pool du moteur asynchrone y est rattaché.
+    for mode in ("blocking", "async"):
+        await run(mode, checkouts)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkouts", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    args = parser.parse_args()
+    port = int(os.environ["STRIPE_API_BASE"].rsplit(":", 1)[1])
+    fake_stripe.serve_in_thread(port, latency=args.latency, failure_rate=args.failure_rate)
+    stripe.api_base = os.environ["STRIPE_API_BASE"]
+    seed()
+    asyncio.run(run_all(args.checkouts))
+
+
+if __name__ == "__main__":
+    main_cli()
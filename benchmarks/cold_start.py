@@ -0,0 +1,143 @@
+"""Démarrage à froid (serverless) : import de l'application et première requête, sessions cookie et signée.
+
+Usage : python -m benchmarks.cold_start [--runs 5] [--budget 1500] [--importtime]
+
+Chaque essai lance un interpréteur neuf, comme une instance serverless froide : durée totale du
+processus, import de main, première requête (GET /), et modules lourds déjà chargés à ce moment
+(stripe, passlib, PIL ne doivent l'être qu'au premier paiement, hachage ou image). Le même
+processus mesure ensuite les requêtes SQL des pages chaudes d'un client connecté (accueil,
+ajout au panier, panier) : avec SESSION_MODE=signed, panier et identité ne touchent pas la base.
+
+Le code de sortie vaut 1 si la médiane du mode signé dépasse le budget (COLD_START_BUDGET_MS).
+--importtime affiche les imports les plus coûteux (python -X importtime).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1500"))
+HEAVY_MODULES = ("stripe", "passlib", "PIL")
+MODES = ("cookie", "signed")
+WARM_ROUTES = (("GET", "/"), ("POST", "/add-to-cart"), ("GET", "/cart"))
+
+
+def child():
+    """Exécuté dans l'interpréteur neuf : une ligne JSON sur la sortie standard."""
+    started = time.perf_counter()
+    import main
+
+    imported = time.perf_counter()
+    import httpx
+    import asyncio
+
+    from benchmarks.seed import BENCH_PASSWORD, username
+    from metrics import metrics
+
+    def request_queries():
+        return metrics.queries._values.get(("request",), 0)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            before = time.perf_counter()
+            response = await client.get("/")
+            first_request = time.perf_counter() - before
+            response.raise_for_status()
+            loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+            await client.post("/login", data={"username": username(0), "password": BENCH_PASSWORD})
+            warm = {}
+            # Deux tours de chauffe : le chargement du catalogue par le panier change sa version, donc la
+            # clé de la grille de l'accueil, rendue à nouveau au tour suivant. Le troisième tour est mesuré.
+            for _ in range(3):
+                for method, path in WARM_ROUTES:
+                    count = request_queries()
+                    response = await client.request(method, path, data={"product_id": "1"} if method == "POST" else None)
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"{method} {path} : HTTP {response.status_code}")
+                    warm[f"{method} {path}"] = request_queries() - count
+            return first_request, loaded, warm
+
+    first_request, loaded, warm = asyncio.run(scenario())
+    print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": first_request * 1000,
+                      "heavy_modules": loaded, "warm_queries": warm}))
+
+
+def run_once(mode, env):
+    env = {**env, "SESSION_MODE": mode}
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.cold_start", "--child"],
+                            env=env, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec de l'essai {mode} :\n{result.stderr}")
+    measure = json.loads(result.stdout.strip().splitlines()[-1])
+    measure["process_ms"] = (time.perf_counter() - started) * 1000
+    return measure
+
+
+def import_profile(env, top=15):
+    """Imports directs de main les plus coûteux (cumulés, en ms) selon python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2  # L'indentation marque l'imbrication
+        if depth == 0:
+            if name.strip() == "main":
+                break
+            rows = []  # Sous-arbre d'un autre import de premier niveau (site...) : ignoré
+        elif depth == 1:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="interpréteurs neufs par mode")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET_MS, help="durée totale maximale (ms)")
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    database = os.path.join(tempfile.mkdtemp(), "cold.db")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "FULFILMENT_WORKER": "0", "AUTO_MIGRATE": "0"}
+    subprocess.run([sys.executable, "-m", "benchmarks.seed", "--products", "200", "--users", "10",
+                    "--reviews", "500", "--orders", "200"], env=env, check=True, capture_output=True)
+
+    medians = {}
+    for mode in MODES:
+        runs = [run_once(mode, env) for _ in range(args.runs)]
+        medians[mode] = {key: statistics.median(run[key] for run in runs)
+                         for key in ("process_ms", "import_ms", "first_request_ms")}
+        last = runs[-1]
+        print(f"[{mode:6}] processus {medians[mode]['process_ms']:7.1f} ms | import main "
+              f"{medians[mode]['import_ms']:6.1f} ms | première requête {medians[mode]['first_request_ms']:6.1f} ms"
+              f" | modules lourds chargés : {', '.join(last['heavy_modules']) or 'aucun'}")
+        print("         requêtes SQL à chaud : "
+              + ", ".join(f"{route} = {count}" for route, count in last["warm_queries"].items()))
+
+    if args.importtime:
+        print("\nImports les plus coûteux (cumulé) :")
+        for milliseconds, name in import_profile(env):
+            print(f"  {milliseconds:7.1f} ms  {name}")
+
+    total = medians["signed"]["process_ms"]
+    if total > args.budget:
+        print(f"❌ Démarrage à froid : {total:.0f} ms > budget {args.budget:.0f} ms")
+        sys.exit(1)
+    print(f"✅ Démarrage à froid : {total:.0f} ms (budget {args.budget:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
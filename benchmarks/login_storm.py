@@ -0,0 +1,93 @@
+"""Rafale de connexions : latence de la page d'accueil pendant que des logins s'exécutent.
+
+Usage : python -m benchmarks.login_storm [--logins 8] [--seconds 5]
+
+Compare le hachage pbkdf2 exécuté directement dans le handler (mode "inline", ancien
+comportement) au pool borné de auth.py (mode "pool"). L'application réelle est pilotée
+en mémoire via httpx ; la base est un fichier SQLite temporaire.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # Tous les clients virtuels partagent 127.0.0.1
+
+import httpx  # noqa: E402
+
+import auth  # noqa: E402
+import main  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import Product, User  # noqa: E402
+
+USERNAME = "storm"
+PASSWORD = "motdepasse"
+
+
+def seed():
+    with SessionLocal() as db:
+        if not db.query(User).filter(User.username == USERNAME).first():
+            db.add(User(username=USERNAME, hashed_password=auth.get_password_hash(PASSWORD)))
+        if not db.query(Product).first():
+            db.add_all(Product(name=f"Produit {i}", price=10.0, image="bench.webp", stock=50) for i in range(20))
+        db.commit()
+
+
+async def inline_verify_and_update(plain_password, hashed_password):
+    return auth.verify_and_update(plain_password, hashed_password)
+
+
+async def run(mode, logins, seconds):
+    original = auth.verify_and_update_async
+    if mode == "inline":
+        auth.verify_and_update_async = inline_verify_and_update
+
+    transport = httpx.ASGITransport(app=main.app)
+    deadline = time.perf_counter() + seconds
+    browse_latencies = []
+    login_count = 0
+
+    async def login_loop():
+        nonlocal login_count
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            while time.perf_counter() < deadline:
+                await client.post("/login", data={"username": USERNAME, "password": PASSWORD})
+                login_count += 1
+
+    async def browse_loop():
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/")
+                browse_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+    try:
+        await asyncio.gather(browse_loop(), *(login_loop() for _ in range(logins)))
+    finally:
+        auth.verify_and_update_async = original
+
+    print(
+        f"{mode:>6} : {login_count / seconds:6.1f} logins/s  GET / p50 {percentile(browse_latencies, 50):.1f} ms  "
+        f"p99 {percentile(browse_latencies, 99):.1f} ms  ({len(browse_latencies)} requêtes)"
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=8, help="clients qui se connectent en boucle")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    seed()
+    for mode in ("inline", "pool"):
+        asyncio.run(run(mode, args.logins, args.seconds))
+    print(f"pool : {auth.hash_pool.stats()}")
+
+
+if __name__ == "__main__":
+    main_cli()
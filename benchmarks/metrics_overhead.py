@@ -0,0 +1,113 @@
+"""Coût de l'instrumentation (metrics.py) : latence des mêmes requêtes avec et sans mesures.
+
+Usage : python -m benchmarks.metrics_overhead [--requests 2000] [--products 500]
+
+L'application est pilotée en mémoire via httpx ; chaque mode rejoue le même mélange de routes
+(accueil, API du catalogue, fiche produit, recherche, panier). "debug" ajoute le comptage des
+instructions par requête (détection N+1) et l'en-tête Server-Timing.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+os.environ.setdefault("FULFILMENT_WORKER", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from metrics import metrics  # noqa: E402
+from models import Product  # noqa: E402
+
+MODES = {"sans": (False, False), "mesures": (True, False), "debug": (True, True)}
+
+
+def seed(product_count):
+    with SessionLocal() as db:
+        db.execute(Product.__table__.insert(), [
+            {"name": f"Produit {i}", "price": 5.0 + i % 50, "image": "bench.webp", "stock": 50, "sku": f"bench-{i}"}
+            for i in range(product_count)
+        ])
+        db.commit()
+    main.search_index.rebuild(SessionLocal())
+
+
+def request_mix(count, product_count, seed=7):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        choice = rng.random()
+        if choice < 0.3:
+            paths.append("/")
+        elif choice < 0.5:
+            paths.append(f"/api/products?sort=price&min_price={rng.randrange(5, 50)}")
+        elif choice < 0.75:
+            paths.append(f"/product/{rng.randrange(1, product_count + 1)}")
+        elif choice < 0.9:
+            paths.append(f"/search?q=produit+{rng.randrange(product_count)}")
+        else:
+            paths.append("/cart")
+    return paths
+
+
+async def run(paths):
+    samples = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in paths:
+            started = time.perf_counter()
+            response = await client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (path, response.status_code)
+    return samples
+
+
+def per_statement_us(count=20000):
+    """Coût ajouté à chaque instruction SQL par les événements du moteur, hors bruit HTTP."""
+    timings = {}
+    with engine.connect() as conn:
+        for enabled in (False, True, False, True):
+            metrics.enabled = enabled
+            started = time.perf_counter()
+            for _ in range(count):
+                conn.execute(text("SELECT 1"))
+            timings.setdefault(enabled, []).append((time.perf_counter() - started) / count * 1e6)
+    return min(timings[False]), min(timings[True])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=500)
+    args = parser.parse_args()
+    seed(args.products)
+    paths = request_mix(args.requests, args.products)
+    asyncio.run(run(paths[:200]))  # Préchauffage : gabarits compilés, caches remplis
+
+    results = {}
+    for _ in range(3):  # Modes alternés pour lisser le bruit de la machine
+        for mode, (enabled, debug) in MODES.items():
+            metrics.enabled, metrics.debug = enabled, debug
+            results.setdefault(mode, []).extend(asyncio.run(run(paths)))
+    baseline = sum(results["sans"]) / len(results["sans"])
+    for mode, samples in results.items():
+        mean = sum(samples) / len(samples)
+        print(f"[{mode:<8}] moyenne {mean:6.3f} ms | p50 {percentile(samples, 50):6.3f} ms | "
+              f"p95 {percentile(samples, 95):6.3f} ms | surcoût {(mean - baseline) * 1000:+6.1f} µs "
+              f"({(mean / baseline - 1) * 100:+5.1f} %)")
+    off, on = per_statement_us()
+    print(f"[SQL     ] SELECT 1 : {off:.1f} µs sans mesures, {on:.1f} µs avec ({on - off:+.1f} µs par instruction)")
+    metrics.enabled = True
+    series = sum(1 for line in metrics.render().splitlines() if not line.startswith("#"))
+    print(f"/metrics : {series} lignes exposées")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,130 @@
+"""Charge mixte lecture/écriture : page d'accueil et paiement en parallèle sur SQLite.
+
+Usage : python -m benchmarks.mixed_load [--readers 8] [--writers 4] [--seconds 5]
+
+Compare le journal par défaut (DELETE, synchronous=FULL) aux réglages de database.py
+(WAL, synchronous=NORMAL, mmap, cache) et affiche les latences p50/p95/p99 de chaque chemin.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_app_engine
+from models import Order, OrderItem, Product, User
+from stock import reserve_stock
+
+CONFIGS = {
+    "default": {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": 0, "cache_size": -2000},
+    "tuned": {},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def home_path(db, product_count, user_id):
+    db.query(Product).order_by(Product.id).all()
+
+
+def checkout_path(db, product_count, user_id):
+    product_id = int(time.perf_counter_ns() % product_count) + 1
+    reservation = reserve_stock(db, {product_id: 1})
+    if reservation.reserved:
+        product = db.get(Product, product_id)
+        db.add(Order(user_id=user_id, total_price=product.price,
+                     items=[OrderItem(product_id=product_id, quantity=1, price_at_purchase=product.price)]))
+    db.commit()
+
+
+def run(config_name, readers, writers, seconds, product_count):
+    tmpdir = tempfile.mkdtemp()
+    engine = create_app_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", **CONFIGS[config_name])
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with Session() as db:
+        db.add_all(
+            Product(name=f"Produit {i}", price=10.0 + i % 20, image="bench.webp",
+                    message="Produit de test", stock=10 ** 9)
+            for i in range(product_count)
+        )
+        user = User(username="bench", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    latencies = {"home": [], "checkout": []}
+    errors = {"home": 0, "checkout": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(name, path):
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            start = time.perf_counter()
+            try:
+                path(db, product_count, user_id)
+                local.append((time.perf_counter() - start) * 1000)
+            except OperationalError:
+                db.rollback()
+                failed += 1
+            finally:
+                db.close()
+        with lock:
+            latencies[name].extend(local)
+            errors[name] += failed
+
+    threads = [threading.Thread(target=worker, args=("home", home_path)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=("checkout", checkout_path)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    report = {}
+    for name, values in latencies.items():
+        report[name] = {
+            "requests": len(values),
+            "rps": round(len(values) / seconds, 1),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "mean_ms": round(statistics.fmean(values), 2) if values else 0.0,
+            "errors": errors[name],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    for config_name in CONFIGS:
+        report = run(config_name, args.readers, args.writers, args.seconds, args.products)
+        for path, stats in report.items():
+            print(
+                f"{config_name:>7} {path:>8} : {stats['rps']:>8} req/s  p50 {stats['p50_ms']} ms  "
+                f"p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms  erreurs {stats['errors']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
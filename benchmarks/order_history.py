@@ -0,0 +1,113 @@
+"""Page profil d'un gros acheteur : historique complet chargé d'un bloc contre page de résumés.
+
+Usage : python -m benchmarks.order_history [--users 20] [--orders 5000] [--items 4] [--repeat 10]
+
+Le mode "legacy" reproduit l'ancien view_profile (joinedload des articles et des produits sur
+tout l'historique) ; le mode "keyset" lit une page de résumés via orders.fetch_page, puis les
+articles d'une seule commande (ouverture d'une ligne). Les deux sont mesurés avec et sans les
+index (user_id, created_at, id) et (order_id).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import joinedload, sessionmaker
+
+import orders
+from database import Base, create_app_engine
+from models import Order, OrderItem, Product, User
+
+
+def seed(Session, user_count, order_count, item_count):
+    rng = random.Random(42)
+    with Session() as db:
+        db.execute(Product.__table__.insert(), [
+            {"name": f"Produit {i}", "price": round(rng.uniform(2, 80), 2), "image": "bench.webp", "stock": 10}
+            for i in range(500)
+        ])
+        db.execute(User.__table__.insert(), [
+            {"username": f"client{i}", "hashed_password": "x", "is_admin": False} for i in range(user_count)
+        ])
+        start = datetime(2020, 1, 1)
+        order_id = 0
+        for user_id in range(1, user_count + 1):
+            order_rows, item_rows = [], []
+            for n in range(order_count):
+                order_id += 1
+                lines = [(rng.randrange(1, 501), rng.randint(1, 3)) for _ in range(item_count)]
+                item_count_total, summary = orders.summarize([(f"Produit {pid - 1}", q) for pid, q in lines])
+                order_rows.append({"id": order_id, "user_id": user_id, "created_at": start + timedelta(hours=n),
+                                   "total_price": 0, "item_count": item_count_total, "summary": summary})
+                item_rows += [{"order_id": order_id, "product_id": pid, "quantity": q, "price_at_purchase": 9.9}
+                              for pid, q in lines]
+            db.execute(Order.__table__.insert(), order_rows)
+            db.execute(OrderItem.__table__.insert(), item_rows)
+        db.commit()
+
+
+def legacy_profile(db, user_id):
+    return db.query(Order).filter(Order.user_id == user_id)\
+        .options(joinedload(Order.items).joinedload(OrderItem.product))\
+        .order_by(Order.created_at.desc())\
+        .all()
+
+
+def keyset_profile(db, user_id, before):
+    page, _ = orders.fetch_page(db, user_id, before=before)
+    return page, orders.fetch_items(db, user_id, page[0].id)
+
+
+def timed(Session, fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Session() as db:
+            started = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def deep_cursor(Session, user_id, pages):
+    before = None
+    with Session() as db:
+        for _ in range(pages - 1):
+            before = orders.fetch_page(db, user_id, before=before)[1]
+    return before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_app_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    started = time.perf_counter()
+    seed(Session, args.users, args.orders, args.items)
+    print(f"{args.users * args.orders} commandes ({args.items} articles chacune) insérées en {time.perf_counter() - started:.1f} s")
+
+    user_id = args.users // 2
+    deep = deep_cursor(Session, user_id, 100)
+    indexes = [*Order.__table__.indexes, *OrderItem.__table__.indexes]
+    for label in ("avec index", "sans index"):
+        if label == "sans index":
+            for index in indexes:
+                if index.name != "ix_orders_id":
+                    index.drop(bind=engine)
+        legacy_ms = timed(Session, lambda db: legacy_profile(db, user_id), max(1, args.repeat // 5))
+        first_ms = timed(Session, lambda db: keyset_profile(db, user_id, None), args.repeat)
+        deep_ms = timed(Session, lambda db: keyset_profile(db, user_id, deep), args.repeat)
+        print(f"[{label}] historique complet {legacy_ms:8.1f} ms | page 1 + articles {first_ms:6.2f} ms "
+              f"| page 100 + articles {deep_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
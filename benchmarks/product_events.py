@@ -0,0 +1,162 @@
+"""Flux SSE du stock et des prix : milliers de connexions inactives sur un seul worker uvicorn.
+
+Usage : python -m benchmarks.product_events [--connections 2000] [--watched 20] [--rounds 5] [--burst 10]
+
+Ouvre `--connections` flux /events/products répartis sur `--watched` produits, mesure la mémoire
+et le CPU du worker au repos, puis, à chaque tour, modifie `--burst` fois de suite le stock d'un
+produit par l'administration. Pour chaque abonné de ce produit : délai entre la dernière
+modification et la réception du stock final, et nombre d'événements reçus (regroupés par
+EVENTS_COALESCE_SECONDS, donc bien moins que `--burst`).
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+import httpx  # noqa: E402
+from sqlalchemy import update  # noqa: E402
+
+from benchmarks.mixed_load import percentile  # noqa: E402
+from benchmarks.seed import BENCH_PASSWORD, SCALES, username  # noqa: E402
+from benchmarks.storefront_load import prepare_database, start_uvicorn  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import Product, User  # noqa: E402
+
+CONNECT_BATCH = 200
+
+
+class Listener:
+    """Un abonné SSE sur une connexion TCP brute : httpx par milliers coûterait plus que le serveur mesuré."""
+
+    def __init__(self, product_id):
+        self.product_id = product_id
+        self.received = []  # (horodatage, état)
+        self.writer = None
+
+    async def connect(self, host, port):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(f"GET /events/products?ids={self.product_id} HTTP/1.1\r\nHost: {host}\r\n"
+                          "Accept: text/event-stream\r\n\r\n".encode("ascii"))
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(f"Abonnement refusé : {status.decode().strip()}")
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        return asyncio.create_task(self.listen(reader))
+
+    async def listen(self, reader):
+        # Corps en transfert chunked : les lignes de taille sont ignorées, seules les lignes data: comptent.
+        while line := await reader.readline():
+            if line.startswith(b"data: "):
+                self.received.append((time.perf_counter(), json.loads(line[6:])))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def process_usage(pid):
+    """(RSS en Kio, secondes CPU) du processus, d'après /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def worker_pid(server_pid):
+    """Avec --workers 1, uvicorn sert dans le processus lancé ; sinon dans son unique enfant."""
+    children = f"/proc/{server_pid}/task/{server_pid}/children"
+    if os.path.exists(children):
+        with open(children) as f:
+            pids = f.read().split()
+        if pids:
+            return int(pids[0])
+    return server_pid
+
+
+async def run(args, products):
+    server, base_url = start_uvicorn(1)
+    host, port = base_url.removeprefix("http://").split(":")
+    listeners, tasks = [], []
+    try:
+        pid = worker_pid(server.pid)
+        rss_before, _ = process_usage(pid)
+        watched = products[:args.watched]
+        for start in range(0, args.connections, CONNECT_BATCH):
+            batch = [Listener(watched[i % len(watched)].id) for i in range(start, min(start + CONNECT_BATCH, args.connections))]
+            tasks += await asyncio.gather(*(listener.connect(host, int(port)) for listener in batch))
+            listeners += batch
+        await asyncio.sleep(1)
+        rss_after, cpu_before = process_usage(pid)
+        await asyncio.sleep(args.idle)
+        _, cpu_after = process_usage(pid)
+        print(f"{len(listeners)} connexions SSE : +{(rss_after - rss_before) / 1024:.1f} Mio "
+              f"({(rss_after - rss_before) / len(listeners):.1f} Kio par connexion), "
+              f"CPU au repos {100 * (cpu_after - cpu_before) / args.idle:.1f} %")
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as admin:
+            await admin.post("/login", data={"username": username(0), "password": BENCH_PASSWORD})
+            delays, events = [], []
+            for round_index in range(args.rounds):
+                product = watched[round_index % len(watched)]
+                subscribers = [listener for listener in listeners if listener.product_id == product.id]
+                seen = {id(listener): len(listener.received) for listener in subscribers}
+                final_stock = 1000 + round_index * args.burst
+                for i in range(args.burst):
+                    response = await admin.post(f"/admin/products/edit/{product.id}", data={
+                        "name": product.name, "price": product.price, "stock": final_stock - args.burst + 1 + i,
+                        "message": product.message or "",
+                    }, follow_redirects=False)
+                    if response.status_code != 303:
+                        raise RuntimeError(f"Modification refusée : HTTP {response.status_code}")
+                last_edit = time.perf_counter()
+                await asyncio.sleep(args.settle)
+                for listener in subscribers:
+                    new = listener.received[seen[id(listener)]:]
+                    events.append(len(new))
+                    arrival = next((at for at, state in new if state.get("stock") == final_stock), None)
+                    if arrival is not None:
+                        delays.append(max(0.0, arrival - last_edit) * 1000)
+            stats = (await admin.get("/admin/stats")).json().get("events")
+        missed = len(events) - len(delays)
+        print(f"{args.rounds} tours de {args.burst} modifications, {len(events) // max(args.rounds, 1)} abonnés par produit :"
+              f" stock final reçu en p50 {percentile(delays, 50):.1f} | p95 {percentile(delays, 95):.1f}"
+              f" | p99 {percentile(delays, 99):.1f} ms après la dernière modification ; {missed} abonnés sans le stock final")
+        print(f"Événements reçus par abonné et par tour : moyenne {sum(events) / max(len(events), 1):.2f}"
+              f" pour {args.burst} modifications ; bus : {stats}")
+    finally:
+        # Connexions fermées avant l'arrêt : uvicorn attend la fin des flux en cours pour s'arrêter.
+        await asyncio.gather(*(listener.close() for listener in listeners), return_exceptions=True)
+        for task in tasks:
+            task.cancel()
+        await asyncio.sleep(1)
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--watched", type=int, default=20, help="produits suivis (abonnés répartis entre eux)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=10, help="modifications successives du même produit par tour")
+    parser.add_argument("--idle", type=float, default=3, help="durée de la mesure du CPU au repos (s)")
+    parser.add_argument("--settle", type=float, default=1, help="attente après chaque tour (s)")
+    args = parser.parse_args()
+
+    prepare_database(SCALES["small"], 42)
+    with SessionLocal() as db:
+        db.execute(update(User).where(User.username == username(0)).values(is_admin=True))
+        db.commit()
+        products = db.query(Product).order_by(Product.id).limit(args.watched).all()
+        db.expunge_all()
+    asyncio.run(run(args, products))
+
+
+if __name__ == "__main__":
+    main()
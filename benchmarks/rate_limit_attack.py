@@ -0,0 +1,165 @@
+"""Attaque par bourrage d'identifiants : latence de navigation avec et sans limitation de débit.
+
+Usage : python -m benchmarks.rate_limit_attack [--seconds 8] [--browsers 8] [--attack-rate 300] [--attack-ips 200]
+
+Trois phases sur la même base : navigation seule ("repos"), puis navigation pendant que des
+POST /login à mauvais mot de passe arrivent de `--attack-ips` adresses à débit fixe (charge
+ouverte : l'attaquant n'attend pas les réponses pour envoyer la suivante), d'abord sans
+protection (limiteur et contrôle d'admission coupés), puis avec la configuration par défaut de
+rate_limit.py. Pour chaque phase : latence des pages de navigation (accueil, fiche produit, API
+du catalogue), réponses reçues par l'attaquant et nombre de hachages pbkdf2 réellement calculés.
+L'application est pilotée en mémoire via httpx ; l'adresse du client est simulée par requête.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+os.environ.setdefault("FULFILMENT_WORKER", "0")
+
+import httpx  # noqa: E402
+
+import auth  # noqa: E402
+import main  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from benchmarks.seed import Scale, seed, username  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from rate_limit import (  # noqa: E402
+    ADMISSION_AUTH_MAX_IN_FLIGHT, ADMISSION_MAX_IN_FLIGHT, MemoryRateLimitBackend, admission, auth_admission, limiter,
+)
+
+CLIENT_HEADER = "x-bench-client"
+
+
+def with_client_ip(app):
+    """L'adresse du client vient d'un en-tête : une seule connexion httpx simule des milliers d'IP."""
+    async def wrapper(scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            ip = headers.get(CLIENT_HEADER.encode("ascii"))
+            if ip:
+                scope["client"] = (ip.decode("ascii"), 0)
+        await app(scope, receive, send)
+    return wrapper
+
+
+def configure(protected):
+    limiter.enabled = protected
+    limiter.backend = MemoryRateLimitBackend()  # Seaux neufs à chaque phase
+    admission.max_in_flight = ADMISSION_MAX_IN_FLIGHT if protected else 0
+    auth_admission.max_in_flight = ADMISSION_AUTH_MAX_IN_FLIGHT if protected else 0
+
+
+async def browser(client, product_count, deadline, latencies, errors, rng):
+    ip = f"192.168.{rng.randrange(256)}.{rng.randrange(256)}"
+    while time.perf_counter() < deadline:
+        choice = rng.random()
+        if choice < 0.4:
+            path = "/"
+        elif choice < 0.8:
+            path = f"/product/{rng.randrange(1, product_count + 1)}"
+        else:
+            path = "/api/products?sort=price"
+        started = time.perf_counter()
+        response = await client.get(path, headers={CLIENT_HEADER: ip})
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors[response.status_code] += 1
+
+
+async def attacker(client, ips, user_count, rate, max_pending, deadline, outcomes, rng):
+    """Envoie `rate` tentatives par seconde ; au-delà de `max_pending` sans réponse, les suivantes sont abandonnées."""
+    async def attempt():
+        response = await client.post("/login", headers={CLIENT_HEADER: rng.choice(ips)}, data={
+            "username": username(rng.randrange(user_count)), "password": f"essai-{rng.random()}",
+        })
+        outcomes[response.status_code] += 1
+
+    pending = set()
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        next_at += 1 / rate
+        if len(pending) >= max_pending:
+            outcomes["abandonnées"] += 1
+            continue
+        task = asyncio.create_task(attempt())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    # Réponses encore attendues à la fin de la phase : sans intérêt pour la mesure de navigation.
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run_phase(client, args, attack):
+    rng = random.Random(args.seed)
+    latencies, errors, outcomes = [], Counter(), Counter()
+    ips = [f"10.{i // 256 % 256}.{i % 256}.1" for i in range(args.attack_ips)]
+    hashed_before = auth.hash_pool.completed
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    tasks = [browser(client, args.products, deadline, latencies, errors, random.Random(rng.random()))
+             for _ in range(args.browsers)]
+    if attack:
+        tasks.append(attacker(client, ips, args.users, args.attack_rate, args.max_pending, deadline, outcomes,
+                              random.Random(rng.random())))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "browse_rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        "browse_errors": dict(errors),
+        "attack_rps": sum(outcomes.values()) / elapsed,
+        "attack_outcomes": dict(outcomes),
+        "hashes_per_second": (auth.hash_pool.completed - hashed_before) / elapsed,
+    }
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=with_client_ip(main.app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await client.get("/")  # Caches remplis avant la première phase
+        results = {}
+        for name, attack, protected in (("repos", False, True), ("attaque, sans protection", True, False),
+                                        ("attaque, protégé", True, True)):
+            configure(protected)
+            results[name] = await run_phase(client, args, attack)
+    configure(True)
+    return results
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--browsers", type=int, default=8, help="visiteurs qui naviguent")
+    parser.add_argument("--attack-rate", type=float, default=300, help="tentatives de connexion par seconde")
+    parser.add_argument("--max-pending", type=int, default=1000, help="tentatives sans réponse au maximum")
+    parser.add_argument("--attack-ips", type=int, default=200, help="adresses IP de l'attaquant")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        seed(db, Scale(products=args.products, users=args.users, reviews=1_000, orders=500), log=lambda message: None)
+
+    results = asyncio.run(run(args))
+    baseline = results["repos"]["p95"]
+    for name, result in results.items():
+        print(f"[{name:24}] navigation {result['browse_rps']:6.1f} req/s | p50 {result['p50']:7.2f} | "
+              f"p95 {result['p95']:7.2f} ({result['p95'] / baseline:4.1f}x) | p99 {result['p99']:7.2f} ms"
+              f" | erreurs {result['browse_errors'] or 0}")
+        if result["attack_outcomes"]:
+            outcomes = ", ".join(f"{status}: {count}" for status, count in sorted(result["attack_outcomes"].items(), key=str))
+            print(f"{'':27}attaque {result['attack_rps']:7.1f} req/s ({outcomes}) | "
+                  f"{result['hashes_per_second']:.1f} hachages pbkdf2/s")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,101 @@
+"""Panneaux de ventes du tableau de bord : agrégats journaliers contre parcours de order_items.
+
+Usage : python -m benchmarks.sales_dashboard [--orders 200000] [--products 2000] [--days 365] [--repeat 10]
+
+Le mode "scan" répond aux mêmes questions (meilleures ventes et chiffre d'affaires sur 30 jours,
+vitesse de vente sur 14 jours) par des requêtes directes sur orders/order_items ; le mode
+"agrégats" utilise analytics.dashboard.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from sqlalchemy import text  # noqa: E402
+
+import analytics  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import Order, OrderItem, Product  # noqa: E402
+
+SCAN_SQL = [
+    text(
+        "SELECT order_items.product_id, sum(quantity) AS units, sum(price_at_purchase * quantity) FROM order_items "
+        "JOIN orders ON orders.id = order_items.order_id WHERE orders.created_at >= :since30 "
+        "GROUP BY order_items.product_id ORDER BY units DESC LIMIT 10"
+    ),
+    text(
+        "SELECT date(orders.created_at), count(DISTINCT orders.id), sum(price_at_purchase * quantity) FROM orders "
+        "JOIN order_items ON order_items.order_id = orders.id WHERE orders.created_at >= :since30 GROUP BY 1"
+    ),
+    text(
+        "SELECT products.id, products.stock, sold.units FROM products JOIN (SELECT product_id, sum(quantity) AS units "
+        "FROM order_items JOIN orders ON orders.id = order_items.order_id WHERE orders.created_at >= :since14 "
+        "GROUP BY product_id) AS sold ON sold.product_id = products.id WHERE products.stock < sold.units / 14.0 * 7"
+    ),
+]
+
+
+def seed(order_count, product_count, days):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(Product.__table__.insert(), [
+            {"name": f"Produit {i}", "price": round(rng.uniform(2, 80), 2), "image": "bench.webp", "stock": rng.randrange(0, 200)}
+            for i in range(product_count)
+        ])
+        for start in range(0, order_count, 10000):
+            orders, items = [], []
+            for order_id in range(start + 1, min(start + 10000, order_count) + 1):
+                orders.append({"id": order_id, "user_id": 1, "total_price": 0,
+                               "created_at": now - timedelta(seconds=rng.randrange(days * 86400))})
+                items += [{"order_id": order_id, "product_id": rng.randrange(1, product_count + 1),
+                           "quantity": rng.randint(1, 3), "price_at_purchase": 9.9} for _ in range(rng.randint(1, 4))]
+            db.execute(Order.__table__.insert(), orders)
+            db.execute(OrderItem.__table__.insert(), items)
+        db.commit()
+        analytics.rebuild(db)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def scan(db):
+    now = datetime.utcnow()
+    params = {"since30": now - timedelta(days=30), "since14": now - timedelta(days=14)}
+    for statement in SCAN_SQL:
+        db.execute(statement, params).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    seed(args.orders, args.products, args.days)
+    print(f"{args.orders} commandes sur {args.days} jours insérées et agrégées en {time.perf_counter() - started:.1f} s")
+
+    scan_ms = timed(scan, args.repeat)
+    rollup_ms = timed(analytics.dashboard, args.repeat)
+    print(f"[scan     ] {scan_ms:8.2f} ms par affichage du tableau de bord")
+    print(f"[agrégats ] {rollup_ms:8.2f} ms par affichage du tableau de bord")
+
+
+if __name__ == "__main__":
+    main()
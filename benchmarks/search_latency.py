@@ -0,0 +1,92 @@
+"""Latence de la recherche plein texte et de l'autocomplétion sur 100 000 produits.
+
+Usage : python -m benchmarks.search_latency [--products 100000] [--queries 500]
+
+Compare l'index FTS5 de search.py à un filtre LIKE '%...%' sur le nom (parcours complet de la table).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.mixed_load import percentile
+from database import Base, create_app_engine
+from models import Product
+from search import SearchIndex
+
+WORDS = [
+    "huile", "shampoing", "masque", "sérum", "crème", "baume", "lait", "spray", "gel", "lotion",
+    "karité", "coco", "argan", "ricin", "avocat", "aloé", "miel", "kératine", "protéines", "jojoba",
+    "boucles", "crépus", "frisés", "lisses", "colorés", "secs", "fins", "épais", "abîmés", "bouclés",
+    "nourrissant", "hydratant", "réparateur", "fortifiant", "démêlant", "éclat", "brillance", "volume",
+]
+SYLLABLES = ["ka", "li", "mo", "ra", "ne", "so", "vi", "ta", "lu", "be", "zo", "ma", "ri", "do", "fe", "na"]
+
+
+def brand_names(rng, count):
+    return sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() for _ in range(count)})
+
+
+def seed(Session, product_count, rng, brands):
+    with Session() as db:
+        for start in range(0, product_count, 10000):
+            db.execute(Product.__table__.insert(), [
+                {"name": f"{rng.choice(brands)} {' '.join(rng.sample(WORDS, 2))}", "price": round(rng.uniform(2, 80), 2),
+                 "image": "bench.webp", "message": " ".join(rng.sample(WORDS, 8)), "stock": rng.randrange(0, 5)}
+                for _ in range(start, min(start + 10000, product_count))
+            ])
+        db.commit()
+
+
+def measure(label, fn, inputs):
+    samples = []
+    for value in inputs:
+        started = time.perf_counter()
+        fn(value)
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"{label:<28} p50 {percentile(samples, 50):6.2f} ms | p95 {percentile(samples, 95):6.2f} ms "
+          f"| p99 {percentile(samples, 99):6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    engine = create_app_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    brands = brand_names(rng, 3000)
+    seed(Session, args.products, rng, brands)
+    index = SearchIndex()
+    index.configure(engine)
+    started = time.perf_counter()
+    with Session() as db:
+        index.rebuild(db)
+    print(f"{args.products} produits indexés en {time.perf_counter() - started:.1f} s")
+
+    # Saisies sans accents : l'index doit retrouver "kératine" à partir de "keratine".
+    words = [w.translate(str.maketrans("éèêëàâîïôûç", "eeeeaaiiouc")) for w in WORDS]
+    # Recherches typiques : une marque, éventuellement suivie d'un mot ; frappe progressive d'une marque ou d'un mot.
+    searches = [f"{rng.choice(brands)} {rng.choice(words)}" if rng.random() < 0.5 else rng.choice(brands)
+                for _ in range(args.queries)]
+    prefixes = [rng.choice(brands if rng.random() < 0.7 else words)[:rng.randint(2, 5)] for _ in range(args.queries)]
+
+    with Session() as db:
+        measure("recherche FTS5 (bm25)", lambda q: index.search(db, q), searches)
+        measure("autocomplétion FTS5", lambda q: index.suggest(db, q), prefixes)
+        like = lambda q: db.scalars(
+            select(Product).where(Product.name.icontains(q, autoescape=True)).limit(20)
+        ).all()
+        measure("recherche LIKE", lambda q: like(q.split()[0]), searches)
+        measure("autocomplétion LIKE", like, prefixes)
+
+
+if __name__ == "__main__":
+    main()
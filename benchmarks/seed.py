@@ -0,0 +1,161 @@
+"""Jeu de données synthétique et reproductible pour les benchmarks : produits, clients, avis, commandes.
+
+Usage : DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed [--scale small|medium|large]
+                                                                  [--products N] [--users N] [--reviews N] [--orders N]
+
+Le catalogue de create_products.py est complété par des produits générés ; tous les clients
+bench-<n> ont le mot de passe BENCH_PASSWORD. Les avis et les commandes sont insérés en masse puis
+les tables dérivées (review_stats, résumés des commandes, agrégats de ventes, index de recherche)
+sont recalculées comme après une migration. Même graine, même base.
+"""
+import argparse
+import random
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+import analytics
+import auth
+import migrations
+import orders
+import reviews
+from catalog_io import import_products
+from create_products import products_data
+from database import SessionLocal, engine
+from models import Order, OrderItem, Product, Review, User
+from search import search_index
+
+BENCH_PASSWORD = "motdepasse-bench"
+BENCH_STOCK = 10 ** 9  # Le stock ne s'épuise jamais pendant une charge
+INSERT_BATCH_SIZE = 10000
+HISTORY_DAYS = 365
+
+WORDS = ["huile", "shampoing", "masque", "sérum", "crème", "baume", "karité", "coco", "argan", "ricin",
+         "boucles", "crépus", "nourrissant", "hydratant", "réparateur", "éclat", "brillance", "volume"]
+IMAGES = sorted({product["image"] for product in products_data})
+COMMENTS = ["Parfait pour mes cheveux.", "Bon produit, odeur agréable.", "Un peu cher mais efficace.",
+            "Je recommande !", "Pas convaincue.", None]
+
+
+@dataclass(frozen=True)
+class Scale:
+    products: int
+    users: int
+    reviews: int
+    orders: int
+
+
+SCALES = {
+    "small": Scale(products=200, users=100, reviews=2_000, orders=2_000),
+    "medium": Scale(products=2_000, users=2_000, reviews=50_000, orders=50_000),
+    "large": Scale(products=20_000, users=20_000, reviews=500_000, orders=500_000),
+}
+
+
+def username(index):
+    return f"bench-{index}"
+
+
+def product_rows(count, rng):
+    """Catalogue de create_products.py, puis produits générés jusqu'à `count`."""
+    for product in products_data[:count]:
+        yield {**product, "stock": BENCH_STOCK}
+    for i in range(len(products_data), count):
+        words = rng.sample(WORDS, 3)
+        yield {"sku": f"bench-{i:07d}", "name": f"{' '.join(words).capitalize()} {i}",
+               "price": round(rng.uniform(4, 60), 2), "image": rng.choice(IMAGES),
+               "message": f"Soin {words[0]} au {words[1]}, pour cheveux {words[2]}.", "stock": BENCH_STOCK}
+
+
+def insert_batches(db, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(table.insert(), batch)
+    db.commit()
+
+
+def seed(db, scale, rng_seed=42, log=print):
+    """Remplit une base migrée et vide ; renvoie le nombre de lignes par table."""
+    rng = random.Random(rng_seed)
+    if db.scalar(select(func.count()).select_from(Product)):
+        raise ValueError("La base contient déjà des produits : partir d'une base vide")
+    started = time.perf_counter()
+
+    import_products(db, enumerate(product_rows(scale.products, rng), 1), reindex=False)
+    product_ids = db.scalars(select(Product.id).order_by(Product.id)).all()
+    prices = dict(db.execute(select(Product.id, Product.price)).all())
+    log(f"🔄 {len(product_ids)} produits ({time.perf_counter() - started:.1f} s)")
+
+    # Un seul hachage (coûteux) pour tous les clients : ils partagent le même mot de passe.
+    hashed = auth.get_password_hash(BENCH_PASSWORD)
+    insert_batches(db, User.__table__, (
+        {"username": username(i), "hashed_password": hashed, "is_admin": False} for i in range(scale.users)
+    ))
+    user_ids = db.scalars(select(User.id).order_by(User.id)).all()
+    log(f"🔄 {len(user_ids)} clients ({time.perf_counter() - started:.1f} s)")
+
+    # Quelques produits vedettes concentrent les avis et les ventes, comme en production.
+    weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+    insert_batches(db, Review.__table__, (
+        {"product_id": product_id, "user_id": rng.choice(user_ids),
+         "rating": rng.choices([1, 2, 3, 4, 5], [1, 1, 2, 4, 5])[0], "comment": rng.choice(COMMENTS)}
+        for product_id in rng.choices(product_ids, weights, k=scale.reviews)
+    ))
+    reviews.rebuild_stats(db)
+    log(f"🔄 {scale.reviews} avis ({time.perf_counter() - started:.1f} s)")
+
+    now = datetime.utcnow()
+    order_id = db.scalar(select(func.max(Order.id))) or 0
+    for start in range(0, scale.orders, INSERT_BATCH_SIZE):
+        order_rows, item_rows = [], []
+        for _ in range(min(INSERT_BATCH_SIZE, scale.orders - start)):
+            order_id += 1
+            lines = {product_id: rng.randint(1, 3) for product_id in rng.choices(product_ids, weights, k=rng.randint(1, 4))}
+            item_rows += [{"order_id": order_id, "product_id": product_id, "quantity": quantity,
+                           "price_at_purchase": prices[product_id]} for product_id, quantity in lines.items()]
+            order_rows.append({"id": order_id, "user_id": rng.choice(user_ids),
+                               "total_price": round(sum(prices[p] * q for p, q in lines.items()), 2),
+                               "created_at": now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))})
+        db.execute(Order.__table__.insert(), order_rows)
+        db.execute(OrderItem.__table__.insert(), item_rows)
+        db.commit()
+    orders.rebuild_summaries(db)
+    analytics.rebuild(db)
+    log(f"🔄 {scale.orders} commandes ({time.perf_counter() - started:.1f} s)")
+
+    if search_index.enabled:
+        search_index.rebuild(db)
+    return {
+        table.__tablename__: db.scalar(select(func.count()).select_from(table))
+        for table in (Product, User, Review, Order, OrderItem)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in asdict(SCALES["small"]):
+        parser.add_argument(f"--{name}", type=int, help="remplace la valeur de --scale")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    overrides = {name: getattr(args, name) for name in asdict(SCALES["small"]) if getattr(args, name) is not None}
+    scale = replace(SCALES[args.scale], **overrides)
+
+    migrations.upgrade(engine)
+    search_index.configure(engine)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        counts = seed(db, scale, args.seed)
+    print(f"✅ Base remplie en {time.perf_counter() - started:.1f} s : "
+          + ", ".join(f"{count} {table}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
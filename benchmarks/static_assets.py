@@ -0,0 +1,99 @@
+"""Première visite et visite répétée de l'accueil : requêtes et octets des fichiers statiques.
+
+Usage : python -m benchmarks.static_assets [--visits 5]
+
+Un petit cache de navigateur (Cache-Control, ETag) est simulé devant l'application, pilotée
+en mémoire via httpx. Compare les URL simples sans compression (ancien comportement) aux URL
+empreintées, immuables et servies précompressées (gzip/brotli).
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+import static_assets  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import Product  # noqa: E402
+
+ASSET_URL = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+def seed():
+    with SessionLocal() as db:
+        if not db.query(Product).first():
+            db.add_all(Product(name=f"Produit {i}", price=10.0, image="bench.webp", stock=50) for i in range(20))
+            db.commit()
+
+
+class BrowserCache:
+    """Cache HTTP minimal : réutilise les réponses immuables, revalide les autres par ETag."""
+
+    def __init__(self, client, accept_encoding):
+        self.client = client
+        self.accept_encoding = accept_encoding
+        self.entries = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes = 0
+
+    async def fetch(self, url):
+        cached = self.entries.get(url)
+        if cached is not None and "immutable" in cached.get("cache-control", ""):
+            return
+        headers = {"Accept-Encoding": self.accept_encoding}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        response = await self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += int(response.headers.get("content-length", len(response.content)))
+        if response.status_code == 304:
+            self.not_modified += 1
+        elif response.status_code == 200:
+            self.entries[url] = response.headers
+
+    def snapshot(self):
+        return self.requests, self.not_modified, self.bytes
+
+
+async def visit(client, cache):
+    page = await client.get("/")
+    for url in sorted(set(ASSET_URL.findall(page.text))):
+        await cache.fetch(url)
+
+
+async def run(mode, visits):
+    static_assets.STATIC_FINGERPRINT = mode == "hashed"
+    accept_encoding = "br, gzip" if mode == "hashed" else "identity"
+    main.fragments.invalidate()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cache = BrowserCache(client, accept_encoding)
+        await visit(client, cache)
+        first = cache.snapshot()
+        for _ in range(visits):
+            await visit(client, cache)
+        total = cache.snapshot()
+    repeat = [(t - f) / max(visits, 1) for t, f in zip(total, first)]
+    print(f"[{mode}] 1re visite : {first[0]} requête(s), {first[2]} octets")
+    print(f"[{mode}] visite répétée : {repeat[0]:.1f} requête(s) dont {repeat[1]:.1f} 304, {repeat[2]:.0f} octets")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--visits", type=int, default=5)
+    args = parser.parse_args()
+    seed()
+    static_assets.build_precompressed()
+    for mode in ("plain", "hashed"):
+        asyncio.run(run(mode, args.visits))
+
+
+if __name__ == "__main__":
+    main_cli()
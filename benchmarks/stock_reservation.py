@@ -0,0 +1,117 @@
+"""Test de charge du décrément de stock : plusieurs threads achètent le même produit.
+
+Usage : python -m benchmarks.stock_reservation [--threads 32] [--stock 500] [--attempts 50]
+
+Compare l'ancienne lecture-modification-écriture de payment_success (mode "legacy") au
+décrément conditionnel de stock.reserve_stock (mode "atomic") et vérifie l'absence de survente.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_app_engine
+from models import Product
+from stock import reserve_stock
+
+
+def legacy_purchase(db, product_id, quantity):
+    # Reproduction de l'ancien code : lecture sans verrou puis écriture.
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if product and product.stock >= quantity:
+        product.stock -= quantity
+        db.commit()
+        return True
+    db.rollback()
+    return False
+
+
+def atomic_purchase(db, product_id, quantity):
+    result = reserve_stock(db, {product_id: quantity})
+    db.commit()
+    return result.ok
+
+
+def run(mode, threads, initial_stock, attempts):
+    tmpdir = tempfile.mkdtemp()
+    engine = create_app_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", busy_timeout=30000)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    with Session() as db:
+        product = Product(name="Bench", price=10.0, image="bench.webp", stock=initial_stock)
+        db.add(product)
+        db.commit()
+        product_id = product.id
+
+    purchase = atomic_purchase if mode == "atomic" else legacy_purchase
+    sold = [0] * threads
+    errors = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(index):
+        barrier.wait()
+        for _ in range(attempts):
+            db = Session()
+            try:
+                if purchase(db, product_id, 1):
+                    sold[index] += 1
+            except OperationalError:
+                db.rollback()
+                errors[index] += 1
+            finally:
+                db.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with Session() as db:
+        final_stock = db.query(Product.stock).filter(Product.id == product_id).scalar()
+    engine.dispose()
+
+    total_sold = sum(sold)
+    return {
+        "mode": mode,
+        "attempts": threads * attempts,
+        "sold": total_sold,
+        "final_stock": final_stock,
+        "oversold": max(0, total_sold - initial_stock),
+        "lost_updates": total_sold - (initial_stock - final_stock),
+        "errors": sum(errors),
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round(threads * attempts / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=50, help="tentatives d'achat par thread")
+    parser.add_argument("--mode", choices=["atomic", "legacy", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["legacy", "atomic"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        result = run(mode, args.threads, args.stock, args.attempts)
+        print(
+            f"{result['mode']:>6} : {result['sold']} vendus / stock initial {args.stock}, "
+            f"stock final {result['final_stock']}, survente {result['oversold']}, "
+            f"mises à jour perdues {result['lost_updates']}, erreurs {result['errors']}, "
+            f"{result['ops_per_second']} achats/s"
+        )
+        if mode == "atomic":
+            assert result["oversold"] == 0 and result["lost_updates"] == 0, "survente détectée"
+
+
+if __name__ == "__main__":
+    main()
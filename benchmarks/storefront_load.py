@@ -0,0 +1,351 @@
+"""Charge réaliste de la boutique sur une base remplie par benchmarks.seed ; rapport JSON par route.
+
+Usage : python -m benchmarks.storefront_load [--target inprocess|uvicorn] [--workers 2] [--scale small]
+                                             [--users 16] [--seconds 20] [--warmup 3] [--seed 42]
+                                             [--mix browse=70,cart=15,login=10,checkout=5]
+                                             [--output resultat.json] [--compare reference.json]
+
+Chaque utilisateur virtuel (ses propres cookies, sa propre graine) enchaîne des parcours tirés
+selon --mix : navigation (accueil, fiches, recherche, API du catalogue), panier, connexion et
+profil, achat complet contre fake_stripe.py (session Checkout, paiement, webhook signé, page de
+succès). --target inprocess pilote l'application ASGI en mémoire via httpx ; --target uvicorn la
+lance dans un processus uvicorn séparé (--workers) et passe par TCP.
+
+Le rapport donne le débit et les latences p50/p95/p99 par route ; --compare le confronte à un
+rapport précédent (autre commit) et sort en erreur si une route régresse au-delà de --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+os.environ.setdefault("STRIPE_API_BASE", f"http://127.0.0.1:{free_port()}")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # Tous les clients virtuels partagent 127.0.0.1
+os.environ.setdefault("METRICS_PUBLIC", "1")  # /metrics sert de sonde de disponibilité au serveur lancé
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+import fake_stripe  # noqa: E402
+import migrations  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from benchmarks.seed import BENCH_PASSWORD, SCALES, WORDS, seed, username  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from models import Product, User  # noqa: E402
+from search import search_index  # noqa: E402
+
+DEFAULT_MIX = {"browse": 70, "cart": 15, "login": 10, "checkout": 5}
+SORTS = ["id", "price", "price_desc", "name", "rating"]
+READY_TIMEOUT = 30
+
+
+class Recorder:
+    """Latences par route (gabarit d'URL, pas l'URL elle-même), ignorées pendant le préchauffage."""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}
+        self.errors = {}
+        self.journeys = {}
+
+    async def request(self, client, method, route, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        if self.recording:
+            label = f"{method} {route}"
+            self.latencies.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+            if failed:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+    def journey_done(self, name):
+        if self.recording:
+            self.journeys[name] = self.journeys.get(name, 0) + 1
+
+
+class Storefront:
+    """Parcours d'un visiteur ; `products` et `users` viennent de la base remplie."""
+
+    def __init__(self, recorder, product_ids, user_count, stripe):
+        self.recorder = recorder
+        self.product_ids = product_ids
+        # Les fiches les plus populaires sont les plus vues, comme dans benchmarks.seed.
+        self.weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+        self.user_count = user_count
+        self.stripe = stripe
+
+    def product(self, rng):
+        return rng.choices(self.product_ids, self.weights)[0]
+
+    async def browse(self, client, rng):
+        r = self.recorder
+        await r.request(client, "GET", "/", "/")
+        for _ in range(rng.randint(1, 4)):
+            product_id = self.product(rng)
+            await r.request(client, "GET", "/product/{product_id}", f"/product/{product_id}")
+        if rng.random() < 0.5:
+            await r.request(client, "GET", "/search", "/search", params={"q": rng.choice(WORDS)})
+        if rng.random() < 0.5:
+            params = {"sort": rng.choice(SORTS)}
+            if rng.random() < 0.5:
+                params["max_price"] = rng.randrange(10, 60)
+            await r.request(client, "GET", "/api/products", "/api/products", params=params)
+
+    async def cart(self, client, rng):
+        r = self.recorder
+        added = [self.product(rng) for _ in range(rng.randint(1, 3))]
+        for product_id in added:
+            await r.request(client, "POST", "/add-to-cart", "/add-to-cart", data={"product_id": str(product_id)})
+        await r.request(client, "GET", "/cart", "/cart")
+        await r.request(client, "POST", "/remove-from-cart", "/remove-from-cart", data={"product_id": str(added[0])})
+
+    async def login(self, client, rng):
+        r = self.recorder
+        data = {"username": username(rng.randrange(self.user_count)), "password": BENCH_PASSWORD}
+        await r.request(client, "POST", "/login", "/login", data=data)
+        await r.request(client, "GET", "/profile", "/profile")
+        await r.request(client, "GET", "/logout", "/logout")
+
+    async def checkout(self, client, rng):
+        r = self.recorder
+        await r.request(client, "POST", "/add-to-cart", "/add-to-cart", data={"product_id": str(self.product(rng))})
+        response = await r.request(client, "POST", "/create-cart-checkout-session", "/create-cart-checkout-session")
+        if response is None or response.status_code != 303:
+            return
+        # Le client joue Stripe : paiement sur la page du faux serveur, puis webhook signé vers l'application.
+        pay_url = response.headers["location"]
+        async with httpx.AsyncClient() as stripe_client:
+            await stripe_client.get(pay_url)
+        session = self.stripe.sessions[pay_url.rsplit("/", 1)[1]]
+        payload = fake_stripe.completed_event(session)
+        headers = {"Stripe-Signature": fake_stripe.sign_payload(payload, self.stripe.webhook_secret),
+                   "Content-Type": "application/json"}
+        await r.request(client, "POST", "/stripe/webhook", "/stripe/webhook", content=payload, headers=headers)
+        await r.request(client, "GET", "/success", "/success", params={"session_id": session["id"]})
+
+
+async def virtual_user(storefront, make_client, mix, rng, deadline):
+    names, weights = list(mix), list(mix.values())
+    async with make_client() as client:
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            await getattr(storefront, name)(client, rng)
+            storefront.recorder.journey_done(name)
+
+
+async def drive(storefront, make_client, args, mix):
+    """Préchauffage puis mesure ; renvoie la durée mesurée."""
+    loop_started = time.perf_counter()
+    deadline = loop_started + args.warmup + args.seconds
+    users = [
+        virtual_user(storefront, make_client, mix, random.Random(args.seed * 1000 + index), deadline)
+        for index in range(args.users)
+    ]
+
+    async def start_recording():
+        await asyncio.sleep(args.warmup)
+        storefront.recorder.recording = True
+
+    started = loop_started + args.warmup
+    await asyncio.gather(start_recording(), *users)
+    return time.perf_counter() - started
+
+
+async def run_inprocess(storefront, args, mix):
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport n'envoie pas les événements lifespan : on démarre le worker des commandes nous-mêmes.
+    async with main.app.router.lifespan_context(main.app):
+        return await drive(storefront, lambda: httpx.AsyncClient(transport=transport, base_url="http://bench"), args, mix)
+
+
+def start_uvicorn(workers):
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    env = {**os.environ, "AUTO_MIGRATE": "0"}  # Base migrée par le benchmark : les workers ne font que vérifier
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + READY_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn s'est arrêté au démarrage")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=1).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"uvicorn ne répond pas après {READY_TIMEOUT} s")
+
+
+async def run_uvicorn(storefront, args, mix):
+    server, base_url = start_uvicorn(args.workers)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    try:
+        return await drive(storefront, lambda: httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30), args, mix)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(scale, rng_seed):
+    migrations.upgrade(engine, log=lambda message: None)
+    search_index.configure(engine)
+    with SessionLocal() as db:
+        if not db.scalar(select(func.count()).select_from(Product)):
+            counts = seed(db, scale, rng_seed, log=lambda message: print(message, file=sys.stderr))
+        else:
+            print("ℹ️ Base déjà remplie : réutilisée telle quelle.", file=sys.stderr)
+            counts = {table.__tablename__: db.scalar(select(func.count()).select_from(table)) for table in (Product, User)}
+        product_ids = db.scalars(select(Product.id).order_by(Product.id)).all()
+        user_count = db.scalar(select(func.count()).select_from(User).where(User.username.like("bench-%")))
+    return counts, product_ids, user_count
+
+
+def report(recorder, elapsed, args, mix, dataset):
+    routes = {}
+    for label, samples in sorted(recorder.latencies.items()):
+        routes[label] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(label, 0),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "max_ms": round(max(samples), 3),
+        }
+    requests = sum(route["count"] for route in routes.values())
+    return {
+        "benchmark": "storefront_load",
+        "revision": git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "target": args.target, "workers": args.workers if args.target == "uvicorn" else None,
+            "users": args.users, "seconds": args.seconds, "warmup": args.warmup, "seed": args.seed,
+            "scale": args.scale, "mix": mix, "stripe_latency": args.stripe_latency,
+        },
+        "dataset": dataset,
+        "totals": {
+            "seconds": round(elapsed, 3),
+            "requests": requests,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "throughput_rps": round(requests / elapsed, 2),
+            "journeys": recorder.journeys,
+        },
+        "routes": routes,
+    }
+
+
+def compare(current, reference, tolerance):
+    """Affiche l'écart avec un rapport de référence ; renvoie les routes dont le p95 a régressé."""
+    regressions = []
+    print(f"\nComparaison avec {reference.get('revision')} (tolérance {tolerance:.0%}) :", file=sys.stderr)
+    if reference.get("config") != current["config"]:
+        print("  ⚠️ configurations différentes (cible, utilisateurs, mélange...) : écarts peu comparables", file=sys.stderr)
+    for label, route in current["routes"].items():
+        before = reference.get("routes", {}).get(label)
+        if not before:
+            print(f"  {label:<38} nouvelle route", file=sys.stderr)
+            continue
+        ratio = route["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(label)
+        print(f"  {label:<38} p95 {before['p95_ms']:8.2f} → {route['p95_ms']:8.2f} ms ({ratio - 1:+6.1%})"
+              f"{'  ⚠️ régression' if regressed else ''}", file=sys.stderr)
+    before_rps, after_rps = reference["totals"]["throughput_rps"], current["totals"]["throughput_rps"]
+    print(f"  {'débit total':<38} {before_rps:8.1f} → {after_rps:8.1f} req/s", file=sys.stderr)
+    return regressions
+
+
+def parse_mix(raw):
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"parcours inconnu : {name} (parmi {', '.join(DEFAULT_MIX)})")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=2, help="processus uvicorn (--target uvicorn)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int, default=16, help="utilisateurs virtuels simultanés")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--stripe-latency", type=float, default=0.05, help="latence du faux Stripe, en secondes")
+    parser.add_argument("--output", help="fichier JSON du rapport (sinon sortie standard)")
+    parser.add_argument("--compare", help="rapport JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="hausse du p95 tolérée avant régression")
+    args = parser.parse_args()
+
+    dataset, product_ids, user_count = prepare_database(SCALES[args.scale], args.seed)
+    port = int(os.environ["STRIPE_API_BASE"].rsplit(":", 1)[1])
+    stripe, _ = fake_stripe.serve_in_thread(port, latency=args.stripe_latency)
+    storefront = Storefront(Recorder(), product_ids, user_count, stripe)
+    runner = run_uvicorn if args.target == "uvicorn" else run_inprocess
+    elapsed = asyncio.run(runner(storefront, args, args.mix))
+
+    result = report(storefront.recorder, elapsed, args, args.mix, dataset)
+    for label, route in result["routes"].items():
+        print(f"[{label:<38}] {route['throughput_rps']:7.1f} req/s | p50 {route['p50_ms']:7.2f} | "
+              f"p95 {route['p95_ms']:7.2f} | p99 {route['p99_ms']:7.2f} ms | erreurs {route['errors']}", file=sys.stderr)
+    totals = result["totals"]
+    print(f"Total : {totals['requests']} requêtes en {totals['seconds']:.1f} s ({totals['throughput_rps']:.1f} req/s), "
+          f"{totals['errors']} erreurs", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(result, stream, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as stream:
+            regressions = compare(result, json.load(stream), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,152 @@
+"""Rejeu de webhooks checkout.session.completed synthétiques : accusé de réception et débit du worker.
+
+Usage : python -m benchmarks.webhook_replay [--events 5000] [--duplicates 0.1] [--concurrency 32]
+
+Chaque événement est signé comme par Stripe et posté sur /stripe/webhook ; une partie est livrée
+deux fois (Stripe rejoue les webhooks). La file est ensuite vidée par lots de 1 puis de 50 ; on
+vérifie qu'il y a exactement une commande par session et que le stock décrémenté est cohérent.
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")  # Base neuve : migrée à l'import de main
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+os.environ["FULFILMENT_WORKER"] = "0"
+
+import httpx  # noqa: E402
+from sqlalchemy import delete, func, select, update  # noqa: E402
+
+import fake_stripe  # noqa: E402
+import fulfilment  # noqa: E402
+import main  # noqa: E402
+from benchmarks.mixed_load import percentile  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import FulfilmentJob, Order, OrderItem, Product, User  # noqa: E402
+
+PRODUCTS = 200
+USERS = 100
+INITIAL_STOCK = 1_000_000
+
+
+def seed():
+    with SessionLocal() as db:
+        if not db.query(Product).first():
+            db.execute(Product.__table__.insert(), [
+                {"name": f"Produit {i}", "price": round(5 + i * 0.37, 2), "image": "bench.webp", "stock": INITIAL_STOCK}
+                for i in range(PRODUCTS)
+            ])
+            db.execute(User.__table__.insert(), [
+                {"username": f"bench{i}", "hashed_password": "x", "is_admin": False} for i in range(USERS)
+            ])
+            db.commit()
+        return db.scalars(select(Product)).all()
+
+
+def reset():
+    with SessionLocal() as db:
+        db.execute(delete(FulfilmentJob))
+        db.execute(delete(OrderItem))
+        db.execute(delete(Order))
+        db.execute(update(Product).values(stock=INITIAL_STOCK))
+        db.commit()
+
+
+def synthetic_events(products, count, duplicate_rate, rng):
+    """Corps signés des webhooks, doublons compris, et quantités attendues par produit."""
+    bodies, expected = [], {}
+    for _ in range(count):
+        lines = [(p, rng.randint(1, 3)) for p in rng.sample(products, rng.randint(1, 4))]
+        user_id = rng.randint(1, USERS) if rng.random() < 0.8 else None
+        cart_token = secrets.token_urlsafe(16)
+        session = {
+            "id": "cs_test_" + secrets.token_hex(12),
+            "object": "checkout.session",
+            "payment_status": "paid",
+            "amount_total": sum(int(round(p.price * 100)) * q for p, q in lines),
+            "metadata": fulfilment.checkout_metadata(user_id, cart_token, rng.choice(["cart", "direct"]), lines),
+        }
+        body = fake_stripe.completed_event(session)
+        bodies.append(body)
+        if rng.random() < duplicate_rate:
+            bodies.append(body)
+        for product, quantity in lines:
+            expected[product.id] = expected.get(product.id, 0) + quantity
+    rng.shuffle(bodies)
+    return bodies, expected
+
+
+async def deliver(bodies, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies, pending = [], iter(bodies)
+    secret = os.environ["STRIPE_WEBHOOK_SECRET"]
+
+    async def sender():
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for body in pending:
+                headers = {"Stripe-Signature": fake_stripe.sign_payload(body, secret), "Content-Type": "application/json"}
+                started = time.perf_counter()
+                response = await client.post("/stripe/webhook", content=body, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def drain(batch_size):
+    queue = fulfilment.FulfilmentQueue(batch_size=batch_size)
+    started = time.perf_counter()
+    while queue.run_once():
+        pass
+    return queue, time.perf_counter() - started
+
+
+def check(unique_sessions, expected):
+    with SessionLocal() as db:
+        jobs = db.scalar(select(func.count()).select_from(FulfilmentJob))
+        done = db.scalar(select(func.count()).where(FulfilmentJob.status == "done"))
+        with_user = db.scalar(select(func.count()).where(FulfilmentJob.payload.not_like('%"user_id": null%')))
+        orders = db.scalar(select(func.count()).select_from(Order))
+        stocks = dict(db.execute(select(Product.id, Product.stock)).all())
+    sold = {pid: INITIAL_STOCK - stock for pid, stock in stocks.items() if stock != INITIAL_STOCK}
+    problems = []
+    if jobs != unique_sessions or done != unique_sessions:
+        problems.append(f"{jobs} jobs / {done} traités pour {unique_sessions} sessions")
+    if orders != with_user:
+        problems.append(f"{orders} commandes pour {with_user} sessions d'utilisateurs connectés")
+    if sold != expected:
+        problems.append("stock décrémenté incohérent")
+    return problems
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    products = seed()
+    for batch_size in (1, fulfilment.FULFILMENT_BATCH_SIZE):
+        reset()
+        rng = random.Random(args.seed)
+        bodies, expected = synthetic_events(products, args.events, args.duplicates, rng)
+        latencies, elapsed = asyncio.run(deliver(bodies, args.concurrency))
+        queue, drained = drain(batch_size)
+        problems = check(args.events, expected)
+        print(f"[lots de {batch_size:>3}] {len(bodies)} webhooks en {elapsed:5.1f} s | accusé p50 "
+              f"{percentile(latencies, 50):6.2f} ms p99 {percentile(latencies, 99):6.2f} ms | worker "
+              f"{queue.processed / drained:7.0f} commandes/s ({queue.batches} lots) | "
+              f"{'OK' if not problems else ' ; '.join(problems)}")
+
+
+if __name__ == "__main__":
+    main_cli()
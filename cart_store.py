@@ -0,0 +1,298 @@
+import os
+import secrets
+import threading
+import time
+
+from sqlalchemy import text
+
+from database import SessionLocal
+from signed_session import SESSION_CART_MAX_ITEMS, SESSION_MODE
+
+# "database" : table cart_items partagée entre les workers ; "memory" : dictionnaire local
+# (remplaçant d'un Redis pour le développement, non partagé entre processus) ; "session" : le
+# panier voyage dans le cookie signé (SESSION_MODE=signed), sans aucun stockage côté serveur.
+CART_BACKEND = os.getenv("CART_BACKEND", "session" if SESSION_MODE == "signed" else "database")
+CART_TTL = int(os.getenv("CART_TTL_SECONDS", str(7 * 24 * 3600)))
+CART_SWEEP_INTERVAL = int(os.getenv("CART_SWEEP_INTERVAL", "300"))
+
+SESSION_KEY = "cart_token"
+SESSION_ITEMS_KEY = "cart_items"
+PENDING_CHECKOUT_KEY = "checkout"
+CHECKOUT_NONCE_KEY = "checkout_nonce"
+CHECKOUT_STARTED_KEY = "checkout_started_at"
+# Un double clic ou un rechargement dans ce délai retrouve la session Stripe déjà créée ; au-delà,
+# chaque passage en caisse reçoit un nouveau jeton (et donc une nouvelle session).
+CHECKOUT_RETRY_WINDOW = int(os.getenv("CHECKOUT_RETRY_WINDOW", "10"))
+
+
+class MemoryCartBackend:
+    """Paniers en mémoire, façon hash Redis (HINCRBY + EXPIRE)."""
+
+    def __init__(self, ttl=CART_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._carts = {}
+        self._expires = {}
+
+    def _alive(self, token, now):
+        expires = self._expires.get(token)
+        if expires is None:
+            return False
+        if expires <= now:
+            self._carts.pop(token, None)
+            self._expires.pop(token, None)
+            return False
+        return True
+
+    def get(self, token):
+        with self._lock:
+            if not self._alive(token, time.time()):
+                return {}
+            return dict(self._carts[token])
+
+    def add(self, token, product_id, delta):
+        now = time.time()
+        with self._lock:
+            if not self._alive(token, now):
+                self._carts[token] = {}
+            items = self._carts[token]
+            quantity = items.get(product_id, 0) + delta
+            if quantity > 0:
+                items[product_id] = quantity
+            else:
+                items.pop(product_id, None)
+            self._expires[token] = now + self.ttl
+
+    def clear(self, token):
+        with self._lock:
+            self._carts.pop(token, None)
+            self._expires.pop(token, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [token for token, expires in self._expires.items() if expires <= now]
+            for token in expired:
+                self._carts.pop(token, None)
+                self._expires.pop(token, None)
+        return len(expired)
+
+
+class DatabaseCartBackend:
+    """Paniers dans les tables carts/cart_items ; chaque mise à jour est un upsert d'une ligne."""
+
+    def __init__(self, session_factory=SessionLocal, ttl=CART_TTL):
+        self.session_factory = session_factory
+        self.ttl = ttl
+
+    def get(self, token):
+        with self.session_factory() as db:
+            rows = db.execute(text(
+                "SELECT i.product_id, i.quantity FROM cart_items i JOIN carts c ON c.token = i.token "
+                "WHERE i.token = :token AND c.expires_at > :now"
+            ), {"token": token, "now": time.time()}).all()
+        return {product_id: quantity for product_id, quantity in rows}
+
+    def add(self, token, product_id, delta):
+        params = {"token": token, "product_id": product_id, "delta": delta, "expires_at": time.time() + self.ttl}
+        with self.session_factory() as db:
+            db.execute(text(
+                "INSERT INTO carts (token, expires_at) VALUES (:token, :expires_at) "
+                "ON CONFLICT (token) DO UPDATE SET expires_at = excluded.expires_at"
+            ), params)
+            db.execute(text(
+                "INSERT INTO cart_items (token, product_id, quantity) VALUES (:token, :product_id, :delta) "
+                "ON CONFLICT (token, product_id) DO UPDATE SET quantity = cart_items.quantity + excluded.quantity"
+            ), params)
+            if delta < 0:
+                db.execute(text(
+                    "DELETE FROM cart_items WHERE token = :token AND product_id = :product_id AND quantity <= 0"
+                ), params)
+            db.commit()
+
+    def clear(self, token):
+        with self.session_factory() as db:
+            db.execute(text("DELETE FROM cart_items WHERE token = :token"), {"token": token})
+            db.execute(text("DELETE FROM carts WHERE token = :token"), {"token": token})
+            db.commit()
+
+    def sweep(self):
+        params = {"now": time.time()}
+        with self.session_factory() as db:
+            db.execute(text(
+                "DELETE FROM cart_items WHERE token IN (SELECT token FROM carts WHERE expires_at <= :now)"
+            ), params)
+            removed = db.execute(text("DELETE FROM carts WHERE expires_at <= :now"), params).rowcount
+            db.commit()
+        return removed
+
+
+class CartStore:
+    """Panier côté serveur ; la session ne contient qu'un jeton de taille fixe."""
+
+    def __init__(self, backend, sweep_interval=CART_SWEEP_INTERVAL):
+        self.backend = backend
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def token(self, request, create=False):
+        token = request.session.get(SESSION_KEY)
+        legacy_cart = request.session.pop("cart", None)
+        if token is None and (create or legacy_cart):
+            token = secrets.token_urlsafe(16)
+            request.session[SESSION_KEY] = token
+        # Reprise des anciens paniers stockés en liste d'ids dans le cookie
+        if legacy_cart:
+            for product_id in legacy_cart:
+                self.backend.add(token, int(product_id), 1)
+        return token
+
+    def items(self, request):
+        """Retourne le panier sous la forme {product_id: quantité}."""
+        token = self.token(request)
+        return self.backend.get(token) if token else {}
+
+    def add(self, request, product_id, delta=1):
+        self.backend.add(self.token(request, create=True), product_id, delta)
+        self.maybe_sweep()
+
+    def remove(self, request, product_id, quantity=1):
+        token = self.token(request)
+        if token:
+            self.backend.add(token, product_id, -quantity)
+
+    def clear(self, request):
+        token = self.token(request)
+        if token:
+            self.backend.clear(token)
+
+    def maybe_sweep(self):
+        """Purge les paniers expirés, au plus une fois par intervalle et par worker."""
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.backend.sweep()
+        finally:
+            self._sweep_lock.release()
+
+    def checkout_nonce(self, request):
+        """Jeton de l'achat en cours, inclus dans la clé d'idempotence Stripe.
+
+        Renouvelé une fois la fenêtre de double clic écoulée après la création d'une session : une
+        session déjà payée (ou abandonnée) n'est jamais rejouée, même sans passage par /success.
+        """
+        nonce = request.session.get(CHECKOUT_NONCE_KEY)
+        started = request.session.get(CHECKOUT_STARTED_KEY)
+        if nonce is None or (started is not None and time.time() - started > CHECKOUT_RETRY_WINDOW):
+            request.session.pop(CHECKOUT_STARTED_KEY, None)
+            nonce = request.session[CHECKOUT_NONCE_KEY] = secrets.token_urlsafe(8)
+        return nonce
+
+    def checkout_started(self, request, source, lines):
+        """Appelé à la création de la session de paiement ; le webhook retire lui-même les articles achetés."""
+        request.session.setdefault(CHECKOUT_STARTED_KEY, int(time.time()))
+
+    def checkout_completed(self, request):
+        """Appelé sur la page de succès du paiement : le même panier racheté aura une nouvelle session Stripe."""
+        request.session.pop(CHECKOUT_NONCE_KEY, None)
+        request.session.pop(CHECKOUT_STARTED_KEY, None)
+
+
+class SessionCartBackend:
+    """Rien côté serveur : le webhook ne peut pas modifier un panier rangé dans le cookie du client."""
+
+    def get(self, token):
+        return {}
+
+    def add(self, token, product_id, delta):
+        pass
+
+    def clear(self, token):
+        pass
+
+    def sweep(self):
+        return 0
+
+
+class SessionCartStore(CartStore):
+    """Panier {id: quantité} dans la session signée : ni lecture ni écriture en base.
+
+    Les articles payés sont retirés au retour sur la page de succès (le webhook n'a pas accès au
+    cookie), d'après le contenu de la commande noté dans la session au départ vers Stripe.
+    """
+
+    def token(self, request, create=False):
+        # Le jeton ne sert plus qu'à identifier l'acheteur anonyme auprès de Stripe.
+        token = request.session.get(SESSION_KEY)
+        if token is None and create:
+            token = request.session[SESSION_KEY] = secrets.token_urlsafe(16)
+        return token
+
+    def _items(self, request):
+        return {int(product_id): quantity for product_id, quantity in (request.session.get(SESSION_ITEMS_KEY) or {}).items()}
+
+    def _save(self, request, items):
+        if items:
+            request.session[SESSION_ITEMS_KEY] = items
+        else:
+            request.session.pop(SESSION_ITEMS_KEY, None)
+
+    def items(self, request):
+        legacy_cart = request.session.pop("cart", None)
+        items = self._items(request)
+        if legacy_cart:
+            for product_id in legacy_cart:
+                items[int(product_id)] = items.get(int(product_id), 0) + 1
+            self._save(request, items)
+        return items
+
+    def add(self, request, product_id, delta=1):
+        items = self.items(request)
+        if product_id not in items and len(items) >= SESSION_CART_MAX_ITEMS:
+            return
+        quantity = items.get(product_id, 0) + delta
+        if quantity > 0:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+        self._save(request, items)
+
+    def remove(self, request, product_id, quantity=1):
+        self.add(request, product_id, -quantity)
+
+    def clear(self, request):
+        request.session.pop(SESSION_ITEMS_KEY, None)
+
+    def checkout_started(self, request, source, lines):
+        super().checkout_started(request, source, lines)
+        request.session[PENDING_CHECKOUT_KEY] = {"source": source, "lines": {str(product.id): quantity for product, quantity in lines}}
+
+    def checkout_completed(self, request):
+        super().checkout_completed(request)
+        pending = request.session.pop(PENDING_CHECKOUT_KEY, None)
+        if not pending:
+            return
+        if pending["source"] == "cart":
+            self.clear(request)
+            return
+        items = self.items(request)
+        for product_id, quantity in pending["lines"].items():
+            if items.get(int(product_id)):
+                items[int(product_id)] -= min(quantity, items[int(product_id)])
+        self._save(request, {product_id: quantity for product_id, quantity in items.items() if quantity > 0})
+
+
+def create_backend(name=CART_BACKEND):
+    if name == "memory":
+        return MemoryCartBackend()
+    if name == "database":
+        return DatabaseCartBackend()
+    if name == "session":
+        return SessionCartBackend()
+    raise ValueError(f"CART_BACKEND inconnu : {name}")
+
+
+cart_store = SessionCartStore(SessionCartBackend()) if CART_BACKEND == "session" else CartStore(create_backend())
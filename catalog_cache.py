@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+
+from sqlalchemy import func, text
+
+from models import Product
+
+# Durée de vie du cache (en secondes) : borne la dérive entre plusieurs workers uvicorn,
+# chaque worker ayant son propre cache en mémoire.
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+# Au-delà de ce nombre de produits, on ne garde pas le catalogue en mémoire.
+CATALOG_CACHE_MAX_PRODUCTS = int(os.getenv("CATALOG_CACHE_MAX_PRODUCTS", "10000"))
+# Marqueur de changement de la table products, tous processus confondus : compteur des mises à
+# jour et suppressions (migration catalog_changes) et plus grand id (insertions).
+CHANGE_MARKER_SQL = {
+    "sqlite": text("SELECT counter, (SELECT max(id) FROM products) FROM catalog_changes"),
+    "postgresql": text("SELECT last_value, (SELECT max(id) FROM products) FROM catalog_change_seq"),
+}
+
+
+@dataclass(frozen=True)
+class ProductSnapshot:
+    """Copie figée d'un produit, utilisable hors de toute session SQLAlchemy."""
+    id: int
+    name: str
+    price: float
+    image: str
+    message: str
+    stock: int
+
+    @classmethod
+    def from_orm(cls, product):
+        return cls(
+            id=product.id,
+            name=product.name,
+            price=product.price,
+            image=product.image,
+            message=product.message,
+            stock=product.stock or 0,
+        )
+
+
+class CatalogCache:
+    """Cache versionné du catalogue (produits par id + liste ordonnée par id)."""
+
+    def __init__(self, ttl=CATALOG_CACHE_TTL, max_products=CATALOG_CACHE_MAX_PRODUCTS):
+        self.ttl = ttl
+        self.max_products = max_products
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._ordered = None
+        self._loaded_at = 0.0
+        # Catalogue trop grand pour être retenu : lectures directes en base jusqu'au prochain contrôle.
+        self._oversized = False
+        self._marker = None
+
+    def _is_fresh(self):
+        return self._by_id is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    def _bypassed(self):
+        return self._oversized and (time.monotonic() - self._loaded_at) < self.ttl
+
+    @staticmethod
+    def _change_marker(db):
+        statement = CHANGE_MARKER_SQL.get(db.get_bind().dialect.name)
+        return tuple(db.execute(statement).one()) if statement is not None else None
+
+    def _load(self, db):
+        """Recharge le catalogue ; False s'il est trop grand pour être gardé en mémoire."""
+        self._loaded_at = time.monotonic()
+        marker = self._change_marker(db)
+        if self._oversized:
+            if marker is not None and marker == self._marker:
+                return False  # Rien n'a changé, dans aucun processus
+            self._marker = marker
+            if db.query(func.count(Product.id)).scalar() > self.max_products:
+                # Modifié ailleurs (autre worker, script) : les fragments rendus depuis la base sont à refaire.
+                self.version += 1
+                return False
+        self._marker = marker
+        products = db.query(Product).order_by(Product.id).all()
+        snapshots = [ProductSnapshot.from_orm(p) for p in products]
+        self._oversized = len(snapshots) > self.max_products
+        if self._oversized:
+            self._by_id = None
+            self._ordered = None
+            self.version += 1
+            return False
+        # La version sert de clé aux fragments : inchangée si le catalogue relu est identique.
+        if snapshots != self._ordered:
+            self.version += 1
+        self._ordered = snapshots
+        self._by_id = {p.id: p for p in snapshots}
+        return True
+
+    def _cached(self, db):
+        """Cache utilisable (rechargé si expiré) ; False si le catalogue se lit directement en base."""
+        if self._is_fresh():
+            self.hits += 1
+            return True
+        self.misses += 1
+        return not self._bypassed() and self._load(db)
+
+    def refresh(self, db):
+        """Contrôle de fraîcheur (rechargement, ou compteur de modifications si trop grand) ; renvoie la version."""
+        with self._lock:
+            if not self._is_fresh() and not self._bypassed():
+                self._load(db)
+            return self.version
+
+    def list_products(self, db):
+        """Retourne tous les produits, triés par id."""
+        return self.versioned_products(db)[1]
+
+    def versioned_products(self, db):
+        """Retourne (version, produits) lus de façon cohérente."""
+        with self._lock:
+            if self._cached(db):
+                return self.version, self._ordered
+            version = self.version
+        products = db.query(Product).order_by(Product.id).all()
+        return version, [ProductSnapshot.from_orm(p) for p in products]
+
+    def get_product(self, db, product_id):
+        """Retourne un produit par son id, ou None s'il n'existe pas."""
+        with self._lock:
+            if self._cached(db):
+                return self._by_id.get(product_id)
+        product = db.query(Product).filter(Product.id == product_id).first()
+        return ProductSnapshot.from_orm(product) if product else None
+
+    def get_products(self, db, product_ids):
+        """Produits existants parmi `product_ids`, triés par id (panier) ; une seule requête hors cache."""
+        with self._lock:
+            if self._cached(db):
+                return [self._by_id[i] for i in sorted(product_ids) if i in self._by_id]
+        products = db.query(Product).filter(Product.id.in_(product_ids)).order_by(Product.id).all()
+        return [ProductSnapshot.from_orm(p) for p in products]
+
+    def _rebuild_ordered(self):
+        self._ordered = sorted(self._by_id.values(), key=lambda p: p.id)
+        self.version += 1
+
+    def upsert(self, product):
+        """Ajoute ou remplace un produit après un commit (écriture traversante)."""
+        with self._lock:
+            if not self._is_fresh():
+                self.version += 1
+                return
+            self._by_id[product.id] = ProductSnapshot.from_orm(product)
+            if len(self._by_id) > self.max_products:
+                self._by_id = None
+                self._ordered = None
+                self._oversized = True
+                self.version += 1
+                return
+            self._rebuild_ordered()
+
+    def remove(self, product_id):
+        """Retire un produit supprimé."""
+        with self._lock:
+            if not self._is_fresh():
+                self.version += 1
+                return
+            if self._by_id.pop(product_id, None) is not None:
+                self._rebuild_ordered()
+
+    def patch_stock(self, stocks):
+        """Met à jour le stock de plusieurs produits ({product_id: nouveau_stock})."""
+        with self._lock:
+            if not self._is_fresh():
+                # La version sert aussi de clé aux pages du catalogue rendues sans passer par ce cache.
+                self.version += 1
+                return
+            changed = False
+            for product_id, stock in stocks.items():
+                snapshot = self._by_id.get(product_id)
+                if snapshot is not None and snapshot.stock != stock:
+                    self._by_id[product_id] = replace(snapshot, stock=stock)
+                    changed = True
+            if changed:
+                self._rebuild_ordered()
+
+    def invalidate(self):
+        """Vide le cache ; le prochain accès rechargera depuis la base."""
+        with self._lock:
+            self._by_id = None
+            self._ordered = None
+            self._loaded_at = 0.0
+            self.version += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._by_id) if self._by_id is not None else 0,
+                "ttl": self.ttl,
+                "max_products": self.max_products,
+                "oversized": self._oversized,
+            }
+
+
+catalog = CatalogCache()
@@ -0,0 +1,334 @@
+"""Import/export du catalogue en flux, par lots, et ajustements de stock ensemblistes.
+
+Usage :
+    python catalog_io.py import produits.csv [--format csv|jsonl] [--batch-size 1000]
+    python catalog_io.py export [catalogue.csv|-] [--format csv|jsonl]
+    python catalog_io.py stock --set 50 [--below 10]     (une seule instruction UPDATE)
+    python catalog_io.py stock --add 5
+    python catalog_io.py stock --file stocks.csv [--relative]  (colonnes sku,stock)
+
+Les produits sont identifiés par leur référence `sku` (déduite du nom si la colonne est absente).
+Le fichier est lu par lots de --batch-size lignes : la mémoire reste bornée quelle que soit sa taille.
+"""
+import argparse
+import csv
+import json
+import math
+import re
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from itertools import islice
+
+from sqlalchemy import select, text
+
+import migrations
+from database import SessionLocal, engine
+from models import Product
+from search import search_index
+
+IMPORT_BATCH_SIZE = 5000  # Lignes par executemany et par commit
+EXPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+EXPORT_FIELDS = ["sku", "name", "price", "image", "message", "stock"]
+
+# Colonne absente du fichier (image, message, stock) : un produit existant garde sa valeur,
+# un nouveau reçoit la valeur par défaut.
+UPSERT_SQL = text(
+    "INSERT INTO products (sku, name, price, image, message, stock, rating_avg) "
+    "VALUES (:sku, :name, :price, :image, :message, :stock, 0) "
+    "ON CONFLICT (sku) DO UPDATE SET name = excluded.name, price = excluded.price, "
+    "image = CASE WHEN :keep_image THEN products.image ELSE excluded.image END, "
+    "message = CASE WHEN :keep_message THEN products.message ELSE excluded.message END, "
+    "stock = CASE WHEN :keep_stock THEN products.stock ELSE excluded.stock END"
+)
+STOCK_TABLE_SQL = text("CREATE TEMP TABLE IF NOT EXISTS stock_import (sku TEXT PRIMARY KEY, stock INTEGER NOT NULL)")
+# SQL commun à SQLite et PostgreSQL : ON CONFLICT plutôt que INSERT OR REPLACE, CASE plutôt que max(a, b).
+STOCK_ROW_SQL = text(
+    "INSERT INTO stock_import (sku, stock) VALUES (:sku, :stock) "
+    "ON CONFLICT (sku) DO UPDATE SET stock = excluded.stock"
+)
+STOCK_FROM_FILE_SQL = {
+    "set": text("UPDATE products SET stock = stock_import.stock FROM stock_import WHERE products.sku = stock_import.sku"),
+    "add": text("UPDATE products SET stock = CASE WHEN COALESCE(products.stock, 0) + stock_import.stock < 0 THEN 0 "
+                "ELSE COALESCE(products.stock, 0) + stock_import.stock END "
+                "FROM stock_import WHERE products.sku = stock_import.sku"),
+}
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def product_sku(name):
+    """Référence déduite d'un nom : "Shampoing Lisse & Doux" -> "shampoing-lisse-doux"."""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    ascii_name = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return NON_ALNUM.sub("-", ascii_name).strip("-")
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    upserted: int = 0
+    errors: list = field(default_factory=list)
+    invalid: int = 0  # Lignes rejetées (seules les MAX_REPORTED_ERRORS premières sont détaillées)
+    seconds: float = 0.0
+
+    @property
+    def skipped(self):
+        return self.read - self.upserted
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"ligne {line} : {message}")
+
+
+def read_rows(stream, fmt):
+    """(numéro de ligne, ligne) du fichier, une à la fois (rien n'est chargé d'avance).
+
+    Les lignes CSV sont des dict ; les lignes JSONL restent du texte, décodé par decode_row pour
+    qu'une ligne invalide soit signalée et ignorée comme une ligne CSV invalide.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line, raw in enumerate(stream, 1):
+            if raw.strip():
+                yield line, raw
+    else:
+        raise ValueError(f"Format inconnu : {fmt}")
+
+
+def decode_row(row):
+    """Ligne lue par read_rows -> dict ; ValueError si ce n'est pas un objet JSON valide."""
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            raise ValueError(f"JSON invalide ({e.msg})") from None
+    if not isinstance(row, dict):
+        raise ValueError(f"objet attendu, pas {type(row).__name__}")
+    return row
+
+
+def product_params(row, default_stock=0):
+    """Paramètres d'upsert d'une ligne ; ValueError si elle est invalide."""
+    row = decode_row(row)
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("nom manquant")
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError(f"prix invalide : {row.get('price')!r}")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"prix invalide : {price}")
+    raw_stock = row.get("stock")
+    keep_stock = raw_stock in (None, "")
+    try:
+        stock = default_stock if keep_stock else int(raw_stock)
+    except (TypeError, ValueError):
+        raise ValueError(f"stock invalide : {raw_stock!r}")
+    sku = (row.get("sku") or "").strip() or product_sku(name)
+    if not sku:
+        raise ValueError("référence vide")
+    return {
+        "sku": sku, "name": name, "price": price, "image": (row.get("image") or "").strip(),
+        "message": row.get("message") or None, "stock": max(stock, 0),
+        "keep_image": "image" not in row, "keep_message": "message" not in row, "keep_stock": keep_stock,
+    }
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_products(db, rows, batch_size=IMPORT_BATCH_SIZE, default_stock=0, reindex=True, progress=None):
+    """Upsert des lignes (line, row) par lots (un executemany et un commit par lot) ; renvoie un ImportReport.
+
+    `rows` vient de read_rows, ou de enumerate(liste de dict, 1) pour des produits en mémoire.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    for chunk in chunks(rows, batch_size):
+        params = {}
+        for line, row in chunk:
+            report.read += 1
+            try:
+                param = product_params(row, default_stock)
+            except ValueError as e:
+                report.error(line, e)
+                continue
+            # Deux lignes du même lot avec la même référence : la dernière l'emporte.
+            params[param["sku"]] = param
+        if params:
+            db.execute(UPSERT_SQL, list(params.values()))
+            db.commit()
+            report.upserted += len(params)
+        if progress:
+            progress(report)
+    if reindex and report.upserted and search_index.enabled:
+        search_index.rebuild(db)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def export_products(db, batch_size=EXPORT_BATCH_SIZE):
+    """Produits triés par id, lus par pages (pagination par clé) : jamais tout le catalogue en mémoire."""
+    last_id = 0
+    columns = [getattr(Product, name) for name in EXPORT_FIELDS]
+    while True:
+        rows = db.execute(select(Product.id, *columns).where(Product.id > last_id).order_by(Product.id).limit(batch_size)).all()
+        if not rows:
+            return
+        for row in rows:
+            yield {name: getattr(row, name) for name in EXPORT_FIELDS}
+        last_id = rows[-1].id
+
+
+def write_rows(rows, stream, fmt):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == "jsonl":
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Format inconnu : {fmt}")
+    return count
+
+
+def adjust_stock(db, set_to=None, add=None, below=None):
+    """Ajustement de stock de tout le catalogue (ou des produits sous `below`) en une instruction."""
+    if (set_to is None) == (add is None):
+        raise ValueError("Indiquer soit set_to, soit add")
+    if set_to is not None:
+        statement, params = "UPDATE products SET stock = :value", {"value": set_to}
+    else:
+        statement, params = ("UPDATE products SET stock = CASE WHEN COALESCE(stock, 0) + :value < 0 THEN 0 "
+                             "ELSE COALESCE(stock, 0) + :value END"), {"value": add}
+    if below is not None:
+        statement += " WHERE COALESCE(stock, 0) < :below"
+        params["below"] = below
+    updated = db.execute(text(statement), params).rowcount
+    db.commit()
+    return updated
+
+
+def stock_params(row):
+    """Paramètres d'une ligne (sku, stock) ; ValueError si elle est invalide."""
+    row = decode_row(row)
+    sku = (row.get("sku") or "").strip()
+    if not sku:
+        raise ValueError("référence manquante")
+    try:
+        stock = int(row.get("stock"))
+    except (TypeError, ValueError):
+        raise ValueError(f"stock invalide : {row.get('stock')!r}")
+    return {"sku": sku, "stock": stock}
+
+
+def stock_from_file(db, rows, mode="set", batch_size=IMPORT_BATCH_SIZE):
+    """Stocks lus depuis un fichier (sku,stock) : chargés dans une table temporaire, appliqués en un UPDATE ... FROM.
+
+    Les lignes invalides sont signalées dans le rapport et ignorées ; `upserted` compte les produits mis à jour.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    db.execute(STOCK_TABLE_SQL)
+    db.execute(text("DELETE FROM stock_import"))
+    for chunk in chunks(rows, batch_size):
+        params = []
+        for line, row in chunk:
+            report.read += 1
+            try:
+                params.append(stock_params(row))
+            except ValueError as e:
+                report.error(line, e)
+        if params:
+            db.execute(STOCK_ROW_SQL, params)
+    report.upserted = db.execute(STOCK_FROM_FILE_SQL[mode]).rowcount
+    db.execute(text("DROP TABLE stock_import"))
+    db.commit()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="importe (ou met à jour) des produits")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"])
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    export_parser = commands.add_parser("export", help="exporte le catalogue")
+    export_parser.add_argument("path", nargs="?", default="-")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"])
+    stock_parser = commands.add_parser("stock", help="ajuste les stocks")
+    action = stock_parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--set", type=int, dest="set_to", help="fixe le stock")
+    action.add_argument("--add", type=int, help="ajoute (ou retire) une quantité au stock")
+    action.add_argument("--file", help="stocks par référence (colonnes sku,stock)")
+    stock_parser.add_argument("--below", type=int, help="limite --set/--add aux produits sous ce stock")
+    stock_parser.add_argument("--relative", action="store_true", help="avec --file : quantités ajoutées au stock")
+    args = parser.parse_args()
+
+    migrations.verify(engine)
+    search_index.configure(engine)
+    with SessionLocal() as db:
+        if args.command == "import":
+            def progress(report):
+                print(f"\r🔄 {report.read} lignes lues ({report.read / (time.perf_counter() - started):.0f} lignes/s)",
+                      end="", file=sys.stderr)
+
+            started = time.perf_counter()
+            with open(args.path, newline="", encoding="utf-8") as stream:
+                report = import_products(db, read_rows(stream, detect_format(args.path, args.format)),
+                                         batch_size=args.batch_size, progress=progress)
+            print(file=sys.stderr)
+            for error in report.errors:
+                print(f"⚠️ {error}")
+            print(f"✅ {report.upserted} produits importés, {report.skipped} lignes ignorées, "
+                  f"en {report.seconds:.1f} s ({report.rows_per_second:.0f} lignes/s).")
+        elif args.command == "export":
+            fmt = detect_format(args.path, args.format)
+            if args.path == "-":
+                count = write_rows(export_products(db), sys.stdout, fmt)
+            else:
+                with open(args.path, "w", newline="", encoding="utf-8") as stream:
+                    count = write_rows(export_products(db), stream, fmt)
+            print(f"✅ {count} produits exportés.", file=sys.stderr)
+        elif args.file:
+            with open(args.file, newline="", encoding="utf-8") as stream:
+                report = stock_from_file(db, read_rows(stream, detect_format(args.file, None)),
+                                         mode="add" if args.relative else "set")
+            for error in report.errors:
+                print(f"⚠️ {error}")
+            print(f"✅ Stock mis à jour pour {report.upserted} produits, {report.invalid} lignes invalides ignorées.")
+        else:
+            updated = adjust_stock(db, set_to=args.set_to, add=args.add, below=args.below)
+            print(f"✅ Stock mis à jour pour {updated} produits.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import base64
+import json
+import os
+from dataclasses import asdict, dataclass, replace
+from urllib.parse import urlencode
+
+from sqlalchemy import select, tuple_
+
+from catalog_cache import ProductSnapshot
+from models import Product
+from search import search_index
+
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24"))
+CATALOG_MAX_PAGE_SIZE = 100
+
+# Tri -> (colonne, décroissant ?). L'id départage les égalités ; chaque tri a son index (colonne, id).
+SORTS = {
+    "id": (Product.id, False),
+    "price": (Product.price, False),
+    "price_desc": (Product.price, True),
+    "name": (Product.name, False),
+    "rating": (Product.rating_avg, True),
+}
+SORT_LABELS = {
+    "id": "Par défaut",
+    "price": "Prix croissant",
+    "price_desc": "Prix décroissant",
+    "name": "Nom",
+    "rating": "Mieux notés",
+}
+
+
+def encode_cursor(value, product_id):
+    raw = json.dumps([value, product_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, product_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Curseur de pagination invalide")
+    if not isinstance(product_id, int):
+        raise ValueError("Curseur de pagination invalide")
+    return value, product_id
+
+
+def parse_price(raw, name):
+    if raw in (None, ""):
+        return None
+    try:
+        price = float(raw)
+    except ValueError:
+        raise ValueError(f"Paramètre {name} invalide")
+    if price < 0:
+        raise ValueError(f"Paramètre {name} invalide")
+    return price
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    """Filtres, tri et position d'une page du catalogue ; figée et hashable (clé de cache)."""
+    q: str = ""
+    min_price: float = None
+    max_price: float = None
+    in_stock: bool = False
+    sort: str = "id"
+    after: str = None
+    limit: int = CATALOG_PAGE_SIZE
+
+    @classmethod
+    def from_params(cls, params, default_limit=CATALOG_PAGE_SIZE):
+        """Construit la requête depuis les paramètres d'URL ; ValueError si l'un d'eux est invalide."""
+        sort = params.get("sort") or "id"
+        if sort not in SORTS:
+            raise ValueError("Tri inconnu")
+        after = params.get("after") or None
+        if after is not None:
+            decode_cursor(after)
+        try:
+            limit = int(params.get("limit") or default_limit)
+        except ValueError:
+            raise ValueError("Paramètre limit invalide")
+        return cls(
+            q=(params.get("q") or "").strip(),
+            min_price=parse_price(params.get("min_price"), "min_price"),
+            max_price=parse_price(params.get("max_price"), "max_price"),
+            in_stock=params.get("in_stock") in ("1", "on", "true"),
+            sort=sort,
+            after=after,
+            limit=max(1, min(limit, CATALOG_MAX_PAGE_SIZE)),
+        )
+
+    def query_string(self, **overrides):
+        """Paramètres d'URL de cette requête (sans les valeurs par défaut), avec d'éventuelles modifications."""
+        query = replace(self, **overrides)
+        params = {
+            "q": query.q,
+            "min_price": query.min_price,
+            "max_price": query.max_price,
+            "in_stock": "1" if query.in_stock else None,
+            "sort": query.sort if query.sort != "id" else None,
+            "after": query.after,
+            "limit": query.limit if query.limit != CATALOG_PAGE_SIZE else None,
+        }
+        return urlencode({k: v for k, v in params.items() if v not in (None, "")})
+
+    @property
+    def is_filtered(self):
+        return bool(self.q or self.min_price is not None or self.max_price is not None or self.in_stock)
+
+
+@dataclass(frozen=True)
+class CatalogPage:
+    products: list
+    next_after: str = None
+
+    def as_dict(self):
+        return {
+            "products": [asdict(p) for p in self.products],
+            "next_after": self.next_after,
+        }
+
+
+def build_statement(query):
+    column, descending = SORTS[query.sort]
+    statement = select(Product)
+    if query.q:
+        # Index plein texte si disponible (insensible aux accents), sinon filtre sur le nom.
+        matching = search_index.matching_ids(query.q)
+        if matching is not None:
+            statement = statement.where(Product.id.in_(matching))
+        else:
+            statement = statement.where(Product.name.icontains(query.q, autoescape=True))
+    if query.min_price is not None:
+        statement = statement.where(Product.price >= query.min_price)
+    if query.max_price is not None:
+        statement = statement.where(Product.price <= query.max_price)
+    if query.in_stock:
+        statement = statement.where(Product.stock > 0)
+
+    if query.after is not None:
+        value, last_id = decode_cursor(query.after)
+        if column is Product.id:
+            statement = statement.where(Product.id < last_id if descending else Product.id > last_id)
+        else:
+            # Comparaison de tuples : l'index (colonne, id) est parcouru à partir de la position, sans OFFSET.
+            position = tuple_(column, Product.id)
+            statement = statement.where(position < tuple_(value, last_id) if descending else position > tuple_(value, last_id))
+
+    if descending:
+        statement = statement.order_by(column.desc(), Product.id.desc())
+    else:
+        statement = statement.order_by(column, Product.id)
+    return statement.limit(query.limit + 1)
+
+
+def fetch_page(db, query):
+    """Une page de produits (snapshots) et le curseur `after` de la page suivante."""
+    column, _ = SORTS[query.sort]
+    rows = db.scalars(build_statement(query)).all()
+    page = rows[:query.limit]
+    next_after = None
+    if len(rows) > query.limit:
+        last = page[-1]
+        next_after = encode_cursor(getattr(last, column.key), last.id)
+    return CatalogPage([ProductSnapshot.from_orm(p) for p in page], next_after)
@@ -0,0 +1,198 @@
+"""Réponses du chatbot : intentions lues depuis chat_intents.json, compilées en une seule expression.
+
+Le fichier est relu à chaud quand il change (pas de redémarrage). Les questions de prix ou de
+stock sur un produit cité par son nom sont résolues via un index des noms du catalogue.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from models import Product
+
+CHAT_INTENTS_PATH = os.getenv("CHAT_INTENTS_PATH", "chat_intents.json")
+# Intervalle minimal entre deux vérifications du fichier sur disque
+CONFIG_CHECK_INTERVAL = 2.0
+# Durée de vie de l'index des noms de produits (un produit ajouté y apparaît au plus tard après ce délai)
+CHAT_PRODUCT_INDEX_TTL = float(os.getenv("CHAT_PRODUCT_INDEX_TTL", "60"))
+
+WORD = re.compile(r"\w+")
+STOPWORDS = {"les", "des", "une", "est", "pour", "que", "qui", "quel", "quelle", "quels", "avez", "vous",
+             "votre", "vos", "mon", "mes", "ton", "elle", "il", "sur", "dans", "avec", "pas", "encore"}
+
+
+def normalize(value):
+    """Minuscules sans accents : "Expédition" -> "expedition"."""
+    if value.isascii():
+        return value.lower()
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def trie_pattern(words):
+    """Expression régulière en forme d'arbre des préfixes : "hello|help" -> "hel(?:lo|p)".
+
+    Le moteur `re` essaie les branches d'une alternation l'une après l'autre ; factoriser les
+    préfixes lui permet d'écarter en un seul caractère tous les mots-clés qui ne commencent pas ainsi.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Fin de mot-clé possible ici : la suite est facultative (le plus long est essayé d'abord).
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+class Intent:
+    __slots__ = ("name", "keywords", "response", "product_lookup", "in_stock", "out_of_stock")
+
+    def __init__(self, config):
+        self.name = config["name"]
+        self.keywords = [normalize(k) for k in config["keywords"]]
+        self.response = config["response"]
+        self.product_lookup = bool(config.get("product_lookup"))
+        self.in_stock = config.get("in_stock", "en stock")
+        self.out_of_stock = config.get("out_of_stock", "en rupture de stock")
+
+
+class IntentMatcher:
+    """Tous les mots-clés dans une seule expression compilée ; l'ordre du fichier fixe la priorité."""
+
+    def __init__(self, intents, fallback):
+        self.intents = intents
+        self.fallback = fallback
+        # Mot-clé -> intention la plus prioritaire qui le déclare
+        self.owners = {}
+        for index, intent in enumerate(intents):
+            for keyword in intent.keywords:
+                self.owners.setdefault(keyword, index)
+        self.keywords = set(self.owners)
+        self.pattern = re.compile(trie_pattern(self.owners)) if self.owners else None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls([Intent(item) for item in config["intents"]], config["fallback"])
+
+    def match(self, text):
+        """Intentions présentes dans un texte déjà normalisé, de la plus prioritaire à la moins prioritaire."""
+        if self.pattern is None:
+            return []
+        found = {self.owners[m.group()] for m in self.pattern.finditer(text)}
+        return [self.intents[i] for i in sorted(found)]
+
+
+class ProductNameIndex:
+    """Index mot -> ids des produits dont le nom contient ce mot."""
+
+    def __init__(self, ttl=CHAT_PRODUCT_INDEX_TTL):
+        self.ttl = ttl
+        self._postings = {}
+        self._names = {}
+        self._built_at = None
+
+    def invalidate(self):
+        self._built_at = None
+
+    async def refresh(self, db):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.ttl:
+            return
+        rows = (await db.execute(select(Product.id, Product.name))).all()
+        self._postings, self._names = await run_in_threadpool(self._build, rows)
+        self._built_at = time.monotonic()
+
+    @staticmethod
+    def _build(rows):
+        postings, names = {}, {}
+        for product_id, name in rows:
+            names[product_id] = name
+            for word in set(WORD.findall(normalize(name))):
+                postings.setdefault(word, set()).add(product_id)
+        return postings, names
+
+    def find(self, words):
+        """Produit dont le nom partage le plus de mots avec la question, ou None."""
+        postings = [self._postings[w] for w in set(words) if w in self._postings]
+        if not postings:
+            return None
+        postings.sort(key=len)
+        # Les candidats viennent du mot le plus rare ; les autres mots départagent.
+        best = min(
+            postings[0],
+            key=lambda pid: (-sum(pid in p for p in postings[1:]), len(self._names[pid]), pid),
+        )
+        return best
+
+
+class ChatBot:
+    def __init__(self, path=CHAT_INTENTS_PATH):
+        self.path = path
+        self.products = ProductNameIndex()
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    @property
+    def matcher(self):
+        """Matcher courant, recompilé si le fichier de configuration a changé."""
+        now = time.monotonic()
+        if self._matcher is not None and now - self._checked_at < CONFIG_CHECK_INTERVAL:
+            return self._matcher
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime != self._mtime:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._matcher = IntentMatcher.from_config(json.load(f))
+                    self._mtime = mtime
+            except (OSError, ValueError, KeyError) as e:
+                # Fichier invalide en cours d'édition : on garde les intentions précédentes.
+                if self._matcher is None:
+                    raise
+                print(f"❌ Erreur de chargement de {self.path} : {e}")
+        return self._matcher
+
+    async def answer(self, db, message):
+        matcher = self.matcher
+        text = normalize(message)
+        for intent in matcher.match(text):
+            if not intent.product_lookup:
+                return intent.response
+            reply = await self.product_reply(db, intent, text, matcher.keywords)
+            if reply is not None:
+                return reply
+        return matcher.fallback
+
+    async def product_reply(self, db, intent, text, keywords):
+        await self.products.refresh(db)
+        words = [w for w in WORD.findall(text) if len(w) >= 3 and w not in STOPWORDS and w not in keywords]
+        product_id = self.products.find(words)
+        if product_id is None:
+            return None
+        # Prix et stock lus à jour, par clé primaire
+        product = await db.get(Product, product_id)
+        if product is None:
+            self.products.invalidate()
+            return None
+        stock = product.stock or 0
+        availability = (intent.in_stock if stock > 0 else intent.out_of_stock).format(stock=stock)
+        return intent.response.format(name=product.name, price=f"{product.price:.2f}", stock=stock, availability=availability)
+
+
+chatbot = ChatBot()
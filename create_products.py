@@ -1,10 +1,7 @@
-from database import SessionLocal, Base, engine
-from models import Product
-
-# Crée la table si elle n'existe pas
-Base.metadata.create_all(bind=engine)
-
-db = SessionLocal()
+from catalog_io import import_products
+import migrations
+from database import SessionLocal, engine
+from search import search_index
 
 products_data = [
     {"name": "Shampoing Lisse & Doux", "price": 12.99, "image": "shampoing.webp", "message": "Pour un lissage parfait et cheveux doux."},
@@ -17,19 +14,16 @@ products_data = [
     {"name": "Gel Fixation Légère", "price": 11.99, "image": "gel.webp", "message": "Fixe sans alourdir vos cheveux."}
 ]
 
-for p in products_data:
-    # Vérifie si le produit existe déjà pour éviter les doublons
-    existing_product = db.query(Product).filter(Product.name == p["name"]).first()
-    if not existing_product:
-        product = Product(name=p["name"], price=p["price"], image=p["image"], message=p["message"], stock=50)
-        db.add(product)
-        print(f"Ajouté : {p['name']}")
-    else:
-        # Met à jour l'image et le prix même si le produit existe déjà
-        existing_product.image = p["image"]
-        existing_product.price = p["price"]
-        print(f"Mis à jour : {p['name']}")
 
-db.commit()
-db.close()
-print("✅ Initialisation des produits terminée !")
\ No newline at end of file
+if __name__ == "__main__":
+    # Crée les tables si elles n'existent pas
+    migrations.upgrade(engine)
+    search_index.configure(engine)
+
+    db = SessionLocal()
+    # Upsert par référence (déduite du nom) en une seule instruction ; le stock des produits existants est conservé.
+    report = import_products(db, enumerate(products_data, 1), default_stock=50)
+    print(f"Ajoutés ou mis à jour : {report.upserted} produits")
+
+    db.close()
+    print("✅ Initialisation des produits terminée !")
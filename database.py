@@ -1,11 +1,135 @@
-from sqlalchemy import create_engine
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ecommerce.db"
+from metrics import metrics
+
+load_dotenv()
+
+# En production, DATABASE_URL pointe vers Postgres ; en local on garde le fichier SQLite.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ecommerce.db")
+# Render/Heroku fournissent encore des URL "postgres://", refusées par SQLAlchemy 2.
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+
+def to_async_url(url):
+    """Traduit une URL synchrone vers son pilote asynchrone (aiosqlite, asyncpg)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(SQLALCHEMY_DATABASE_URL)
+
+# Réglages SQLite appliqués à chaque connexion
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # négatif = en Kio (ici 64 Mio)
+    "temp_store": "MEMORY",
+}
+
+# Dimensionnement du pool pour les autres bases (Postgres...)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def enable_sqlite_savepoints(engine):
+    """Rend les SAVEPOINT fiables avec pysqlite.
+
+    pysqlite n'ouvre une transaction qu'avant un INSERT/UPDATE/DELETE : un SAVEPOINT émis en premier
+    deviendrait la transaction elle-même et son RELEASE validerait tout. On ouvre donc la transaction avant.
+    """
+    @event.listens_for(engine, "savepoint")
+    def _begin_before_savepoint(conn, name):
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def set_sqlite_pragmas(engine, pragmas):
+    """Applique les PRAGMA donnés à chaque nouvelle connexion SQLite."""
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def track_queries(engine, on_query):
+    """Appelle on_query(instruction, durée en secondes) après chaque instruction SQL du moteur."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        on_query(statement, time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _drop_timer(exception_context):
+        # Instruction en échec : after_cursor_execute n'est pas appelé.
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def create_app_engine(url=SQLALCHEMY_DATABASE_URL, **pragma_overrides):
+    """Construit le moteur de l'application : PRAGMA pour SQLite, pool dimensionné sinon."""
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        set_sqlite_pragmas(engine, {**SQLITE_PRAGMAS, **pragma_overrides})
+        enable_sqlite_savepoints(engine)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def create_async_app_engine(url=ASYNC_DATABASE_URL, **pragma_overrides):
+    """Équivalent asynchrone de create_app_engine(), pour les routes `async def`."""
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_async_engine(url)
+        set_sqlite_pragmas(engine.sync_engine, {**SQLITE_PRAGMAS, **pragma_overrides})
+        return engine
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+engine = create_app_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+
+# Les routes asynchrones n'ont pas le droit au chargement paresseux après un commit :
+# on garde donc les attributs chargés (expire_on_commit=False).
+async_engine = create_async_app_engine()
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if metrics.enabled:
+    track_queries(engine, metrics.record_query)
+    track_queries(async_engine.sync_engine, metrics.record_query)
+Base = declarative_base()
@@ -0,0 +1,194 @@
+"""Faux serveur Stripe pour les tests et les benchmarks (sessions Checkout uniquement).
+
+Usage : python fake_stripe.py [--port 12111] [--latency 0.2] [--failure-rate 0.1]
+                              [--webhook-url http://127.0.0.1:8000/stripe/webhook]
+puis lancer l'application avec STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_fake
+(et le même STRIPE_WEBHOOK_SECRET des deux côtés).
+
+Les clés d'idempotence sont respectées comme chez Stripe : une requête rejouée renvoie la même
+réponse. Les pannes simulées (500) portent l'en-tête Stripe-Should-Retry pour exercer les
+nouvelles tentatives du client. La page /pay/{id} marque la session payée et envoie le webhook
+checkout.session.completed signé, comme Stripe.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+
+import httpx
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+FAKE_STRIPE_LATENCY = float(os.getenv("FAKE_STRIPE_LATENCY", "0"))
+FAKE_STRIPE_FAILURE_RATE = float(os.getenv("FAKE_STRIPE_FAILURE_RATE", "0"))
+FAKE_STRIPE_WEBHOOK_URL = os.getenv("FAKE_STRIPE_WEBHOOK_URL")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_fake")
+
+KEY_PART = re.compile(r"\[([^\]]*)\]")
+
+
+def parse_form(items):
+    """Décode l'encodage imbriqué de Stripe : line_items[0][price_data][currency]=eur."""
+    root = {}
+    for key, value in items:
+        head = key.split("[", 1)[0]
+        path = [head] + KEY_PART.findall(key[len(head):])
+        node = root
+        for part, following in zip(path, path[1:]):
+            node = node.setdefault(part, {})
+        node[path[-1]] = value
+    return listify(root)
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """En-tête Stripe-Signature d'une charge utile (schéma v1 : HMAC-SHA256 de "horodatage.corps")."""
+    timestamp = int(timestamp or time.time())
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    signature = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def completed_event(session):
+    """Événement checkout.session.completed, sérialisé comme le corps du webhook."""
+    event = {
+        "id": "evt_" + secrets.token_hex(12),
+        "object": "event",
+        "type": "checkout.session.completed",
+        "created": int(time.time()),
+        "data": {"object": session},
+    }
+    return json.dumps(event).encode("utf-8")
+
+
+def listify(node):
+    if not isinstance(node, dict):
+        return node
+    if node and all(k.isdigit() for k in node):
+        return [listify(node[k]) for k in sorted(node, key=int)]
+    return {k: listify(v) for k, v in node.items()}
+
+
+class FakeStripe:
+    def __init__(self, latency=FAKE_STRIPE_LATENCY, failure_rate=FAKE_STRIPE_FAILURE_RATE,
+                 webhook_url=FAKE_STRIPE_WEBHOOK_URL, webhook_secret=STRIPE_WEBHOOK_SECRET):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.sessions = {}
+        self.idempotent = {}
+        self.counters = {"created": 0, "replayed": 0, "failed": 0, "webhooks": 0}
+        self._lock = threading.Lock()
+
+    def create_session(self, params, base_url):
+        session_id = "cs_test_" + secrets.token_hex(12)
+        line_items = params.get("line_items", [])
+        amount_total = sum(int(i["price_data"]["unit_amount"]) * int(i.get("quantity", 1)) for i in line_items)
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": params.get("mode", "payment"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "currency": "eur",
+            "amount_total": amount_total,
+            "line_items": line_items,
+            "metadata": params.get("metadata", {}),
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "url": f"{base_url}pay/{session_id}",
+            "created": int(time.time()),
+        }
+        self.sessions[session_id] = session
+        return session
+
+    async def send_webhook(self, session):
+        payload = completed_event(session)
+        headers = {"Stripe-Signature": sign_payload(payload, self.webhook_secret), "Content-Type": "application/json"}
+        async with httpx.AsyncClient(timeout=10) as client:
+            await client.post(self.webhook_url, content=payload, headers=headers)
+        self.counters["webhooks"] += 1
+
+    def build_app(self):
+        app = FastAPI()
+
+        @app.post("/v1/checkout/sessions")
+        async def create_checkout_session(request: Request):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            key = request.headers.get("idempotency-key")
+            with self._lock:
+                if key and key in self.idempotent:
+                    self.counters["replayed"] += 1
+                    return JSONResponse(self.idempotent[key], headers={"Idempotent-Replayed": "true"})
+            if random.random() < self.failure_rate:
+                self.counters["failed"] += 1
+                return JSONResponse({"error": {"type": "api_error", "message": "Panne simulée"}}, status_code=500,
+                                    headers={"Stripe-Should-Retry": "true"})
+            params = parse_form((await request.form()).multi_items())
+            with self._lock:
+                if key and key in self.idempotent:
+                    self.counters["replayed"] += 1
+                    return JSONResponse(self.idempotent[key], headers={"Idempotent-Replayed": "true"})
+                session = self.create_session(params, str(request.base_url))
+                self.counters["created"] += 1
+                if key:
+                    self.idempotent[key] = session
+            return JSONResponse(session)
+
+        @app.get("/v1/checkout/sessions/{session_id}")
+        def retrieve_checkout_session(session_id: str):
+            session = self.sessions.get(session_id)
+            if session is None:
+                return JSONResponse({"error": {"type": "invalid_request_error", "message": "No such checkout session"}},
+                                    status_code=404)
+            return JSONResponse(session)
+
+        @app.get("/pay/{session_id}")
+        def pay(session_id: str, background_tasks: BackgroundTasks):
+            # Page de paiement simulée : la session est payée immédiatement.
+            session = self.sessions.get(session_id)
+            if session is None:
+                return JSONResponse({"error": "session inconnue"}, status_code=404)
+            session.update(status="complete", payment_status="paid")
+            if self.webhook_url:
+                background_tasks.add_task(self.send_webhook, dict(session))
+            return RedirectResponse(session["success_url"].replace("{CHECKOUT_SESSION_ID}", session_id), status_code=303)
+
+        @app.get("/__stats")
+        def stats():
+            return {**self.counters, "sessions": len(self.sessions)}
+
+        return app
+
+
+def serve_in_thread(port=12111, **options):
+    """Démarre le faux serveur dans un thread (benchmarks) ; renvoie (FakeStripe, uvicorn.Server)."""
+    import uvicorn
+
+    fake = FakeStripe(**options)
+    server = uvicorn.Server(uvicorn.Config(fake.build_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return fake, server
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=FAKE_STRIPE_LATENCY)
+    parser.add_argument("--failure-rate", type=float, default=FAKE_STRIPE_FAILURE_RATE)
+    parser.add_argument("--webhook-url", default=FAKE_STRIPE_WEBHOOK_URL)
+    args = parser.parse_args()
+    fake = FakeStripe(latency=args.latency, failure_rate=args.failure_rate, webhook_url=args.webhook_url)
+    uvicorn.run(fake.build_app(), host="127.0.0.1", port=args.port)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# Les fragments expirent comme le catalogue : un autre worker peut avoir reçu un nouvel avis.
+FRAGMENT_CACHE_TTL = float(os.getenv("FRAGMENT_CACHE_TTL", os.getenv("CATALOG_CACHE_TTL", "30")))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "2048"))
+
+
+class Fragment:
+    """HTML déjà rendu, accompagné de son empreinte et de sa date de dernière modification."""
+    __slots__ = ("key", "html", "digest", "last_modified", "rendered_at")
+
+    def __init__(self, key, html, digest, last_modified, rendered_at):
+        self.key = key
+        self.html = html
+        self.digest = digest
+        self.last_modified = last_modified
+        self.rendered_at = rendered_at
+
+
+class FragmentCache:
+    """Cache LRU de fragments HTML, indexés par nom et invalidés par changement de version."""
+
+    def __init__(self, ttl=FRAGMENT_CACHE_TTL, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._review_versions = {}
+
+    def review_version(self, product_id=None):
+        """Version des avis d'un produit, ou de l'ensemble des avis si product_id est None."""
+        with self._lock:
+            return self._review_versions.get(product_id, 0)
+
+    def bump_reviews(self, product_id):
+        """À appeler après l'ajout d'un avis sur un produit."""
+        with self._lock:
+            for key in (product_id, None):
+                self._review_versions[key] = self._review_versions.get(key, 0) + 1
+
+    def get_or_render(self, name, key, render):
+        """Retourne le fragment `name` pour la version `key`, en le rendant avec `render()` si besoin."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.key == key and (now - entry.rendered_at) < self.ttl:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        html = Markup(render())
+        digest = hashlib.sha1(html.encode("utf-8")).hexdigest()
+        # Si le contenu n'a pas changé (simple rechargement), on garde l'ancienne date.
+        last_modified = entry.last_modified if entry is not None and entry.digest == digest else now
+        fragment = Fragment(key, html, digest, last_modified, now)
+
+        with self._lock:
+            self._entries[name] = fragment
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+fragments = FragmentCache()
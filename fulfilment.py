@@ -0,0 +1,312 @@
+"""Traitement des commandes payées : webhook Stripe -> file durable (table fulfilment_jobs) -> worker.
+
+Le webhook ne fait qu'enregistrer la session payée ; le worker traite les commandes par lots
+(stock, Order/OrderItem, statut du job) dans une seule transaction par lot. Une commande payée
+dont une partie n'est plus en stock passe au statut "short" : les lignes manquantes sont gardées
+dans le job (payload["shortfall"]) pour le remboursement et affichées au tableau de bord.
+
+Usage : python fulfilment.py   (worker autonome, si FULFILMENT_WORKER=0 côté application)
+"""
+import json
+import os
+import secrets
+import threading
+import time
+
+from sqlalchemy import select, text
+
+import analytics
+from cart_store import cart_store
+from catalog_cache import catalog
+from database import SessionLocal
+from models import FulfilmentJob, Order, OrderItem, Product
+from orders import DELETED_PRODUCT_NAME, summarize
+from product_events import product_events
+from stock import reserve_stock
+
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+FULFILMENT_WORKER = os.getenv("FULFILMENT_WORKER", "1") == "1"
+FULFILMENT_BATCH_SIZE = int(os.getenv("FULFILMENT_BATCH_SIZE", "50"))
+FULFILMENT_POLL_INTERVAL = float(os.getenv("FULFILMENT_POLL_INTERVAL", "1.0"))
+FULFILMENT_MAX_ATTEMPTS = int(os.getenv("FULFILMENT_MAX_ATTEMPTS", "5"))
+# Un lot réservé par un worker arrêté brutalement est repris après ce délai.
+FULFILMENT_CLAIM_TIMEOUT = float(os.getenv("FULFILMENT_CLAIM_TIMEOUT", "300"))
+METADATA_VALUE_LIMIT = 500  # Limite de Stripe par valeur de metadata
+PAID_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+ENQUEUE_SQL = text(
+    "INSERT INTO fulfilment_jobs (session_id, payload, status, attempts, created_at) "
+    "VALUES (:session_id, :payload, 'pending', 0, :now) ON CONFLICT (session_id) DO NOTHING"
+)
+# La condition sur le statut est répétée hors de la sous-requête : deux workers ne réservent pas le même job.
+CLAIM_SQL = text(
+    "UPDATE fulfilment_jobs SET status = 'running', claim = :claim, claimed_at = :now "
+    "WHERE (status = 'pending' OR (status = 'running' AND claimed_at < :stale)) AND id IN ("
+    "SELECT id FROM fulfilment_jobs WHERE status = 'pending' OR (status = 'running' AND claimed_at < :stale) "
+    "ORDER BY id LIMIT :limit)"
+)
+
+
+class WebhookError(Exception):
+    """Charge utile ou signature de webhook invalide."""
+
+
+def checkout_metadata(user_id, cart_token, source, lines):
+    """Metadata de la session Stripe : tout ce qu'il faut pour traiter la commande depuis le webhook.
+
+    `lines` : [(produit, quantité), ...]. Les lignes "id:quantité:centimes" sont découpées en
+    plusieurs clés si elles dépassent la taille maximale d'une valeur.
+    """
+    encoded = ";".join(f"{p.id}:{q}:{int(round(p.price * 100))}" for p, q in sorted(lines, key=lambda line: line[0].id))
+    metadata = {"user_id": str(user_id or ""), "cart_token": cart_token or "", "source": source}
+    for index in range(0, max(len(encoded), 1), METADATA_VALUE_LIMIT):
+        metadata[f"lines_{index // METADATA_VALUE_LIMIT}"] = encoded[index:index + METADATA_VALUE_LIMIT]
+    return metadata
+
+
+def parse_lines(metadata):
+    encoded = "".join(metadata[k] for k in sorted((k for k in metadata if k.startswith("lines_")), key=lambda k: int(k[6:])))
+    lines = []
+    for part in filter(None, encoded.split(";")):
+        product_id, quantity, unit_amount = part.split(":")
+        lines.append([int(product_id), int(quantity), int(unit_amount)])
+    return lines
+
+
+def verify_event(payload, signature, secret=None):
+    """Vérifie la signature Stripe-Signature et renvoie l'événement décodé."""
+    secret = secret or STRIPE_WEBHOOK_SECRET
+    if not secret:
+        raise WebhookError("STRIPE_WEBHOOK_SECRET n'est pas configurée")
+    import stripe  # Chargé au premier webhook seulement (démarrage à froid)
+
+    try:
+        stripe.WebhookSignature.verify_header(payload.decode("utf-8"), signature or "", secret,
+                                              stripe.Webhook.DEFAULT_TOLERANCE)
+        return json.loads(payload)
+    except (stripe.SignatureVerificationError, ValueError) as e:
+        raise WebhookError(str(e)) from e
+
+
+class FulfilmentQueue:
+    def __init__(self, session_factory=SessionLocal, batch_size=FULFILMENT_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.wakeup = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.short = 0
+        self.batches = 0
+
+    def enqueue(self, db, session):
+        """Enregistre une session Checkout payée ; les doublons (webhook rejoué) sont ignorés."""
+        if session.get("payment_status") not in ("paid", "no_payment_required"):
+            return False
+        metadata = session.get("metadata") or {}
+        payload = {
+            "user_id": int(metadata["user_id"]) if metadata.get("user_id") else None,
+            "cart_token": metadata.get("cart_token") or None,
+            "source": metadata.get("source", "direct"),
+            "lines": parse_lines(metadata),
+            "amount_total": session.get("amount_total"),
+        }
+        inserted = db.execute(ENQUEUE_SQL, {
+            "session_id": session["id"], "payload": json.dumps(payload), "now": time.time(),
+        }).rowcount
+        db.commit()
+        self.wakeup.set()
+        return inserted == 1
+
+    def enqueue_event(self, event):
+        """Point d'entrée du webhook (session dédiée, appelé hors de la boucle d'événements)."""
+        if event.get("type") not in PAID_EVENTS:
+            return False
+        with self.session_factory() as db:
+            return self.enqueue(db, event["data"]["object"])
+
+    def claim(self, db):
+        claim = secrets.token_hex(8)
+        now = time.time()
+        db.execute(CLAIM_SQL, {"claim": claim, "now": now, "stale": now - FULFILMENT_CLAIM_TIMEOUT, "limit": self.batch_size})
+        db.commit()
+        return db.scalars(select(FulfilmentJob).where(FulfilmentJob.claim == claim).order_by(FulfilmentJob.id)).all()
+
+    def run_once(self):
+        """Traite un lot ; renvoie le nombre de jobs traités (0 si la file est vide)."""
+        with self.session_factory() as db:
+            jobs = self.claim(db)
+            if not jobs:
+                return 0
+            try:
+                followups = self.fulfil(db, jobs)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ Lot de {len(jobs)} commande(s) en échec, reprise une par une : {e}")
+                followups = []
+                for job in jobs:
+                    followups += self.fulfil_alone(db, job)
+        self.after_commit(followups)
+        self.batches += 1
+        return len(jobs)
+
+    def fulfil_alone(self, db, job):
+        try:
+            return self.fulfil(db, [job])
+        except Exception as e:
+            db.rollback()
+            job = db.get(FulfilmentJob, job.id)
+            job.attempts += 1
+            job.last_error = str(e)[:500]
+            job.status = "failed" if job.attempts >= FULFILMENT_MAX_ATTEMPTS else "pending"
+            job.claim = None
+            db.commit()
+            self.failed += 1
+            return []
+
+    def fulfil(self, db, jobs):
+        """Stock, commandes et statut des jobs du lot, en une seule transaction."""
+        payloads = {job.id: json.loads(job.payload) for job in jobs}
+        wanted = {job.id: {line[0]: line[1] for line in payloads[job.id]["lines"]} for job in jobs}
+
+        # Chemin rapide : tout le lot en un seul executemany ; sinon commande par commande.
+        merged = {}
+        for lines in wanted.values():
+            for product_id, quantity in lines.items():
+                merged[product_id] = merged.get(product_id, 0) + quantity
+        savepoint = db.begin_nested()
+        if reserve_stock(db, merged).ok:
+            savepoint.commit()
+            reserved = wanted
+        else:
+            savepoint.rollback()
+            reserved = {}
+            for job_id, lines in wanted.items():
+                result = reserve_stock(db, lines)
+                reserved[job_id] = result.reserved
+                if result.failed:
+                    print(f"⚠️ Stock insuffisant pour la commande {job_id} : {result.failed}")
+                    prices = {line[0]: line[2] for line in payloads[job_id]["lines"]}
+                    payloads[job_id]["shortfall"] = [[product_id, quantity, prices[product_id]]
+                                                     for product_id, quantity in result.failed.items()]
+
+        ordered = {product_id for job in jobs if payloads[job.id]["user_id"] for product_id in reserved[job.id]}
+        names = dict(db.execute(select(Product.id, Product.name).where(Product.id.in_(ordered))).all()) if ordered else {}
+        orders, sales = {}, []
+        for job in jobs:
+            payload = payloads[job.id]
+            prices = {line[0]: line[2] for line in payload["lines"]}
+            lines = reserved[job.id]
+            sales.append([(product_id, quantity, prices[product_id]) for product_id, quantity in lines.items()])
+            if payload["user_id"] and lines:
+                items = [
+                    OrderItem(product_id=product_id, quantity=quantity, price_at_purchase=prices[product_id] / 100)
+                    for product_id, quantity in lines.items()
+                ]
+                total = sum(item.price_at_purchase * item.quantity for item in items)
+                item_count, summary = summarize([(names.get(item.product_id, DELETED_PRODUCT_NAME), item.quantity) for item in items])
+                orders[job.id] = Order(user_id=payload["user_id"], total_price=round(total, 2), items=items,
+                                       item_count=item_count, summary=summary)
+        db.add_all(orders.values())
+        # Agrégats du tableau de bord, dans la même transaction (achats anonymes compris)
+        analytics.record_sales(db, sales)
+        db.flush()
+        for job in jobs:
+            shortfall = payloads[job.id].get("shortfall")
+            job.status = "short" if shortfall else "done"
+            if shortfall:
+                job.payload = json.dumps(payloads[job.id])
+                job.last_error = "Stock insuffisant : " + ", ".join(f"produit {line[0]} × {line[1]}" for line in shortfall)
+                self.short += 1
+            job.attempts += 1
+            job.order_id = orders[job.id].id if job.id in orders else None
+        db.commit()
+        self.processed += len(jobs)
+        return [(payloads[job.id], reserved[job.id]) for job in jobs]
+
+    def after_commit(self, followups):
+        """Cache du catalogue, pages en direct et paniers, après le commit (la table des paniers n'attend pas le verrou d'écriture)."""
+        touched = {product_id for _, lines in followups for product_id in lines}
+        if touched:
+            with self.session_factory() as db:
+                stocks = dict(db.execute(select(Product.id, Product.stock).where(Product.id.in_(touched))).all())
+            catalog.patch_stock(stocks)
+            product_events.publish_stocks(stocks)
+        for payload, lines in followups:
+            token = payload["cart_token"]
+            if not token or not lines:
+                continue
+            if payload["source"] == "cart":
+                cart_store.backend.clear(token)
+            else:
+                in_cart = cart_store.backend.get(token)
+                for product_id, quantity in lines.items():
+                    if in_cart.get(product_id):
+                        cart_store.backend.add(token, product_id, -min(quantity, in_cart[product_id]))
+
+    def status(self, db, session_id):
+        """Statut du traitement d'une session de paiement (lecture seule), ou None si le webhook n'est pas arrivé."""
+        return db.scalar(select(FulfilmentJob.status).where(FulfilmentJob.session_id == session_id))
+
+    def shortfalls(self, db, limit=20):
+        """Dernières commandes payées mais incomplètes (rupture de stock), à rembourser ou à compléter."""
+        jobs = db.scalars(select(FulfilmentJob).where(FulfilmentJob.status == "short")
+                          .order_by(FulfilmentJob.id.desc()).limit(limit)).all()
+        missing = [(job, json.loads(job.payload)["shortfall"]) for job in jobs]
+        product_ids = {line[0] for _, shortfall in missing for line in shortfall}
+        names = dict(db.execute(select(Product.id, Product.name).where(Product.id.in_(product_ids))).all()) if product_ids else {}
+        return [{
+            "session_id": job.session_id,
+            "order_id": job.order_id,
+            "lines": [{"product_id": product_id, "name": names.get(product_id, DELETED_PRODUCT_NAME), "quantity": quantity,
+                       "amount": quantity * unit_amount / 100} for product_id, quantity, unit_amount in shortfall],
+            "refund": sum(quantity * unit_amount for _, quantity, unit_amount in shortfall) / 100,
+        } for job, shortfall in missing]
+
+    def stats(self):
+        return {"processed": self.processed, "failed": self.failed, "short": self.short, "batches": self.batches}
+
+
+class FulfilmentWorker:
+    """Thread qui vide la file ; réveillé par chaque webhook, sinon interroge la table périodiquement."""
+
+    def __init__(self, queue, poll_interval=FULFILMENT_POLL_INTERVAL):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="fulfilment", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self.queue.wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        while not self._stop.is_set():
+            self.queue.wakeup.clear()
+            try:
+                if self.queue.run_once():
+                    continue
+            except Exception as e:
+                print(f"❌ Worker de commandes : {e}")
+            self.queue.wakeup.wait(self.poll_interval)
+
+
+queue = FulfilmentQueue()
+worker = FulfilmentWorker(queue)
+
+
+if __name__ == "__main__":
+    print("🚚 Worker de traitement des commandes démarré.")
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
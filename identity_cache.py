@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from models import User
+
+# Un changement de droits fait hors du processus (make_admin.py) est pris en compte au plus tard après ce délai.
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "60"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+# Identité recopiée dans la session signée : resservie sans base ni cache pendant ce délai.
+SESSION_CLAIMS_TTL = float(os.getenv("SESSION_CLAIMS_TTL", str(IDENTITY_CACHE_TTL)))
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Ce que les pages ont besoin de savoir sur l'utilisateur connecté, sans objet ORM."""
+    id: int
+    username: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, username=user.username, is_admin=bool(user.is_admin))
+
+    def load(self, db):
+        """Charge l'objet User complet, uniquement quand une route en a réellement besoin."""
+        return db.query(User).filter(User.id == self.id).first()
+
+    @classmethod
+    def from_session(cls, session, ttl=SESSION_CLAIMS_TTL):
+        """Identité recopiée dans la session par remember(), si elle est assez récente ; sinon None."""
+        claims_at = session.get("claims_at")
+        if claims_at is None or time.time() - claims_at > ttl or session.get("user_id") is None:
+            return None
+        return cls(id=session["user_id"], username=session.get("username", ""), is_admin=bool(session.get("is_admin")))
+
+    def remember(self, session):
+        """Recopie l'identité dans la session (cookie signé) : les requêtes suivantes n'interrogent ni cache ni base."""
+        session.update(user_id=self.id, username=self.username, is_admin=self.is_admin, claims_at=int(time.time()))
+
+
+class IdentityCache:
+    """Cache LRU à durée de vie limitée : user_id -> Identity."""
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL, max_entries=IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user):
+        """Enregistre un utilisateur (objet User ou Identity) et renvoie son Identity."""
+        identity = user if isinstance(user, Identity) else Identity.from_user(user)
+        with self._lock:
+            self._entries[identity.id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+identity_cache = IdentityCache()
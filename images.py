@@ -0,0 +1,184 @@
+"""Déclinaisons redimensionnées des images produits (WebP, nommées par empreinte du contenu).
+
+Usage : python images.py [fichier ...]   (sans argument : toutes les images de static/images)
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from static_assets import static_url
+
+# Pillow est importé à la première génération seulement ; absent, on sert simplement les originaux.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+IMAGES_DIR = os.path.join("static", "images")
+DERIVED_DIR = os.path.join(IMAGES_DIR, "derived")
+MANIFEST_PATH = os.path.join(DERIVED_DIR, "manifest.json")
+IMAGE_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_WIDTHS", "200,400,800").split(","))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Intervalle minimal entre deux vérifications du manifeste sur disque (écrit par un autre worker).
+MANIFEST_CHECK_INTERVAL = 2.0
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def derived_name(filename, digest, width):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}-{digest}-{width}w.webp"
+
+
+class ImagePipeline:
+    """Génère les déclinaisons dans un pool de threads et tient le manifeste nom -> empreinte."""
+
+    def __init__(self, widths=IMAGE_WIDTHS, workers=IMAGE_WORKERS):
+        self.widths = widths
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manifest = {}
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+
+    @property
+    def enabled(self):
+        return PILLOW_AVAILABLE
+
+    def _reload_manifest(self):
+        now = time.monotonic()
+        if now - self._checked_at < MANIFEST_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            return
+        if mtime != self._manifest_mtime:
+            with open(MANIFEST_PATH, encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+
+    def _write_manifest(self, filename, entry):
+        with self._lock:
+            self._checked_at = 0.0
+            self._reload_manifest()
+            self._manifest[filename] = entry
+            tmp_path = MANIFEST_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, MANIFEST_PATH)  # Remplacement atomique, lu sans verrou par les autres workers
+            self._manifest_mtime = os.path.getmtime(MANIFEST_PATH)
+
+    def build(self, filename):
+        """Génère (si besoin) les déclinaisons d'une image et met à jour le manifeste."""
+        if not self.enabled:
+            return None
+        from PIL import Image, ImageOps
+
+        source = os.path.join(IMAGES_DIR, filename)
+        digest = content_hash(source)
+        os.makedirs(DERIVED_DIR, exist_ok=True)
+        widths = []
+        with Image.open(source) as original:
+            original = ImageOps.exif_transpose(original)
+            for width in self.widths:
+                # Inutile d'agrandir une petite image : la plus grande déclinaison garde la taille d'origine.
+                width = min(width, original.width)
+                if widths and width <= widths[-1]:
+                    break
+                target = os.path.join(DERIVED_DIR, derived_name(filename, digest, width))
+                if not os.path.exists(target):
+                    resized = original.copy()
+                    resized.thumbnail((width, width * 10))
+                    resized.save(target, "WEBP", quality=IMAGE_QUALITY, method=4)
+                widths.append(width)
+        entry = {"hash": digest, "widths": widths}
+        self._write_manifest(filename, entry)
+        return entry
+
+    def submit(self, filename, on_done=None):
+        """Planifie la génération hors du chemin de la requête."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images")
+        future = self._executor.submit(self.build, filename)
+
+        def done(future):
+            error = future.exception()
+            if error is not None:
+                print(f"❌ Déclinaisons de {filename} non générées : {error!r}")
+            elif on_done is not None:
+                on_done(filename)
+
+        future.add_done_callback(done)
+        return future
+
+    def variants(self, filename):
+        with self._lock:
+            self._reload_manifest()
+            return self._manifest.get(filename)
+
+    def src(self, filename, width):
+        """URL de la plus petite déclinaison d'au moins `width` px, ou de l'original."""
+        entry = self.variants(filename)
+        if not entry:
+            return static_url(f"images/{filename}")
+        chosen = next((w for w in entry["widths"] if w >= width), entry["widths"][-1])
+        return static_url(f"images/derived/{derived_name(filename, entry['hash'], chosen)}")
+
+    def srcset(self, filename):
+        """Valeur de l'attribut srcset, vide si aucune déclinaison n'existe encore."""
+        entry = self.variants(filename)
+        if not entry:
+            return ""
+        return ", ".join(
+            f"{static_url('images/derived/' + derived_name(filename, entry['hash'], w))} {w}w"
+            for w in entry["widths"]
+        )
+
+
+pipeline = ImagePipeline()
+
+
+def save_upload(upload):
+    """Écrit un fichier envoyé dans static/images et renvoie son nom."""
+    filename = os.path.basename(upload.filename)
+    with open(os.path.join(IMAGES_DIR, filename), "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+    return filename
+
+
+def backfill(filenames=None):
+    if not pipeline.enabled:
+        print("❌ Pillow n'est pas installé : pip install pillow")
+        return
+    if not filenames:
+        filenames = sorted(
+            name for name in os.listdir(IMAGES_DIR)
+            if os.path.isfile(os.path.join(IMAGES_DIR, name))
+            and name.lower().endswith((".webp", ".jpg", ".jpeg", ".png"))
+        )
+    for filename in filenames:
+        try:
+            entry = pipeline.build(filename)
+            print(f"✅ {filename} : {', '.join(f'{w}w' for w in entry['widths'])}")
+        except Exception as e:
+            print(f"❌ Erreur pour {filename} : {e}")
+
+
+if __name__ == "__main__":
+    backfill(sys.argv[1:])
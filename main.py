@@ -1,35 +1,84 @@
 from fastapi import FastAPI, Request, Depends, APIRouter, HTTPException, Form, UploadFile, File
-from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session, joinedload
-from database import SessionLocal, Base, engine
-from models import Product, User, Review, Order, OrderItem
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import SessionLocal, AsyncSessionLocal, engine
+from models import Product, User
+from catalog_cache import catalog
+from catalog_io import product_sku
+from catalog_query import CatalogQuery, SORT_LABELS
+from cart_store import cart_store
+from chatbot import chatbot
+from identity_cache import Identity, identity_cache
+from fragment_cache import fragments
+from search import SEARCH_PAGE_SIZE, search_index
+from signed_session import SESSION_MODE, SignedSessionMiddleware
+import analytics
 import auth
+import catalog_query
+import fulfilment
+import images
+from metrics import METRICS_PUBLIC, METRICS_TOKEN, MetricsMiddleware, instrument_templates, metrics
+import migrations
+import orders
+from payments import PaymentError, payments
+from product_events import EVENTS_MAX_PRODUCTS, event_stream, product_events
+from rate_limit import AdmissionMiddleware, RateLimitMiddleware, admission, auth_admission, limiter
+import reviews
+import static_assets
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from collections import Counter
+from dataclasses import asdict
+from email.utils import formatdate, parsedate_to_datetime
 from pydantic import BaseModel
-import stripe
-import shutil
+import hashlib
 import os
+import time
 
 load_dotenv()
 
-# Create all tables (including users)
-Base.metadata.create_all(bind=engine)
+# Aucun DDL au démarrage : le schéma (index de recherche compris) est créé et mis à jour par `python migrations.py`.
+migrations.ensure_schema(engine)
+search_index.configure(engine)
 
-stripe.api_key= os.getenv("STRIPE_SECRET_KEY")
 # On récupère le domaine et on enlève le slash à la fin s'il y en a un pour éviter les doubles //
 DOMAIN = os.getenv("DOMAIN", "http://127.0.0.1:8000").rstrip("/")
 
 print(f"🚀 Démarrage de l'application pour le domaine : {DOMAIN}")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Le worker des commandes tourne dans le processus web, sauf s'il est lancé à part (python fulfilment.py).
+    if fulfilment.FULFILMENT_WORKER:
+        fulfilment.worker.start()
+    yield
+    fulfilment.worker.stop()
+
+app = FastAPI(lifespan=lifespan)
 is_production = os.getenv("RENDER") == "true"
-app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "une_cle_secrete_aleatoire"), https_only=is_production, same_site="lax")
+# Le premier ajouté est le plus interne : la limitation de débit lit la session décodée.
+app.add_middleware(RateLimitMiddleware)
+secret_key = os.getenv("SECRET_KEY", "une_cle_secrete_aleatoire")
+if SESSION_MODE == "signed":
+    # Serverless : panier et identité dans un cookie binaire signé, aucun état côté serveur.
+    app.add_middleware(SignedSessionMiddleware, secret_key=secret_key, session_keys=os.getenv("SESSION_KEYS"), https_only=is_production, same_site="lax")
+else:
+    app.add_middleware(SessionMiddleware, secret_key=secret_key, https_only=is_production, same_site="lax")
+app.add_middleware(AdmissionMiddleware)
+# Ajouté en dernier : le plus externe, il mesure aussi le middleware de session et les refus.
+app.add_middleware(MetricsMiddleware)
 templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+instrument_templates(templates.env)
+templates.env.globals["static_url"] = static_assets.static_url
+templates.env.globals["image_src"] = images.pipeline.src
+templates.env.globals["image_srcset"] = images.pipeline.srcset
+templates.env.globals["now"] = time.time  # data-live-since : instant de lecture des données affichées
+# Les variantes gzip/brotli sont générées au déploiement (python static_assets.py) ; à défaut, fichiers bruts.
+app.mount("/static", static_assets.HashedStaticFiles(directory="static"), name="static")
 
 # --- Dependencies ---
 def get_db():
@@ -39,63 +88,185 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def get_current_user(request: Request):
+    # Identité signée et récente dans la session : ni cache ni base
+    identity = Identity.from_session(request.session)
+    if identity is not None:
+        return identity
     user_id = request.session.get("user_id")
     if user_id is None:
         return None
-    return db.query(User).filter(User.id == user_id).first()
+    # La base n'est consultée qu'en cas d'absence dans le cache d'identités
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                return None
+            identity = identity_cache.put(user)
+    identity.remember(request.session)
+    return identity
+
+# Versions asynchrones, pour les routes `async def` : elles ne bloquent pas la boucle d'événements.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_current_user_async(request: Request):
+    identity = Identity.from_session(request.session)
+    if identity is not None:
+        return identity
+    user_id = request.session.get("user_id")
+    if user_id is None:
+        return None
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            if user is None:
+                return None
+            identity = identity_cache.put(user)
+    identity.remember(request.session)
+    return identity
+
+def render_fragment(template_name, **context):
+    return templates.get_template(template_name).render(**context)
+
+def is_not_modified(request: Request, etag: str, last_modified: float):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def cached_page(request: Request, template_name: str, context: dict, page_fragments: list, user):
+    """Rend une page construite à partir de fragments en cache, avec ETag/Last-Modified."""
+    # La barre de navigation dépend de l'utilisateur : elle fait partie de l'empreinte.
+    identity = f"{user.id}:{int(bool(user.is_admin))}" if user else "anon"
+    seed = "|".join([template_name, identity] + [f.digest for f in page_fragments])
+    etag = '"' + hashlib.sha1(seed.encode("utf-8")).hexdigest() + '"'
+    last_modified = max(f.last_modified for f in page_fragments)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache" if user else "public, no-cache",
+        "Vary": "Cookie",
+    }
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return templates.TemplateResponse(template_name, {"request": request, "user": user, **context}, headers=headers)
+
+def get_catalog_query(request: Request):
+    try:
+        return CatalogQuery.from_params(request.query_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # --- Template Rendering Routes ---
 
+def render_product_grid(db, query):
+    page = catalog_query.fetch_page(db, query)
+    ratings = reviews.summaries_by_product(db, [p.id for p in page.products])
+    return render_fragment("_product_grid.html", products=page.products, ratings=ratings, query=query, page=page)
+
 @app.get("/")
-def home(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    products = db.query(Product).all()
-    return templates.TemplateResponse(
-        "products.html", 
-        {"request": request, "products": products, "welcome": "Bienvenue chez Chrystelle & Sleeks !", "user": user}
+def home(request: Request, db: Session = Depends(get_db), user: Identity = Depends(get_current_user), query: CatalogQuery = Depends(get_catalog_query)):
+    # Une entrée de cache par page/filtre ; la base n'est lue que si le catalogue ou les avis ont changé.
+    grid = fragments.get_or_render(
+        f"product_grid:{query.query_string()}", (catalog.refresh(db), fragments.review_version()),
+        lambda: render_product_grid(db, query),
     )
+    return cached_page(request, "products.html", {
+        "product_grid": grid.html,
+        "query": query,
+        "sort_labels": SORT_LABELS,
+        "welcome": "Bienvenue chez Chrystelle & Sleeks !",
+    }, [grid], user)
+
+@app.get("/api/products")
+def list_products(db: Session = Depends(get_db), query: CatalogQuery = Depends(get_catalog_query)):
+    return catalog_query.fetch_page(db, query).as_dict()
+
+@app.get("/search")
+def search_products(q: str = "", limit: int = SEARCH_PAGE_SIZE, offset: int = 0, db: Session = Depends(get_db)):
+    # Résultats classés par pertinence (nom puis description)
+    products = search_index.search(db, q, limit=limit, offset=max(offset, 0))
+    return {"query": q, "products": [asdict(p) for p in products]}
+
+@app.get("/search/suggest")
+def suggest_products(q: str = "", db: Session = Depends(get_db)):
+    return {"query": q, "suggestions": search_index.suggest(db, q)}
 
 @app.get("/product/{product_id}")
-def product_detail(product_id: int, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+def product_detail(product_id: int, request: Request, db: Session = Depends(get_db), user: Identity = Depends(get_current_user)):
+    product = catalog.get_product(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
-    
-    # Récupérer les avis du produit
-    reviews = db.query(Review).filter(Review.product_id == product_id).all()
-    
-    return templates.TemplateResponse("product_detail.html", {
-        "request": request, 
-        "product": product, 
-        "reviews": reviews,
-        "user": user
-    })
+
+    # Le snapshot du produit est figé et hashable : il sert directement de version.
+    info = fragments.get_or_render(
+        f"product_info:{product_id}", product,
+        lambda: render_fragment("_product_info.html", product=product),
+    )
+
+    # Les avis ne sont lus en base que lorsque le fragment doit être re-rendu ; seule la première page est incluse.
+    def render_reviews():
+        page, next_before = reviews.fetch_page(db, product_id)
+        return render_fragment(
+            "_review_list.html", product_id=product_id, summary=reviews.get_summary(db, product_id),
+            reviews=page, next_before=next_before,
+        )
+
+    review_list = fragments.get_or_render(
+        f"review_list:{product_id}", fragments.review_version(product_id), render_reviews,
+    )
+
+    return cached_page(request, "product_detail.html", {
+        "product": product,
+        "product_info": info.html,
+        "review_list": review_list.html,
+    }, [info, review_list], user)
 
 @app.post("/product/{product_id}/review")
-async def add_review(product_id: int, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def add_review(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db), user: Identity = Depends(get_current_user_async)):
     if not user:
         return RedirectResponse(url="/login", status_code=303)
         
     form = await request.form()
     rating = int(form.get("rating"))
     comment = form.get("comment")
+    if not 1 <= rating <= 5:
+        raise HTTPException(status_code=400, detail="La note doit être comprise entre 1 et 5")
+    # Sans produit, l'avis créerait des agrégats orphelins dans review_stats.
+    if await db.get(Product, product_id) is None:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
     
-    new_review = Review(product_id=product_id, user_id=user.id, rating=rating, comment=comment)
-    db.add(new_review)
-    db.commit()
+    await reviews.add_review(db, product_id, user.id, rating, comment)
+    fragments.bump_reviews(product_id)
     return RedirectResponse(url=f"/product/{product_id}", status_code=303)
 
+@app.get("/product/{product_id}/reviews")
+def list_reviews(product_id: int, before: int = None, limit: int = reviews.REVIEWS_PAGE_SIZE, db: Session = Depends(get_db)):
+    # Pagination par clé pour le bouton "Voir plus d'avis"
+    page, next_before = reviews.fetch_page(db, product_id, before=before, limit=limit)
+    return {"reviews": page, "next_before": next_before}
+
 @app.get("/cart")
-def view_cart(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    cart = request.session.get("cart", [])
-    cart_counts = Counter(cart)
+def view_cart(request: Request, db: Session = Depends(get_db), user: Identity = Depends(get_current_user)):
+    cart_counts = cart_store.items(request)
     
     cart_items = []
     total = 0
     
-    if cart:
-        products = db.query(Product).filter(Product.id.in_(cart_counts.keys())).all()
-        for product in products:
+    if cart_counts:
+        # Prix lus dans le cache du catalogue : avec le panier en session, page servie sans requête SQL.
+        for product in catalog.get_products(db, cart_counts.keys()):
             quantity = cart_counts[product.id]
             subtotal = product.price * quantity
             total += subtotal
@@ -104,55 +275,23 @@ def view_cart(request: Request, db: Session = Depends(get_db), user: User = Depe
     return templates.TemplateResponse("cart.html", {"request": request, "cart_items": cart_items, "total": round(total, 2), "user": user})
 
 @app.get("/success")
-def payment_success(request: Request, product_id: int = None, quantity: int = 1, db: Session = Depends(get_db), user: User = Depends(get_current_user)):    
-    line_items_data = []
-    total_price = 0
-
-    if product_id:
-        # Cas 1 : Achat direct ou unitaire depuis le panier
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if product and product.stock >= quantity:
-            product.stock -= quantity
-            line_items_data.append({"product": product, "quantity": quantity})
-            total_price = product.price * quantity
-            
-            # Si l'article était dans le panier, on le retire (puisqu'il est payé)
-            cart = request.session.get("cart", [])
-            for _ in range(quantity):
-                if product_id in cart:
-                    cart.remove(product_id)
-            request.session["cart"] = cart
+def payment_success(request: Request, session_id: str = None, db: Session = Depends(get_db), user: Identity = Depends(get_current_user)):
+    # Page en lecture seule : la commande est créée par le webhook Stripe, pas par cette redirection.
+    status = fulfilment.queue.status(db, session_id) if session_id else None
+    if session_id:
+        cart_store.checkout_completed(request)
+    if status == "done":
+        message, detail = "Paiement réussi ! Merci pour votre achat.", "Votre commande a bien été enregistrée. Merci de votre confiance !"
+    elif status == "short":
+        message, detail = "Paiement reçu", "Certains articles n'étaient plus en stock : ils vous seront remboursés et notre équipe vous recontactera. Le reste de votre commande est bien enregistré."
+    elif status == "failed":
+        message, detail = "Paiement reçu", "Un problème est survenu lors de l'enregistrement de votre commande : notre équipe vous recontactera."
     else:
-        # Cas 2 : Achat via le panier
-        cart = request.session.get("cart", [])
-        if cart:
-            cart_counts = Counter(cart)
-            products = db.query(Product).filter(Product.id.in_(cart_counts.keys())).all()
-            
-            for product in products:
-                quantity_purchased = cart_counts[product.id]
-                if product.stock >= quantity_purchased:
-                    product.stock -= quantity_purchased
-                    line_items_data.append({"product": product, "quantity": quantity_purchased})
-                    total_price += product.price * quantity_purchased
-            
-            request.session.pop("cart", None)
-
-    # Si un utilisateur est connecté et que des articles ont été traités, on crée une commande.
-    if user and line_items_data:
-        order_items = [
-            OrderItem(product_id=item['product'].id, quantity=item['quantity'], price_at_purchase=item['product'].price) 
-            for item in line_items_data
-        ]
-        new_order = Order(user_id=user.id, total_price=round(total_price, 2), items=order_items)
-        db.add(new_order)
-
-    db.commit() # Sauvegarde les changements de stock et la nouvelle commande en une seule fois.
-            
-    return templates.TemplateResponse("success.html", {"request": request, "message": "Paiement réussi ! Merci pour votre achat.", "user": user})
+        message, detail = "Paiement reçu ! Merci pour votre achat.", "Votre commande est en cours d'enregistrement, elle apparaîtra dans votre profil dans quelques instants."
+    return templates.TemplateResponse("success.html", {"request": request, "message": message, "detail": detail, "user": user})
 
 @app.get("/cancel")
-def payment_cancel(request: Request, user: User = Depends(get_current_user)):
+def payment_cancel(request: Request, user: Identity = Depends(get_current_user)):
     return templates.TemplateResponse("cancel.html", {"request": request, "user": user})
 
 # --- Authentication Routes ---
@@ -162,7 +301,7 @@ def register_form(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 @app.post("/register")
-async def register_user(request: Request, db: Session = Depends(get_db)):
+async def register_user(request: Request, db: AsyncSession = Depends(get_async_db)):
     form = await request.form()
     username = form.get("username")
     password = form.get("password")
@@ -170,17 +309,19 @@ async def register_user(request: Request, db: Session = Depends(get_db)):
     if not username or not password:
         return templates.TemplateResponse("register.html", {"request": request, "error": "Veuillez remplir tous les champs."})
 
-    existing_user = db.query(User).filter(User.username == username).first()
+    existing_user = await db.scalar(select(User).where(User.username == username))
     if existing_user:
         return templates.TemplateResponse("register.html", {"request": request, "error": "Ce nom d'utilisateur existe déjà."})
 
-    hashed_password = auth.get_password_hash(password)
+    try:
+        hashed_password = await auth.get_password_hash_async(password)
+    except auth.AuthBusyError:
+        return templates.TemplateResponse("register.html", {"request": request, "error": "Service très sollicité, veuillez réessayer dans un instant."}, status_code=503)
     new_user = User(username=username, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
-    request.session["user_id"] = new_user.id
+    identity_cache.put(new_user).remember(request.session)
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/login")
@@ -188,42 +329,67 @@ def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @app.post("/login")
-async def login_user(request: Request, db: Session = Depends(get_db)):
+async def login_user(request: Request, db: AsyncSession = Depends(get_async_db)):
     form = await request.form()
     username = form.get("username")
     password = form.get("password")
     
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     
-    if not user or not auth.verify_password(password, user.hashed_password):
+    if not user:
         return templates.TemplateResponse("login.html", {"request": request, "error": "Nom d'utilisateur ou mot de passe incorrect."})
 
-    request.session["user_id"] = user.id
+    try:
+        valid, new_hash = await auth.verify_and_update_async(password, user.hashed_password)
+    except auth.AuthBusyError:
+        return templates.TemplateResponse("login.html", {"request": request, "error": "Service très sollicité, veuillez réessayer dans un instant."}, status_code=503)
+    if not valid:
+        return templates.TemplateResponse("login.html", {"request": request, "error": "Nom d'utilisateur ou mot de passe incorrect."})
+
+    # Le nombre d'itérations a changé depuis l'inscription : on enregistre le nouveau hachage.
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    identity_cache.put(user).remember(request.session)
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/logout")
 def logout_user(request: Request):
+    cart_store.clear(request)
+    user_id = request.session.get("user_id")
+    if user_id is not None:
+        identity_cache.invalidate(user_id)
     request.session.clear() # Vide toute la session (panier + utilisateur)
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/profile")
-def view_profile(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def view_profile(request: Request, before: str = None, db: Session = Depends(get_db), user: Identity = Depends(get_current_user)):
     if not user:
         return RedirectResponse(url="/login", status_code=303)
 
-    # Récupère les commandes de l'utilisateur avec les produits associés pour éviter des requêtes multiples
-    orders = db.query(Order).filter(Order.user_id == user.id)\
-        .options(joinedload(Order.items).joinedload(OrderItem.product))\
-        .order_by(Order.created_at.desc())\
-        .all()
+    # Une page de résumés de commandes ; les articles sont chargés à la demande (/profile/orders/{id}).
+    try:
+        page, next_before = orders.fetch_page(db, user.id, before=before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return templates.TemplateResponse("profile.html", {"request": request, "user": user, "orders": page, "before": before, "next_before": next_before})
 
-    return templates.TemplateResponse("profile.html", {"request": request, "user": user, "orders": orders})
+@app.get("/profile/orders/{order_id}", response_class=HTMLResponse)
+def view_order_items(order_id: int, db: Session = Depends(get_db), user: Identity = Depends(get_current_user)):
+    if not user:
+        raise HTTPException(status_code=401, detail="Connexion requise")
+    items = orders.fetch_items(db, user.id, order_id)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Commande non trouvée")
+    return render_fragment("_order_items.html", items=items)
 
 
 # --- Admin Dependencies & Router ---
 admin_router = APIRouter(prefix="/admin")
 
-def require_admin(user: User = Depends(get_current_user)):
+def require_admin(user: Identity = Depends(get_current_user)):
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="Accès refusé. Vous devez être administrateur.")
     return user
@@ -231,9 +397,35 @@ def require_admin(user: User = Depends(get_current_user)):
 # --- Admin Routes ---
 
 @admin_router.get("/", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
-def admin_dashboard(request: Request, db: Session = Depends(get_db)):
-    products = db.query(Product).order_by(Product.id).all()
-    return templates.TemplateResponse("admin_dashboard.html", {"request": request, "products": products})
+def admin_dashboard(request: Request, db: Session = Depends(get_db), query: CatalogQuery = Depends(get_catalog_query)):
+    page = catalog_query.fetch_page(db, query)
+    return templates.TemplateResponse("admin_dashboard.html", {
+        "request": request, "products": page.products, "page": page, "query": query, "sort_labels": SORT_LABELS,
+        "analytics": analytics.dashboard(db), "shortfalls": fulfilment.queue.shortfalls(db),
+    })
+
+EXPORT_FORMATS = {"csv": (analytics.stream_csv, "text/csv; charset=utf-8"), "json": (analytics.stream_json, "application/json")}
+
+@admin_router.get("/analytics/export", dependencies=[Depends(require_admin)])
+def export_analytics(kind: str = "daily", format: str = "csv", days: int = None):
+    # Réponse produite au fil de la lecture : l'export complet n'est jamais en mémoire.
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format inconnu")
+    try:
+        rows = analytics.export_rows(kind, days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stream, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(stream(rows), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="ventes-{kind}.{format}"'})
+
+@admin_router.get("/stats", dependencies=[Depends(require_admin)])
+def admin_stats():
+    return {"catalog": catalog.stats(), "fragments": fragments.stats(), "auth": auth.hash_pool.stats(), "identity": identity_cache.stats(), "payments": payments.stats(), "fulfilment": fulfilment.queue.stats(), "rate_limit": limiter.stats(), "admission": admission.stats(), "auth_admission": auth_admission.stats(), "events": product_events.stats()}
+
+def image_variants_ready(filename):
+    # Les fragments déjà rendus pointent encore vers l'original
+    fragments.invalidate()
 
 @admin_router.get("/products/add", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
 def add_product_form(request: Request):
@@ -241,27 +433,35 @@ def add_product_form(request: Request):
 
 @admin_router.post("/products/add", dependencies=[Depends(require_admin)])
 async def add_product(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     name: str = Form(...),
     price: float = Form(...),
     stock: int = Form(...),
     message: str = Form(...),
     image: UploadFile = File(...)
 ):
-    # Sauvegarde de l'image
-    image_path = f"static/images/{image.filename}"
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+    # Sauvegarde de l'image ; les déclinaisons redimensionnées sont générées en arrière-plan
+    filename = await run_in_threadpool(images.save_upload, image)
+    images.pipeline.submit(filename, on_done=image_variants_ready)
 
     new_product = Product(
         name=name,
         price=price,
         stock=stock,
         message=message,
-        image=image.filename
+        image=filename
     )
     db.add(new_product)
-    db.commit()
+    await db.flush()
+    # Référence déduite du nom, rendue unique par l'id si un produit homonyme existe déjà
+    sku = product_sku(name) or "produit"
+    taken = await db.scalar(select(Product.id).where(Product.sku == sku))
+    new_product.sku = sku if taken is None else f"{sku}-{new_product.id}"
+    await search_index.index_product_async(db, new_product)
+    await db.commit()
+    catalog.upsert(new_product)
+    product_events.publish(new_product.id, price=new_product.price, stock=new_product.stock)
+    chatbot.products.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @admin_router.get("/products/edit/{product_id}", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
@@ -274,14 +474,14 @@ def edit_product_form(product_id: int, request: Request, db: Session = Depends(g
 @admin_router.post("/products/edit/{product_id}", dependencies=[Depends(require_admin)])
 async def edit_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     name: str = Form(...),
     price: float = Form(...),
     stock: int = Form(...),
     message: str = Form(...),
     image: UploadFile = File(None) # Image optionnelle à la modification
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
 
@@ -291,12 +491,14 @@ async def edit_product(
     product.stock = stock
 
     if image and image.filename:
-        image_path = f"static/images/{image.filename}"
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        product.image = image.filename
+        product.image = await run_in_threadpool(images.save_upload, image)
+        images.pipeline.submit(product.image, on_done=image_variants_ready)
     
-    db.commit()
+    await search_index.index_product_async(db, product)
+    await db.commit()
+    catalog.upsert(product)
+    product_events.publish(product.id, price=product.price, stock=product.stock)
+    chatbot.products.invalidate()
     return RedirectResponse(url="/admin", status_code=303)
 
 @admin_router.post("/products/delete/{product_id}", dependencies=[Depends(require_admin)])
@@ -304,93 +506,83 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
     product = db.query(Product).filter(Product.id == product_id).first()
     if product:
         db.delete(product)
+        search_index.remove_product(db, product_id)
         db.commit()
+        catalog.remove(product_id)
+        product_events.publish(product_id, stock=0, deleted=True)
+        chatbot.products.invalidate()
+        fragments.invalidate(f"product_info:{product_id}")
+        fragments.invalidate(f"review_list:{product_id}")
     return RedirectResponse(url="/admin", status_code=303)
 
 # --- Action Routes ---
 
+async def redirect_to_checkout(request: Request, lines, source):
+    base_url = str(request.base_url).rstrip("/")
+    user_id = request.session.get("user_id")
+    cart_token = cart_store.token(request, create=True)
+    # Identifie l'acheteur dans la clé d'idempotence : un double clic retrouve la même session Stripe.
+    owner = f"user:{user_id}" if user_id else f"cart:{cart_token}"
+    try:
+        session = await payments.create_checkout_session(
+            owner, lines,
+            success_url=f"{base_url}/success?session_id={{CHECKOUT_SESSION_ID}}",
+            cancel_url=f"{base_url}/cancel",
+            metadata=fulfilment.checkout_metadata(user_id, cart_token, source, lines),
+            nonce=cart_store.checkout_nonce(request),
+        )
+    except PaymentError as e:
+        print(f"❌ Création de la session Stripe impossible : {e}")
+        raise HTTPException(status_code=503, detail="Paiement momentanément indisponible, veuillez réessayer.")
+    cart_store.checkout_started(request, source, lines)
+    return RedirectResponse(url=session.url, status_code=303)
+
 @app.post("/create-checkout-session")
-async def create_checkout_session(request: Request, db: Session = Depends(get_db)):
+async def create_checkout_session(request: Request, db: AsyncSession = Depends(get_async_db)):
     form = await request.form()
     product_id = int(form.get("product_id"))
     quantity = int(form.get("quantity", 1)) # Par défaut 1 si non spécifié
-    product = db.query(Product).filter(Product.id == product_id).first()
-
-    # On récupère l'URL de base dynamiquement (ex: https://mon-site.onrender.com ou http://127.0.0.1:8000)
-    base_url = str(request.base_url).rstrip("/")
+    product = await db.get(Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
 
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[{
-            "price_data": {
-                "currency": "eur",
-                "product_data": {"name": product.name if product else "Produit supprimé"},
-                "unit_amount": int(product.price * 100),
-            },
-            "quantity": quantity,
-        }],
-        mode="payment",
-        success_url=f"{base_url}/success?product_id={product.id}&quantity={quantity}",
-        cancel_url=f"{base_url}/cancel",
-    )
-    
-    return RedirectResponse(url=session.url, status_code=303)
+    return await redirect_to_checkout(request, [(product, quantity)], "direct")
 
 @app.post("/create-cart-checkout-session")
-async def create_cart_checkout_session(request: Request, db: Session = Depends(get_db)):
-    cart = request.session.get("cart", [])
+async def create_cart_checkout_session(request: Request, db: AsyncSession = Depends(get_async_db)):
+    cart_counts = await run_in_threadpool(cart_store.items, request)
     
-    if not cart:
+    if not cart_counts:
         return RedirectResponse(url="/cart", status_code=303)
 
-    cart_counts = Counter(cart)
-    products = db.query(Product).filter(Product.id.in_(cart_counts.keys())).all()
+    products = (await db.scalars(select(Product).where(Product.id.in_(cart_counts.keys())))).all()
+    if not products:
+        return RedirectResponse(url="/cart", status_code=303)
 
-    # On récupère l'URL de base dynamiquement
-    base_url = str(request.base_url).rstrip("/")
+    return await redirect_to_checkout(request, [(product, cart_counts[product.id]) for product in products], "cart")
 
-    line_items = []
-    for product in products:
-        quantity = cart_counts[product.id]
-        line_items.append({
-            "price_data": {
-                "currency": "eur",
-                "product_data": {"name": product.name},
-                "unit_amount": int(product.price * 100),
-            },
-            "quantity": quantity,
-        })
-
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=line_items,
-        mode="payment",
-        success_url=f"{base_url}/success",
-        cancel_url=f"{base_url}/cancel",
-    )
-    return RedirectResponse(url=session.url, status_code=303)
+@app.post("/stripe/webhook")
+async def stripe_webhook(request: Request):
+    payload = await request.body()
+    try:
+        event = fulfilment.verify_event(payload, request.headers.get("stripe-signature"))
+    except fulfilment.WebhookError as e:
+        raise HTTPException(status_code=400, detail=f"Webhook invalide : {e}")
+    # Simple insertion dans la file : Stripe reçoit sa réponse sans attendre le traitement de la commande.
+    await run_in_threadpool(fulfilment.queue.enqueue_event, event)
+    return {"received": True}
 
 @app.post("/add-to-cart")
-async def add_to_cart(request: Request):
-    form = await request.form()
-    product_id = int(form.get("product_id"))
-    
-    cart = request.session.get("cart", [])
-    cart.append(product_id)
-    request.session["cart"] = cart
-    
+def add_to_cart(request: Request, product_id: int = Form(...), db: Session = Depends(get_db)):
+    # Identifiant borné avant la lecture : le panier signé range les ids sur 32 bits.
+    if not 0 < product_id < 2**32 or catalog.get_product(db, product_id) is None:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
+    cart_store.add(request, product_id)
     return RedirectResponse(url="/cart", status_code=303)
 
 @app.post("/remove-from-cart")
-async def remove_from_cart(request: Request):
-    form = await request.form()
-    product_id = int(form.get("product_id"))
-    
-    cart = request.session.get("cart", [])
-    if product_id in cart:
-        cart.remove(product_id)
-        request.session["cart"] = cart
-    
+def remove_from_cart(request: Request, product_id: int = Form(...)):
+    cart_store.remove(request, product_id)
     return RedirectResponse(url="/cart", status_code=303)
 
 # --- Chatbot Route ---
@@ -398,26 +590,34 @@ class ChatMessage(BaseModel):
     message: str
 
 @app.post("/chat")
-async def chat_endpoint(chat_msg: ChatMessage):
-    user_message = chat_msg.message.lower()
-    response = ""
-    
-    if "bonjour" in user_message or "salut" in user_message or "hello" in user_message:
-        response = "Bonjour ! Bienvenue chez Chrystelle & Sleeks. Comment puis-je vous aider ?"
-    elif "livraison" in user_message or "expedition" in user_message or "envoi" in user_message:
-        response = "Nous livrons en France métropolitaine sous 3 à 5 jours ouvrés."
-    elif "retour" in user_message or "remboursement" in user_message:
-        response = "Vous avez 14 jours pour changer d'avis. Contactez-nous pour initier un retour."
-    elif "paiement" in user_message or "payer" in user_message:
-        response = "Le paiement est 100% sécurisé via Stripe. Nous acceptons les cartes bancaires."
-    elif "produit" in user_message or "cheveux" in user_message:
-        response = "Nous proposons une gamme complète : shampoings, après-shampoings, masques, huiles... Tout pour des cheveux magnifiques !"
-    elif "contact" in user_message or "mail" in user_message:
-        response = "Vous pouvez nous écrire à support@chrystelle-sleeks.com."
-    else:
-        response = "Désolé, je n'ai pas compris votre question. Je peux vous renseigner sur la livraison, les paiements ou nos produits."
-        
+async def chat_endpoint(chat_msg: ChatMessage, db: AsyncSession = Depends(get_async_db)):
+    response = await chatbot.answer(db, chat_msg.message)
     return {"response": response}
 
+# --- Stock et prix en direct (Server-Sent Events) ---
+@app.get("/events/products")
+async def product_event_stream(request: Request, ids: str = "", since: float = None):
+    # Aucune lecture en base : le flux ne sert que les changements publiés dans ce processus.
+    try:
+        product_ids = {int(product_id) for product_id in ids.split(",") if product_id.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids : liste d'identifiants séparés par des virgules")
+    if len(product_ids) > EVENTS_MAX_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"{EVENTS_MAX_PRODUCTS} produits au maximum")
+    if product_events.full:
+        raise HTTPException(status_code=503, detail="Trop de connexions en direct, veuillez réessayer plus tard.", headers={"Retry-After": "30"})
+    return StreamingResponse(event_stream(request.receive, product_ids or None, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Mesures de performance (format Prometheus) ---
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint(request: Request):
+    if METRICS_TOKEN:
+        if request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="Jeton requis")
+    elif not METRICS_PUBLIC:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Inclure le routeur de l'admin dans l'application principale
 app.include_router(admin_router)
\ No newline at end of file
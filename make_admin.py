@@ -1,6 +1,7 @@
 import sys
 from database import SessionLocal
 from models import User
+from identity_cache import IDENTITY_CACHE_TTL, SESSION_CLAIMS_TTL
 
 def make_user_admin(username: str):
     db = SessionLocal()
@@ -13,7 +14,10 @@ def make_user_admin(username: str):
 
     user.is_admin = True
     db.commit()
+    # Ce script tourne hors du serveur : les workers en cours gardent l'identité en cache
+    # (IDENTITY_CACHE_TTL, SESSION_CLAIMS_TTL pour le cookie signé), la promotion s'applique à leur expiration.
     print(f"✅ Succès ! L'utilisateur '{username}' est maintenant un administrateur.")
+    print(f"⏳ Effectif sur le serveur d'ici {max(IDENTITY_CACHE_TTL, SESSION_CLAIMS_TTL):.0f} s.")
     db.close()
 
 if __name__ == "__main__":
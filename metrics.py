@@ -0,0 +1,262 @@
+"""Mesures de performance par route : latence, requêtes SQL, temps base et rendu des gabarits.
+
+Un middleware ASGI ouvre un RequestStats par requête (contextvar, visible aussi dans le threadpool
+des routes synchrones et dans les sessions asynchrones) ; les événements SQLAlchemy du moteur
+(database.track_queries) et les gabarits Jinja y ajoutent leurs durées. Le tout est exposé au
+format texte Prometheus sur /metrics.
+
+METRICS_DEBUG=1 ajoute un en-tête Server-Timing aux réponses et signale les requêtes N+1 : la même
+instruction SELECT répétée au moins N_PLUS_ONE_THRESHOLD fois pendant une requête HTTP
+(typiquement un chargement paresseux de OrderItem.product dans une boucle).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+import jinja2
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DEBUG = os.getenv("METRICS_DEBUG", "0") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Si défini, /metrics exige "Authorization: Bearer <token>"
+# Sans jeton, /metrics répond 404, sauf ouverture explicite (développement, METRICS_DEBUG=1).
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "1" if METRICS_DEBUG else "0") == "1"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNMATCHED_ROUTE = "<unmatched>"  # Une seule série pour les 404, pas une par URL inconnue
+
+
+class RequestStats:
+    """Compteurs d'une requête HTTP en cours."""
+    __slots__ = ("queries", "db_seconds", "template_seconds", "statements")
+
+    def __init__(self, debug=False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = Counter() if debug else None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    """Histogramme cumulatif à seaux fixes, une série par combinaison d'étiquettes."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # étiquettes -> [compteurs par seau (non cumulés)..., +Inf, somme]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = base + "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels, value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            base = ",".join(f'{name}="{escape(v)}"' for name, v in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{base}}} {value:g}" if base else f"{self.name} {value:g}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Registre des mesures du processus (un par worker, comme les caches)."""
+
+    def __init__(self, enabled=METRICS_ENABLED, debug=METRICS_DEBUG):
+        self.enabled = enabled
+        self.debug = debug
+        self._lock = threading.Lock()
+        self.request_seconds = Histogram(
+            "app_request_duration_seconds", "Durée des requêtes HTTP par route.",
+            ("method", "route", "status"), LATENCY_BUCKETS)
+        self.request_queries = Histogram(
+            "app_request_db_queries", "Nombre d'instructions SQL par requête HTTP.",
+            ("method", "route"), QUERY_COUNT_BUCKETS)
+        self.request_db_seconds = Histogram(
+            "app_request_db_duration_seconds", "Temps passé dans la base par requête HTTP.",
+            ("method", "route"), LATENCY_BUCKETS)
+        self.template_seconds = Histogram(
+            "app_template_render_duration_seconds", "Durée de rendu des gabarits.",
+            ("template",), LATENCY_BUCKETS)
+        self.queries = CounterMetric(
+            "app_db_queries_total", "Instructions SQL exécutées (requêtes HTTP et tâches de fond).", ("context",))
+        self.db_seconds = CounterMetric(
+            "app_db_duration_seconds_total", "Temps total passé dans la base.", ("context",))
+        self.n_plus_one = CounterMetric(
+            "app_n_plus_one_total", "Requêtes HTTP où une même instruction SELECT a été répétée (METRICS_DEBUG).",
+            ("method", "route"))
+        self.rejections = CounterMetric(
+            "app_rejected_requests_total", "Requêtes refusées (429 limitation de débit, 503 surcharge).",
+            ("reason", "policy"))
+
+    # --- Collecte ---
+    def start_request(self):
+        return _current.set(RequestStats(self.debug))
+
+    def finish_request(self, token, method, route, status, seconds):
+        stats = _current.get()
+        _current.reset(token)
+        with self._lock:
+            self.request_seconds.observe((method, route, str(status)), seconds)
+            self.request_queries.observe((method, route), stats.queries)
+            self.request_db_seconds.observe((method, route), stats.db_seconds)
+        if stats.statements is not None:
+            repeated = [(sql, count) for sql, count in stats.statements.items()
+                        if count >= N_PLUS_ONE_THRESHOLD and sql.lstrip()[:6].upper() == "SELECT"]
+            if repeated:
+                with self._lock:
+                    self.n_plus_one.inc((method, route))
+                for sql, count in repeated:
+                    print(f"⚠️ N+1 probable sur {method} {route} : {count} × {' '.join(sql.split())[:160]}")
+        return stats
+
+    def record_query(self, statement, seconds):
+        """Appelé par les événements SQLAlchemy après chaque instruction."""
+        if not self.enabled:
+            return
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+            if stats.statements is not None:
+                stats.statements[statement] += 1
+        context = "request" if stats is not None else "background"
+        with self._lock:
+            self.queries.inc((context,))
+            self.db_seconds.inc((context,), seconds)
+
+    def record_template(self, name, seconds):
+        if not self.enabled:
+            return
+        stats = _current.get()
+        if stats is not None:
+            stats.template_seconds += seconds
+        with self._lock:
+            self.template_seconds.observe((name or "<string>",), seconds)
+
+    def record_rejection(self, reason, policy):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.rejections.inc((reason, policy))
+
+    # --- Exposition ---
+    def render(self):
+        """Texte au format d'exposition Prometheus (version 0.0.4)."""
+        with self._lock:
+            lines = []
+            for metric in (self.request_seconds, self.request_queries, self.request_db_seconds,
+                           self.template_seconds, self.queries, self.db_seconds, self.n_plus_one, self.rejections):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : une mesure par requête HTTP, étiquetée par le gabarit de la route (/product/{product_id}).
+
+    Écrit en ASGI pur plutôt qu'avec BaseHTTPMiddleware : pas de tâche supplémentaire par requête,
+    et les réponses en flux (exports) ne sont pas mises en mémoire. La durée court jusqu'au dernier
+    morceau envoyé.
+    """
+
+    def __init__(self, app, registry=metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        registry = self.registry
+        root_path = scope.get("root_path", "")
+        started = time.perf_counter()
+        token = registry.start_request()
+        stats = _current.get()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if registry.debug:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    timing = (f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                              f"tpl;dur={stats.template_seconds * 1000:.1f}, app;dur={elapsed:.1f}")
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode("ascii"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.finish_request(token, scope["method"], route_label(scope, root_path), status,
+                                    time.perf_counter() - started)
+
+
+def route_label(scope, root_path):
+    """Gabarit de la route servie ; le routeur complète le scope pendant l'appel."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path_format
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"] + "/{path}"  # Application montée (/static)
+    return UNMATCHED_ROUTE
+
+
+class TimedTemplate(jinja2.Template):
+    """Gabarit dont chaque rendu complet (TemplateResponse, render_fragment) est mesuré."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metrics.record_template(self.name, time.perf_counter() - started)
+
+
+def instrument_templates(environment):
+    """À appeler avant le premier rendu : les gabarits déjà compilés gardent leur classe."""
+    if metrics.enabled:
+        environment.template_class = TimedTemplate
@@ -0,0 +1,231 @@
+"""Migrations du schéma, numérotées et appliquées par une commande explicite.
+
+Usage :
+    python migrations.py            applique les migrations en attente
+    python migrations.py status     affiche la version de la base et les migrations en attente
+
+Le démarrage de l'application ne fait que vérifier la version (une requête, aucun DDL) : lancer
+les migrations avant de démarrer ou de déployer les workers. AUTO_MIGRATE=1 les applique au
+démarrage (développement local, un seul processus).
+
+Chaque migration est idempotente (colonnes et index créés s'ils manquent) : une base créée par
+l'ancien create_all ou mise à jour par l'ancien update_db.py part de la version 0 sans risque.
+Une nouvelle table ou colonne = une nouvelle migration en fin de liste, jamais une modification
+d'une migration déjà publiée.
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.orm import Session
+
+from database import Base, engine
+from models import (DailySales, FulfilmentJob, Order, OrderItem, Product, ProductDailySales, RateLimitBucket, Review,
+                    ReviewStats)
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", Float, nullable=False),
+)
+
+
+class SchemaError(RuntimeError):
+    """La base n'est pas à la version attendue par le code."""
+
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN si la colonne n'existe pas encore."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_indexes(conn, *models):
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def create_tables(conn, *models):
+    for model in models:
+        model.__table__.create(conn, checkfirst=True)
+
+
+def initial(conn):
+    # Tables manquantes, telles que définies aujourd'hui ; les migrations suivantes complètent les tables existantes.
+    Base.metadata.create_all(conn)
+
+
+def product_columns(conn):
+    from catalog_io import product_sku
+
+    add_column(conn, "products", "stock", "INTEGER DEFAULT 0")
+    add_column(conn, "products", "rating_avg", "FLOAT NOT NULL DEFAULT 0")
+    add_column(conn, "products", "sku", "VARCHAR")
+    taken = set(conn.scalars(select(Product.sku).where(Product.sku.is_not(None))))
+    missing = conn.execute(select(Product.id, Product.name).where(Product.sku.is_(None)).order_by(Product.id)).all()
+    for product_id, name in missing:
+        sku = product_sku(name) or f"produit-{product_id}"
+        sku = sku if sku not in taken else f"{sku}-{product_id}"
+        taken.add(sku)
+        conn.execute(text("UPDATE products SET sku = :sku WHERE id = :id"), {"sku": sku, "id": product_id})
+    # Une colonne ajoutée par ALTER TABLE ne peut pas porter UNIQUE : index unique à part (cible de ON CONFLICT).
+    if not any(set(c["column_names"]) == {"sku"} for c in inspect(conn).get_unique_constraints("products")):
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_products_sku ON products (sku)"))
+    create_indexes(conn, Product)
+
+
+def review_stats(conn):
+    import reviews
+
+    create_tables(conn, ReviewStats)
+    create_indexes(conn, Review)
+    reviews.rebuild_stats(Session(bind=conn))
+
+
+def search_index(conn):
+    import search
+
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")).first()
+        if not exists:
+            for statement in search.REBUILD_SQL:
+                conn.execute(statement)
+
+
+def fulfilment_jobs(conn):
+    create_tables(conn, FulfilmentJob)
+
+
+def order_history(conn):
+    import orders
+
+    add_column(conn, "orders", "item_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "orders", "summary", "VARCHAR NOT NULL DEFAULT ''")
+    create_indexes(conn, Order, OrderItem)
+    orders.rebuild_summaries(Session(bind=conn))
+
+
+def sales_rollups(conn):
+    import analytics
+
+    create_tables(conn, DailySales, ProductDailySales)
+    analytics.rebuild(Session(bind=conn))
+
+
+def foreign_key_indexes(conn):
+    # reviews.product_id, orders.user_id et order_items.order_id sont couverts par les index de
+    # migrations précédentes (préfixe gauche) ; restent reviews.user_id et order_items.product_id.
+    create_indexes(conn, Review, Order, OrderItem)
+
+
+def rate_limits(conn):
+    create_tables(conn, RateLimitBucket)
+
+
+# Les insertions se voient à max(id) : pas de déclencheur par ligne sur les imports en masse.
+CATALOG_CHANGE_TRIGGERS = [
+    ("update", "UPDATE OF name, price, image, message, stock"),
+    ("delete", "DELETE"),
+]
+
+
+def catalog_changes(conn):
+    # Compteur de modifications du catalogue tenu par la base elle-même : il voit aussi les écritures
+    # des autres workers et des scripts (fulfilment.py, reset_stock.py, catalog_io.py).
+    if conn.dialect.name == "postgresql":
+        # Séquence hors transaction : aucun verrou partagé entre les écritures de produits.
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS catalog_change_seq"))
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION catalog_changed() RETURNS trigger AS $$ "
+            "BEGIN PERFORM nextval('catalog_change_seq'); RETURN NULL; END $$ LANGUAGE plpgsql"
+        ))
+        for name, event in CATALOG_CHANGE_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS products_changed_{name} ON products"))
+            conn.execute(text(f"CREATE TRIGGER products_changed_{name} AFTER {event} ON products "
+                              "FOR EACH STATEMENT EXECUTE FUNCTION catalog_changed()"))
+        return
+    conn.execute(text("CREATE TABLE IF NOT EXISTS catalog_changes (id INTEGER PRIMARY KEY, counter INTEGER NOT NULL)"))
+    conn.execute(text("INSERT INTO catalog_changes (id, counter) VALUES (1, 0) ON CONFLICT (id) DO NOTHING"))
+    for name, event in CATALOG_CHANGE_TRIGGERS:
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS products_changed_{name} AFTER {event} ON products "
+                          "BEGIN UPDATE catalog_changes SET counter = counter + 1; END"))
+
+
+MIGRATIONS = [
+    (1, "initial", initial),
+    (2, "product_columns", product_columns),
+    (3, "review_stats", review_stats),
+    (4, "search_index", search_index),
+    (5, "fulfilment_jobs", fulfilment_jobs),
+    (6, "order_history", order_history),
+    (7, "sales_rollups", sales_rollups),
+    (8, "foreign_key_indexes", foreign_key_indexes),
+    (9, "rate_limits", rate_limits),
+    (10, "catalog_changes", catalog_changes),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Version de la base (0 si elle n'a jamais été migrée)."""
+    if not inspect(conn).has_table("schema_migrations"):
+        return 0
+    return conn.scalar(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc()).limit(1)) or 0
+
+
+def pending(conn):
+    version = current_version(conn)
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def upgrade(bind=engine, log=print):
+    """Applique les migrations en attente, chacune dans sa transaction ; renvoie la nouvelle version."""
+    with bind.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+    for version, name, migrate in MIGRATIONS:
+        with bind.begin() as conn:
+            if current_version(conn) >= version:
+                continue
+            started = time.perf_counter()
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=time.time()))
+        log(f"✅ Migration {version:03d} {name} appliquée ({time.perf_counter() - started:.2f} s)")
+    return LATEST_VERSION
+
+
+def verify(bind=engine):
+    """Vérification au démarrage : une seule requête, pas de DDL. SchemaError si la base est en retard."""
+    with bind.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaError(
+            f"Schéma de la base en version {version}, le code attend la version {LATEST_VERSION} : "
+            f"lancer `python migrations.py` avant de démarrer l'application."
+        )
+    if version > LATEST_VERSION:
+        print(f"⚠️ Base en version {version}, plus récente que le code (version {LATEST_VERSION}).")
+    return version
+
+
+def ensure_schema(bind=engine):
+    """Au démarrage de l'application : vérifie la version, ou migre si AUTO_MIGRATE=1."""
+    if AUTO_MIGRATE:
+        upgrade(bind)
+    return verify(bind)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["status"]:
+        with engine.connect() as conn:
+            version, todo = current_version(conn), pending(conn)
+        print(f"Version de la base : {version} (code : {LATEST_VERSION})")
+        for number, name, _ in todo:
+            print(f"  en attente : {number:03d} {name}")
+    else:
+        upgrade()
+        print(f"🚀 Base de données à jour (version {LATEST_VERSION}). Vous pouvez relancer le serveur.")
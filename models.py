@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, Index, Text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -6,13 +6,22 @@ from datetime import datetime
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, nullable=True, unique=True) # Référence, clé des imports du catalogue (catalog_io.py)
     name = Column(String, nullable=False)
     price = Column(Float, nullable=False)
     image = Column(String, nullable=False)
     message = Column(String, nullable=True)
     stock = Column(Integer, default=0)
+    rating_avg = Column(Float, nullable=False, default=0, server_default="0") # Moyenne des avis, recopiée depuis review_stats
     reviews = relationship("Review", back_populates="product")
 
+    # Pagination par clé du catalogue : un index (colonne de tri, id) par tri proposé
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_rating_avg_id", "rating_avg", "id"),
+    )
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -26,29 +35,103 @@ class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     rating = Column(Integer, nullable=False) # Note de 1 à 5
     comment = Column(String, nullable=True)
     product = relationship("Product", back_populates="reviews")
     user = relationship("User", back_populates="reviews")
 
+    # Pagination par clé : avis d'un produit, du plus récent au plus ancien
+    __table_args__ = (Index("ix_reviews_product_id_id", "product_id", "id"),)
+
+class ReviewStats(Base):
+    """Agrégats des avis d'un produit, mis à jour à chaque nouvel avis."""
+    __tablename__ = "review_stats"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     total_price = Column(Float, nullable=False)
+    # Résumé écrit à la création (orders.summarize) : l'historique s'affiche sans charger les articles.
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    summary = Column(String, nullable=False, default="", server_default="")
     
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Historique d'un client, du plus récent au plus ancien (pagination par clé)
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Integer, nullable=False)
     price_at_purchase = Column(Float, nullable=False)
 
     order = relationship("Order", back_populates="items")
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+
+class Cart(Base):
+    __tablename__ = "carts"
+    token = Column(String, primary_key=True)
+    expires_at = Column(Float, nullable=False, index=True) # Horodatage Unix
+
+class CartItem(Base):
+    __tablename__ = "cart_items"
+    token = Column(String, ForeignKey("carts.token"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+class RateLimitBucket(Base):
+    """Seau à jetons partagé entre les workers (RATE_LIMIT_BACKEND=database)."""
+    __tablename__ = "rate_limits"
+    key = Column(String, primary_key=True) # politique:ip, politique:utilisateur ou politique:*
+    tokens = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False, default=True) # Décision de la dernière demande (lue par RETURNING)
+    updated_at = Column(Float, nullable=False, index=True) # Horodatage Unix
+
+class FulfilmentJob(Base):
+    """Commande payée (webhook Stripe) en attente de traitement ; une seule par session de paiement."""
+    __tablename__ = "fulfilment_jobs"
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String, unique=True, nullable=False)
+    payload = Column(Text, nullable=False) # JSON : utilisateur, jeton de panier, lignes achetées
+    status = Column(String, nullable=False, default="pending") # pending, running, done, short (rupture de stock), failed
+    attempts = Column(Integer, nullable=False, default=0)
+    claim = Column(String, nullable=True, index=True) # Jeton du worker qui traite le lot
+    claimed_at = Column(Float, nullable=True)
+    created_at = Column(Float, nullable=False) # Horodatage Unix
+    last_error = Column(String, nullable=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+
+    __table_args__ = (Index("ix_fulfilment_jobs_status_id", "status", "id"),)
+
+class DailySales(Base):
+    """Ventes d'une journée (UTC), incrémentées à chaque commande traitée."""
+    __tablename__ = "daily_sales"
+    day = Column(Date, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)
+
+class ProductDailySales(Base):
+    """Ventes d'un produit sur une journée ; la clé (day, product_id) sert les requêtes par période."""
+    __tablename__ = "product_daily_sales"
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,97 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, tuple_, update
+
+from catalog_query import decode_cursor, encode_cursor
+from models import Order, OrderItem, Product
+
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", "20"))
+ORDERS_MAX_PAGE_SIZE = 100
+SUMMARY_MAX_LENGTH = 200
+DELETED_PRODUCT_NAME = "Produit supprimé"
+
+
+@dataclass(frozen=True)
+class OrderSummary:
+    """Ligne de l'historique : tout ce qu'affiche la liste, sans les articles."""
+    id: int
+    created_at: datetime
+    total_price: float
+    item_count: int
+    summary: str
+
+
+def summarize(lines):
+    """[(nom du produit, quantité), ...] -> (nombre d'articles, résumé "Huile ×2, Shampoing")."""
+    item_count = sum(quantity for _, quantity in lines)
+    summary = ", ".join(name if quantity == 1 else f"{name} ×{quantity}" for name, quantity in lines)
+    if len(summary) > SUMMARY_MAX_LENGTH:
+        summary = summary[:SUMMARY_MAX_LENGTH - 1].rstrip(", ") + "…"
+    return item_count, summary
+
+
+def fetch_page(db, user_id, before=None, limit=ORDERS_PAGE_SIZE):
+    """Une page de commandes de la plus récente à la plus ancienne, et le curseur `before` de la suivante.
+
+    Une seule requête étroite sur l'index (user_id, created_at, id) ; ValueError si le curseur est invalide.
+    """
+    limit = max(1, min(limit, ORDERS_MAX_PAGE_SIZE))
+    query = select(Order.id, Order.created_at, Order.total_price, Order.item_count, Order.summary).where(Order.user_id == user_id)
+    if before is not None:
+        created_at, last_id = decode_cursor(before)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            raise ValueError("Curseur de pagination invalide")
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(created_at, last_id))
+    rows = db.execute(query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)).all()
+    page = [OrderSummary(*row) for row in rows[:limit]]
+    next_before = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_before = encode_cursor(last.created_at.isoformat(), last.id)
+    return page, next_before
+
+
+def fetch_items(db, user_id, order_id):
+    """Articles d'une commande de l'utilisateur (chargés à la demande), ou None si elle ne lui appartient pas."""
+    owner = db.scalar(select(Order.user_id).where(Order.id == order_id))
+    if owner is None or owner != user_id:
+        return None
+    rows = db.execute(
+        select(OrderItem.product_id, OrderItem.quantity, OrderItem.price_at_purchase, Product.name, Product.image)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+    ).all()
+    return [
+        {"product_id": row.product_id, "quantity": row.quantity, "price_at_purchase": row.price_at_purchase,
+         "name": row.name or DELETED_PRODUCT_NAME, "image": row.image}
+        for row in rows
+    ]
+
+
+def rebuild_summaries(db, batch_size=1000):
+    """Recalcule item_count et summary des commandes existantes depuis order_items."""
+    last_id = 0
+    while True:
+        order_ids = db.scalars(select(Order.id).where(Order.id > last_id).order_by(Order.id).limit(batch_size)).all()
+        if not order_ids:
+            break
+        lines = {order_id: [] for order_id in order_ids}
+        rows = db.execute(
+            select(OrderItem.order_id, Product.name, OrderItem.quantity)
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id.in_(order_ids))
+            .order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for order_id, name, quantity in rows:
+            lines[order_id].append((name or DELETED_PRODUCT_NAME, quantity))
+        db.execute(update(Order), [
+            dict(zip(("item_count", "summary"), summarize(order_lines)), id=order_id)
+            for order_id, order_lines in lines.items()
+        ])
+        db.commit()
+        last_id = order_ids[-1]
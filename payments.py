@@ -0,0 +1,139 @@
+"""Client Stripe asynchrone : délais, nouvelles tentatives bornées et clés d'idempotence.
+
+Les appels passent par un client HTTPX asynchrone partagé (connexions réutilisées) et ne
+bloquent pas la boucle d'événements. STRIPE_API_BASE permet de viser fake_stripe.py en local.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")  # ex. http://127.0.0.1:12111 pour fake_stripe.py
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+# Deux créations identiques dans cette fenêtre (double clic, rechargement) renvoient la même session ;
+# le jeton d'achat (cart_store.checkout_nonce), renouvelé peu après chaque création de session,
+# sépare deux achats successifs.
+STRIPE_IDEMPOTENCY_WINDOW = int(os.getenv("STRIPE_IDEMPOTENCY_WINDOW", "600"))
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", "10000"))
+CURRENCY = "eur"
+
+
+class PaymentError(Exception):
+    """Stripe est injoignable ou a refusé la création de la session."""
+
+
+class PriceCache:
+    """Cache LRU des blocs price_data, indexés par (id, nom, prix) : un changement de prix crée une nouvelle entrée."""
+
+    def __init__(self, max_entries=PRICE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def price_data(self, product):
+        key = (product.id, product.name, product.price)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+            payload = {
+                "currency": CURRENCY,
+                "product_data": {"name": product.name},
+                "unit_amount": int(round(product.price * 100)),
+            }
+            self._entries[key] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return payload
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def idempotency_key(owner, line_items, now=None):
+    """Clé dérivée du contenu du panier, de son propriétaire et d'une fenêtre de temps."""
+    window = int((now or time.time()) // STRIPE_IDEMPOTENCY_WINDOW)
+    content = json.dumps([owner, window, line_items], sort_keys=True, separators=(",", ":"))
+    return "checkout-" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:40]
+
+
+class PaymentClient:
+    def __init__(self, api_key=STRIPE_SECRET_KEY, api_base=STRIPE_API_BASE, timeout=STRIPE_TIMEOUT,
+                 max_retries=STRIPE_MAX_RETRIES):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.prices = PriceCache()
+        self.created = 0
+        self.errors = 0
+        self._client = None
+
+    @property
+    def client(self):
+        # Créé au premier appel : l'import du module ne dépend pas de la configuration Stripe, et le
+        # SDK (~100 ms d'import) n'est chargé qu'au premier paiement, pas au démarrage à froid.
+        if self._client is None:
+            import stripe
+
+            if not self.api_key:
+                raise PaymentError("STRIPE_SECRET_KEY n'est pas configurée")
+            self._client = stripe.StripeClient(
+                self.api_key,
+                base_addresses={"api": self.api_base} if self.api_base else None,
+                http_client=stripe.HTTPXClient(timeout=self.timeout),
+                max_network_retries=self.max_retries,
+            )
+        return self._client
+
+    def line_items(self, lines):
+        """[(produit, quantité), ...] -> line_items Stripe, dans un ordre stable."""
+        return [
+            {"price_data": self.prices.price_data(product), "quantity": quantity}
+            for product, quantity in sorted(lines, key=lambda line: line[0].id)
+        ]
+
+    async def create_checkout_session(self, owner, lines, success_url, cancel_url, metadata=None, nonce=None):
+        """Crée (ou retrouve, même clé d'idempotence) la session de paiement d'un panier.
+
+        `nonce` identifie l'achat : sans lui, racheter le même panier dans la fenêtre
+        d'idempotence renverrait la session déjà payée.
+        """
+        line_items = self.line_items(lines)
+        params = {
+            "payment_method_types": ["card"],
+            "line_items": line_items,
+            "mode": "payment",
+            "success_url": success_url,
+            "cancel_url": cancel_url,
+        }
+        if metadata:
+            params["metadata"] = metadata
+        key = idempotency_key(owner, [nonce, line_items, success_url, metadata])
+        client = self.client
+        import stripe
+
+        try:
+            session = await client.v1.checkout.sessions.create_async(params, {"idempotency_key": key})
+        except stripe.StripeError as e:
+            self.errors += 1
+            raise PaymentError(str(e)) from e
+        self.created += 1
+        return session
+
+    def stats(self):
+        return {"created": self.created, "errors": self.errors, "prices": self.prices.stats()}
+
+
+payments = PaymentClient()
@@ -0,0 +1,208 @@
+"""Bus de publication des changements de stock et de prix, diffusé en Server-Sent Events.
+
+Les publications viennent du traitement des commandes (fulfilment.after_commit) et des routes
+d'administration ; elles peuvent arriver de n'importe quel thread. Le bus garde le dernier état
+connu de chaque produit et, au plus une fois par EVENTS_COALESCE_SECONDS, réveille seulement les
+abonnés concernés par les produits modifiés. Un abonné lent ne reçoit que l'état le plus récent de
+chaque produit, jamais une file d'événements : dix ventes du même produit pendant la fenêtre
+donnent un seul événement. Aucun abonné ne lit la base.
+
+À la connexion, seuls les états publiés après `since` (instant où la page a lu ses données,
+attribut data-live-since) sont renvoyés : un état plus ancien, gardé par ce processus alors qu'un
+autre worker ou un script (fulfilment.py, reset_stock.py, catalog_io.py) a changé le stock
+depuis, ne doit pas écraser la page qui vient d'être rendue. Sans `since`, rien n'est renvoyé.
+
+Le bus est propre au processus : avec plusieurs workers uvicorn ou un worker de commandes lancé à
+part (python fulfilment.py), un abonné ne voit que les changements faits dans son processus.
+Les flux restent ouverts : lancer uvicorn avec --timeout-graceful-shutdown pour que l'arrêt
+n'attende pas leur fermeture par les navigateurs.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+EVENTS_COALESCE_SECONDS = float(os.getenv("EVENTS_COALESCE_SECONDS", "0.25"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))  # Par worker
+EVENTS_RETRY_MS = 5000  # Délai de reconnexion conseillé au navigateur
+EVENTS_MAX_PRODUCTS = 200  # Produits suivis par une connexion (un panier, une page d'administration)
+
+
+class Subscriber:
+    """Une connexion SSE : produits suivis (None = tous) et produits modifiés depuis le dernier envoi."""
+    __slots__ = ("product_ids", "dirty", "waiter", "closed")
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        self.dirty = set()
+        self.waiter = None
+        self.closed = False
+
+    def notify(self, product_id):
+        self.dirty.add(product_id)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+
+class ProductEventBus:
+    def __init__(self, coalesce_seconds=EVENTS_COALESCE_SECONDS, max_subscribers=EVENTS_MAX_SUBSCRIBERS):
+        self.coalesce_seconds = coalesce_seconds
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.flushes = 0
+        self.notifications = 0
+        self._lock = threading.Lock()
+        self._state = {}  # product_id -> dernier état publié
+        self._pending = set()
+        self._flush_scheduled = False
+        self._loop = None
+        # Manipulés uniquement dans la boucle d'événements : pas de verrou.
+        self._by_product = defaultdict(set)
+        self._everything = set()
+        self._count = 0
+
+    # --- Publication (n'importe quel thread) ---
+    def publish(self, product_id, **fields):
+        """Nouvel état partiel d'un produit (stock, price, deleted) ; ignoré s'il ne change rien."""
+        with self._lock:
+            current = self._state.get(product_id)
+            if current is not None and all(current.get(name) == value for name, value in fields.items()):
+                return
+            version = current["version"] + 1 if current else 1
+            self._state[product_id] = {**(current or {"id": product_id}), **fields, "version": version, "at": time.time()}
+            self._pending.add(product_id)
+            self.published += 1
+            loop = self._loop
+            schedule = loop is not None and not self._flush_scheduled
+            if schedule:
+                self._flush_scheduled = True
+        if schedule:
+            try:
+                loop.call_soon_threadsafe(loop.call_later, self.coalesce_seconds, self._flush)
+            except RuntimeError:  # Boucle fermée (arrêt du serveur) : plus personne à prévenir
+                with self._lock:
+                    self._flush_scheduled = False
+
+    def publish_stocks(self, stocks):
+        for product_id, stock in stocks.items():
+            self.publish(product_id, stock=stock)
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._flush_scheduled = False
+        self.flushes += 1
+        for product_id in pending:
+            for subscriber in self._by_product.get(product_id, ()):
+                subscriber.notify(product_id)
+                self.notifications += 1
+            for subscriber in self._everything:
+                subscriber.notify(product_id)
+                self.notifications += 1
+
+    # --- Abonnement (boucle d'événements) ---
+    @property
+    def full(self):
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, product_ids=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop is not self._loop:
+                self._loop, self._flush_scheduled = loop, False
+            # Changements publiés avant le premier abonné (aucune boucle connue) : à diffuser aussi.
+            if self._pending and not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._loop.call_later(self.coalesce_seconds, self._flush)
+        subscriber = Subscriber(frozenset(product_ids) if product_ids else None)
+        if subscriber.product_ids is None:
+            self._everything.add(subscriber)
+        else:
+            for product_id in subscriber.product_ids:
+                self._by_product[product_id].add(subscriber)
+        self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber.product_ids is None:
+            self._everything.discard(subscriber)
+        else:
+            for product_id in subscriber.product_ids:
+                subscribers = self._by_product.get(product_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._by_product[product_id]
+        self._count -= 1
+
+    def snapshot(self, product_ids=None, since=None):
+        """Derniers états connus (publiés par ce processus), limités à ceux publiés après `since`."""
+        with self._lock:
+            if product_ids is None:
+                states = list(self._state.values())
+            else:
+                states = [self._state[product_id] for product_id in sorted(product_ids) if product_id in self._state]
+        return states if since is None else [state for state in states if state["at"] > since]
+
+    async def changes(self, subscriber, timeout):
+        """États modifiés depuis le dernier appel ; liste vide si rien n'a changé pendant `timeout` secondes."""
+        if not subscriber.dirty:
+            subscriber.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(subscriber.waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                subscriber.waiter = None
+        dirty, subscriber.dirty = subscriber.dirty, set()
+        return self.snapshot(dirty)
+
+    def stats(self):
+        return {"subscribers": self._count, "products_watched": len(self._by_product), "published": self.published,
+                "flushes": self.flushes, "notifications": self.notifications}
+
+
+product_events = ProductEventBus()
+
+
+def format_event(state):
+    return f"event: product\ndata: {json.dumps(state, separators=(',', ':'))}\n\n"
+
+
+async def watch_disconnect(receive, subscriber):
+    # Sans cela, un départ du client ne serait vu qu'à l'écriture suivante (jusqu'à un battement plus tard).
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    subscriber.close()
+
+
+async def event_stream(receive, product_ids=None, since=None, heartbeat=EVENTS_HEARTBEAT_SECONDS, bus=product_events):
+    """Corps de la réponse text/event-stream ; abonné au premier envoi, désabonné au départ du client."""
+    subscriber = bus.subscribe(product_ids)
+    watcher = asyncio.create_task(watch_disconnect(receive, subscriber))
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if since is not None:
+            for state in bus.snapshot(product_ids, since):
+                yield format_event(state)
+        while True:
+            states = await bus.changes(subscriber, heartbeat)
+            if subscriber.closed:
+                return
+            if states:
+                yield "".join(format_event(state) for state in states)
+            else:
+                yield ": ping\n\n"  # Garde la connexion ouverte à travers les proxys, détecte les départs
+    finally:
+        watcher.cancel()
+        bus.unsubscribe(subscriber)
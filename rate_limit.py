@@ -0,0 +1,408 @@
+"""Limitation de débit par seau à jetons et contrôle d'admission global.
+
+RateLimitMiddleware applique des politiques par route (connexion, inscription, avis, chatbot,
+paiement) : un seau par adresse IP, par utilisateur connecté ou par identifiant saisi (champ
+username du formulaire de connexion). Un seau de capacité `burst` se remplit de `rate` jetons
+par seconde ; une demande sans jeton reçoit 429 avec Retry-After, avant tout hachage pbkdf2 ou
+appel à Stripe. Aucun seau n'est global : une attaque répartie sur des milliers d'adresses ne doit
+pas pouvoir fermer la connexion à tous les visiteurs.
+
+Les seaux vivent en mémoire (un jeu par worker, remplaçant local d'un Redis) ou dans la table
+rate_limits partagée entre les workers (RATE_LIMIT_BACKEND=database, un upsert par demande
+limitée). Derrière un proxy, lancer uvicorn avec --proxy-headers --forwarded-allow-ips pour que
+l'adresse du client soit la vraie.
+
+AdmissionMiddleware borne les requêtes traitées simultanément par le worker : au-delà de
+ADMISSION_MAX_IN_FLIGHT, une requête attend au plus ADMISSION_QUEUE_TIMEOUT secondes parmi
+ADMISSION_MAX_QUEUE autres, sinon 503 immédiat. La charge excédentaire est refusée tout de
+suite plutôt que d'allonger la file du pool de threads pour tout le monde. Connexion et
+inscription ont leur propre file (auth_admission, ADMISSION_AUTH_*) : peu de places, car chacune
+attend un hachage pbkdf2 (auth.HashPool), mais une longue file. Une vague de tentatives y attend
+son tour sans prendre les places de la navigation, et sans 429 pour les vrais visiteurs.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from database import SessionLocal
+from metrics import metrics
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Seaux en mémoire (LRU)
+RATE_LIMIT_SWEEP_INTERVAL = int(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "300"))
+RATE_LIMIT_IDLE_SECONDS = 24 * 3600  # Un seau inutilisé depuis ce délai est plein : supprimé
+# 0 désactive le contrôle d'admission.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+ADMISSION_AUTH_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_AUTH_MAX_IN_FLIGHT", "8"))
+ADMISSION_AUTH_MAX_QUEUE = int(os.getenv("ADMISSION_AUTH_MAX_QUEUE", "1000"))
+ADMISSION_AUTH_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_AUTH_QUEUE_TIMEOUT", "10"))
+FORM_FIELD_MAX_BODY = 64 * 1024  # Au-delà, le corps n'est pas lu par le limiteur (seaux "username" ignorés)
+# Jamais refusés : supervision, fichiers statiques, webhooks Stripe (une simple insertion en file) et
+# flux SSE (connexions longues et inactives, bornées par EVENTS_MAX_SUBSCRIBERS).
+ADMISSION_EXEMPT_PREFIXES = ("/metrics", "/static/", "/stripe/webhook", "/events/")
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    rate: float  # Jetons ajoutés par seconde
+    burst: int  # Capacité du seau : demandes acceptées d'affilée
+    scope: str  # "ip", "user" (ignorée pour un visiteur anonyme) ou "username" (champ du formulaire)
+
+
+ROUTE_POLICIES = [
+    (("POST", re.compile(r"/login")), (
+        Policy("login-ip", 10 / 60, 10, "ip"),
+        # Un compte visé depuis de nombreuses adresses ; le CPU de pbkdf2 est borné par auth.HashPool.
+        Policy("login-username", 5 / 60, 5, "username"),
+    )),
+    (("POST", re.compile(r"/register")), (
+        Policy("register-ip", 10 / 3600, 5, "ip"),
+    )),
+    (("POST", re.compile(r"/product/\d+/review")), (
+        Policy("review-ip", 30 / 3600, 10, "ip"),
+        Policy("review-user", 10 / 3600, 5, "user"),
+    )),
+    (("POST", re.compile(r"/chat")), (
+        Policy("chat-ip", 1, 20, "ip"),
+    )),
+    (("POST", re.compile(r"/create-(cart-)?checkout-session")), (
+        Policy("checkout-ip", 20 / 60, 10, "ip"),
+        Policy("checkout-user", 10 / 60, 5, "user"),
+    )),
+]
+
+
+class MemoryRateLimitBackend:
+    """Seaux en mémoire, propres au worker ; les moins récemment utilisés sont oubliés (donc pleins)."""
+    blocking = False
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # clé -> (jetons, horodatage)
+
+    def take(self, key, rate, burst, now):
+        """Consomme un jeton ; renvoie (accepté, jetons restants)."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def sweep(self):
+        return 0
+
+
+class DatabaseRateLimitBackend:
+    """Seaux dans la table rate_limits : une instruction atomique par demande, partagée entre workers."""
+    blocking = True
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._statements = {}
+
+    def take_sql(self, dialect):
+        statement = self._statements.get(dialect)
+        if statement is None:
+            # Dans un UPDATE, les expressions lisent les valeurs d'avant la mise à jour.
+            refill = (f"{'LEAST' if dialect == 'postgresql' else 'MIN'}"
+                      "(:burst, rate_limits.tokens + (:now - rate_limits.updated_at) * :rate)")
+            statement = self._statements[dialect] = text(
+                "INSERT INTO rate_limits (key, tokens, allowed, updated_at) VALUES (:key, :burst - 1, TRUE, :now) "
+                f"ON CONFLICT (key) DO UPDATE SET allowed = {refill} >= 1, "
+                f"tokens = CASE WHEN {refill} >= 1 THEN {refill} - 1 ELSE {refill} END, updated_at = :now "
+                "RETURNING allowed, tokens"
+            )
+        return statement
+
+    def take(self, key, rate, burst, now):
+        with self.session_factory() as db:
+            allowed, tokens = db.execute(self.take_sql(db.get_bind().dialect.name), {
+                "key": key, "rate": rate, "burst": burst, "now": now,
+            }).one()
+            db.commit()
+        return bool(allowed), tokens
+
+    def sweep(self):
+        with self.session_factory() as db:
+            removed = db.execute(text("DELETE FROM rate_limits WHERE updated_at <= :before"),
+                                 {"before": time.time() - RATE_LIMIT_IDLE_SECONDS}).rowcount
+            db.commit()
+        return removed
+
+
+def create_backend(name=RATE_LIMIT_BACKEND):
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    if name == "database":
+        return DatabaseRateLimitBackend()
+    raise ValueError(f"RATE_LIMIT_BACKEND inconnu : {name}")
+
+
+class RateLimiter:
+    def __init__(self, backend, policies=ROUTE_POLICIES, enabled=RATE_LIMIT_ENABLED,
+                 sweep_interval=RATE_LIMIT_SWEEP_INTERVAL):
+        self.backend = backend
+        self.policies = policies
+        self.enabled = enabled
+        self.sweep_interval = sweep_interval
+        self.allowed = {}
+        self.rejected = {}
+        self._last_sweep = time.monotonic()
+
+    def policies_for(self, method, path):
+        for (route_method, pattern), policies in self.policies:
+            if method == route_method and pattern.fullmatch(path):
+                return policies
+        return ()
+
+    def check(self, policies, client_ip, user_id, username=None, now=None):
+        """Première politique dépassée et délai avant le prochain jeton, ou None si la demande passe.
+
+        Politiques évaluées dans l'ordre : une demande refusée par son seau IP n'entame pas le seau du compte.
+        """
+        now = now or time.time()
+        for policy in policies:
+            if policy.scope == "ip":
+                subject = client_ip
+            elif policy.scope == "user":
+                if user_id is None:
+                    continue
+                subject = user_id
+            else:
+                if not username:
+                    continue
+                subject = username
+            allowed, tokens = self.backend.take(f"{policy.name}:{subject}", policy.rate, policy.burst, now)
+            if not allowed:
+                self.rejected[policy.name] = self.rejected.get(policy.name, 0) + 1
+                return policy, (1 - tokens) / policy.rate
+            self.allowed[policy.name] = self.allowed.get(policy.name, 0) + 1
+        self.maybe_sweep()
+        return None
+
+    def maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.backend.sweep()
+
+    def stats(self):
+        return {"enabled": self.enabled, "backend": type(self.backend).__name__,
+                "allowed": dict(self.allowed), "rejected": dict(self.rejected)}
+
+
+limiter = RateLimiter(create_backend())
+
+
+async def read_form_field(scope, receive, name):
+    """Valeur d'un champ d'un formulaire urlencodé, et un `receive` qui rejoue le corps lu pour l'application."""
+    headers = dict(scope["headers"])
+    if not headers.get(b"content-type", b"").startswith(b"application/x-www-form-urlencoded"):
+        return None, receive
+    messages, size, more_body = [], 0, True
+    while more_body and size <= FORM_FIELD_MAX_BODY:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    pending = deque(messages)
+
+    async def replay():
+        return pending.popleft() if pending else await receive()
+
+    # Corps trop grand ou client parti : pas de champ, l'application lira la suite elle-même.
+    if more_body or messages[-1]["type"] != "http.request":
+        return None, replay
+    body = b"".join(message.get("body", b"") for message in messages)
+    try:
+        values = parse_qs(body.decode("latin-1"), max_num_fields=50).get(name)
+    except ValueError:
+        return None, replay
+    return (values[0] if values else None), replay
+
+
+def username_key(value):
+    """Identifiant saisi, normalisé et condensé : une clé de seau de taille fixe."""
+    value = (value or "").strip().lower()
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:24] if value else None
+
+
+def too_many_requests(retry_after):
+    return JSONResponse({"detail": "Trop de tentatives, veuillez réessayer dans un instant."}, status_code=429,
+                        headers={"Retry-After": str(max(1, round(retry_after)))})
+
+
+class RateLimitMiddleware:
+    """À placer sous le middleware de session : la politique "user" lit request.session["user_id"]."""
+
+    def __init__(self, app, limiter=limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        policies = self.limiter.policies_for(scope["method"], scope["path"])
+        if policies:
+            client_ip = scope["client"][0] if scope.get("client") else "inconnu"
+            user_id = scope.get("session", {}).get("user_id")
+            username = None
+            if any(policy.scope == "username" for policy in policies):
+                username, receive = await read_form_field(scope, receive, "username")
+                username = username_key(username)
+            if self.limiter.backend.blocking:
+                rejected = await run_in_threadpool(self.limiter.check, policies, client_ip, user_id, username)
+            else:
+                rejected = self.limiter.check(policies, client_ip, user_id, username)
+            if rejected is not None:
+                policy, retry_after = rejected
+                metrics.record_rejection("rate_limit", policy.name)
+                await too_many_requests(retry_after)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class AdmissionController:
+    """Places de traitement d'un worker, avec une file d'attente bornée dans le temps et en taille.
+
+    Tout se passe dans la boucle d'événements du worker : pas de verrou. Chaque attente est un
+    Future de la boucle courante, libéré dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = deque()
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0
+
+    async def acquire(self):
+        """True si la requête obtient une place ; False si elle doit être refusée."""
+        if self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self.max_waiting = max(self.max_waiting, len(self._waiters))
+        expiry = loop.call_later(self.queue_timeout, lambda: waiter.done() or waiter.set_result(False))
+        try:
+            granted = await waiter
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente : rendre la place si elle venait de lui être attribuée.
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            raise
+        finally:
+            expiry.cancel()
+            try:
+                self._waiters.remove(waiter)  # Toujours en file si expirée ou annulée
+            except ValueError:
+                pass
+        if granted:
+            self.admitted += 1
+        else:
+            self.timed_out += 1
+        return granted
+
+    def release(self):
+        # La place passe directement au plus ancien en attente ; in_flight ne change pas.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_waiting": self.max_waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+admission = AdmissionController()
+# Connexion et inscription : file séparée, longue, pour ne jamais occuper les places de la navigation.
+auth_admission = AdmissionController(ADMISSION_AUTH_MAX_IN_FLIGHT, ADMISSION_AUTH_MAX_QUEUE, ADMISSION_AUTH_QUEUE_TIMEOUT)
+ADMISSION_LANES = [
+    (("POST", re.compile(r"/(login|register)")), auth_admission),
+]
+
+
+def service_unavailable():
+    return JSONResponse({"detail": "Serveur très sollicité, veuillez réessayer dans un instant."}, status_code=503,
+                        headers={"Retry-After": "1"})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller=admission, lanes=ADMISSION_LANES, exempt_prefixes=ADMISSION_EXEMPT_PREFIXES):
+        self.app = app
+        self.controller = controller
+        self.lanes = lanes
+        self.exempt_prefixes = exempt_prefixes
+
+    def controller_for(self, method, path):
+        for (lane_method, pattern), controller in self.lanes:
+            if method == lane_method and pattern.fullmatch(path) and controller.enabled:
+                return controller
+        return self.controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller_for(scope["method"], scope["path"])
+        if not controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        if not await controller.acquire():
+            metrics.record_rejection("overload", "admission" if controller is self.controller else "admission-auth")
+            await service_unavailable()(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release()
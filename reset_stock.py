@@ -1,13 +1,11 @@
+from catalog_io import adjust_stock
 from database import SessionLocal
-from models import Product
 
 db = SessionLocal()
-products = db.query(Product).all()
 
 print("🔄 Mise à jour des stocks à 50...")
-for product in products:
-    product.stock = 50
+# Une seule instruction UPDATE, sans charger les produits
+adjust_stock(db, set_to=50)
 
-db.commit()
 db.close()
 print("✅ Terminé ! Tous les produits ont maintenant 50 unités en stock.")
\ No newline at end of file
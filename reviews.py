@@ -0,0 +1,124 @@
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import select, text
+
+from models import Review, ReviewStats, User
+
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "10"))
+REVIEWS_MAX_PAGE_SIZE = 50
+
+# Incrément des agrégats dans la même transaction que l'insertion de l'avis
+UPSERT_STATS_SQL = text(
+    "INSERT INTO review_stats (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5) "
+    "VALUES (:product_id, 1, :rating, :s1, :s2, :s3, :s4, :s5) "
+    "ON CONFLICT (product_id) DO UPDATE SET "
+    "review_count = review_stats.review_count + 1, "
+    "rating_sum = review_stats.rating_sum + excluded.rating_sum, "
+    "stars_1 = review_stats.stars_1 + excluded.stars_1, "
+    "stars_2 = review_stats.stars_2 + excluded.stars_2, "
+    "stars_3 = review_stats.stars_3 + excluded.stars_3, "
+    "stars_4 = review_stats.stars_4 + excluded.stars_4, "
+    "stars_5 = review_stats.stars_5 + excluded.stars_5"
+)
+
+# Moyenne recopiée sur le produit, pour trier le catalogue par note via un index
+UPDATE_RATING_SQL = text(
+    "UPDATE products SET rating_avg = COALESCE(("
+    "SELECT CAST(rating_sum AS FLOAT) / review_count FROM review_stats "
+    "WHERE review_stats.product_id = products.id AND review_count > 0), 0) "
+    "WHERE id = :product_id"
+)
+
+REBUILD_STATS_SQL = [
+    text("DELETE FROM review_stats"),
+    text(
+        "INSERT INTO review_stats (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5) "
+        "SELECT product_id, count(*), sum(rating), "
+        # CASE plutôt que sum(rating = n) : PostgreSQL n'additionne pas des booléens.
+        "sum(CASE WHEN rating = 1 THEN 1 ELSE 0 END), sum(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN rating = 3 THEN 1 ELSE 0 END), sum(CASE WHEN rating = 4 THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN rating = 5 THEN 1 ELSE 0 END) "
+        "FROM reviews WHERE product_id IS NOT NULL GROUP BY product_id"
+    ),
+    text(
+        "UPDATE products SET rating_avg = COALESCE(("
+        "SELECT CAST(rating_sum AS FLOAT) / review_count FROM review_stats "
+        "WHERE review_stats.product_id = products.id AND review_count > 0), 0)"
+    ),
+]
+
+
+@dataclass(frozen=True)
+class ReviewSummary:
+    """Nombre d'avis, moyenne et histogramme (du 5 au 1 étoile) d'un produit."""
+    count: int = 0
+    rating_sum: int = 0
+    histogram: tuple = (0, 0, 0, 0, 0)
+
+    @property
+    def average(self):
+        return round(self.rating_sum / self.count, 1) if self.count else None
+
+    @classmethod
+    def from_stats(cls, stats):
+        if stats is None:
+            return cls()
+        return cls(
+            count=stats.review_count,
+            rating_sum=stats.rating_sum,
+            histogram=(stats.stars_5, stats.stars_4, stats.stars_3, stats.stars_2, stats.stars_1),
+        )
+
+
+def stats_params(product_id, rating):
+    params = {"product_id": product_id, "rating": rating}
+    for star in range(1, 6):
+        params[f"s{star}"] = int(rating == star)
+    return params
+
+
+async def add_review(db, product_id, user_id, rating, comment):
+    """Enregistre un avis et met à jour les agrégats du produit (session asynchrone)."""
+    db.add(Review(product_id=product_id, user_id=user_id, rating=rating, comment=comment))
+    await db.execute(UPSERT_STATS_SQL, stats_params(product_id, rating))
+    await db.execute(UPDATE_RATING_SQL, {"product_id": product_id})
+    await db.commit()
+
+
+def get_summary(db, product_id):
+    return ReviewSummary.from_stats(db.get(ReviewStats, product_id))
+
+
+def summaries_by_product(db, product_ids=None):
+    """Résumés des produits notés, en une requête ; limités à `product_ids` (une page de la grille) si fourni."""
+    query = select(ReviewStats)
+    if product_ids is not None:
+        query = query.where(ReviewStats.product_id.in_(product_ids))
+    return {stats.product_id: ReviewSummary.from_stats(stats) for stats in db.scalars(query)}
+
+
+def fetch_page(db, product_id, before=None, limit=REVIEWS_PAGE_SIZE):
+    """Une page d'avis du plus récent au plus ancien, et l'id à passer en `before` pour la suivante."""
+    limit = max(1, min(limit, REVIEWS_MAX_PAGE_SIZE))
+    query = (
+        select(Review.id, Review.rating, Review.comment, User.username)
+        .outerjoin(User, User.id == Review.user_id)
+        .where(Review.product_id == product_id)
+    )
+    if before is not None:
+        query = query.where(Review.id < before)
+    rows = db.execute(query.order_by(Review.id.desc()).limit(limit + 1)).all()
+    page = [
+        {"id": row.id, "rating": row.rating, "comment": row.comment, "username": row.username}
+        for row in rows[:limit]
+    ]
+    next_before = page[-1]["id"] if len(rows) > limit else None
+    return page, next_before
+
+
+def rebuild_stats(db):
+    """Recalcule tous les agrégats depuis la table reviews."""
+    for statement in REBUILD_STATS_SQL:
+        db.execute(statement)
+    db.commit()
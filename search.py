@@ -0,0 +1,144 @@
+"""Recherche plein texte des produits (SQLite FTS5, insensible aux accents et à la casse).
+
+Usage : python search.py   (reconstruit l'index depuis la table products)
+"""
+import os
+import re
+
+from sqlalchemy import select, text
+
+from catalog_cache import ProductSnapshot
+from models import Product
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_PAGE_SIZE = 100
+SUGGEST_LIMIT = 8
+# Le nom pèse plus que la description dans le classement bm25
+NAME_WEIGHT, MESSAGE_WEIGHT = 10.0, 1.0
+
+# remove_diacritics 2 : "eclat" trouve "Éclat" ; prefix : index des préfixes de 2 et 3 lettres pour l'autocomplétion.
+CREATE_SQL = text(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, message, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DELETE_SQL = text("DELETE FROM products_fts WHERE rowid = :id")
+INSERT_SQL = text("INSERT INTO products_fts (rowid, name, message) VALUES (:id, :name, :message)")
+# Classement par défaut de la table (colonne `rank`), calculé par FTS5 lui-même
+RANK_SQL = text(f"INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25({NAME_WEIGHT}, {MESSAGE_WEIGHT})')")
+# Recréer la table est deux fois plus rapide que d'en supprimer toutes les lignes (gros imports).
+REBUILD_SQL = [
+    text("DROP TABLE IF EXISTS products_fts"),
+    CREATE_SQL,
+    RANK_SQL,
+    text("INSERT INTO products_fts (rowid, name, message) SELECT id, name, COALESCE(message, '') FROM products"),
+    text("INSERT INTO products_fts (products_fts) VALUES ('optimize')"),
+]
+SEARCH_SQL = text(
+    "SELECT products.* FROM products_fts JOIN products ON products.id = products_fts.rowid "
+    "WHERE products_fts MATCH :match ORDER BY products_fts.rank LIMIT :limit OFFSET :offset"
+)
+# Pas de classement pour l'autocomplétion : les premières correspondances suffisent, sans tout parcourir.
+SUGGEST_SQL = text(
+    "SELECT products.id, products.name FROM products_fts JOIN products ON products.id = products_fts.rowid "
+    "WHERE products_fts MATCH :match LIMIT :limit"
+)
+MATCH_IDS_SQL = "SELECT rowid FROM products_fts WHERE products_fts MATCH :match"
+
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(query, prefix=False, column=None):
+    """Traduit une saisie libre en expression FTS5 sûre (chaque mot entre guillemets), ou None si vide.
+
+    Avec prefix=True, le dernier mot est complété (autocomplétion pendant la frappe).
+    """
+    tokens = TOKEN.findall(query or "")
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += "*"
+    expression = " AND ".join(terms)
+    return f"{column} : ({expression})" if column else expression
+
+
+class SearchIndex:
+    """Index FTS5 tenu à jour par les routes d'administration ; désactivé hors SQLite."""
+
+    def __init__(self):
+        self.enabled = False
+
+    def configure(self, engine):
+        """Active l'index selon la base ; aucun DDL ni requête, la table est créée par la migration search_index."""
+        self.enabled = engine.dialect.name == "sqlite"
+
+    def rebuild(self, db):
+        for statement in REBUILD_SQL:
+            db.execute(statement)
+        db.commit()
+
+    @staticmethod
+    def _row(product):
+        return {"id": product.id, "name": product.name, "message": product.message or ""}
+
+    # Les mises à jour s'exécutent dans la transaction de l'appelant, avant son commit.
+    def index_product(self, db, product):
+        if self.enabled:
+            db.execute(DELETE_SQL, {"id": product.id})
+            db.execute(INSERT_SQL, self._row(product))
+
+    async def index_product_async(self, db, product):
+        if self.enabled:
+            await db.execute(DELETE_SQL, {"id": product.id})
+            await db.execute(INSERT_SQL, self._row(product))
+
+    def remove_product(self, db, product_id):
+        if self.enabled:
+            db.execute(DELETE_SQL, {"id": product_id})
+
+    def matching_ids(self, query):
+        """Sous-requête des ids correspondant à la saisie (pour filtrer le catalogue), ou None."""
+        match = match_expression(query)
+        if not self.enabled or match is None:
+            return None
+        return text(MATCH_IDS_SQL).bindparams(match=match).columns(rowid=Product.id.type)
+
+    def search(self, db, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """Produits classés par pertinence (bm25)."""
+        match = match_expression(query)
+        if match is None:
+            return []
+        limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+        if not self.enabled:
+            # Sans FTS5 (PostgreSQL) : simple filtre sur le nom, sans classement.
+            statement = select(Product).where(Product.name.icontains(query.strip(), autoescape=True))
+            products = db.scalars(statement.order_by(Product.id).limit(limit).offset(offset)).all()
+        else:
+            statement = select(Product).from_statement(SEARCH_SQL)
+            products = db.scalars(statement, {"match": match, "limit": limit, "offset": offset}).all()
+        return [ProductSnapshot.from_orm(p) for p in products]
+
+    def suggest(self, db, query, limit=SUGGEST_LIMIT):
+        """Autocomplétion : produits dont le nom commence par les mots saisis."""
+        if not self.enabled:
+            return [{"id": p.id, "name": p.name} for p in self.search(db, query, limit)]
+        match = match_expression(query, prefix=True, column="name")
+        if match is None:
+            return []
+        rows = db.execute(SUGGEST_SQL, {"match": match, "limit": limit}).all()
+        return [{"id": row.id, "name": row.name} for row in rows]
+
+
+search_index = SearchIndex()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+
+    search_index.configure(engine)
+    if not search_index.enabled:
+        raise SystemExit("ℹ️ La recherche plein texte nécessite SQLite (FTS5).")
+    with SessionLocal() as db:
+        search_index.rebuild(db)
+        count = db.execute(text("SELECT count(*) FROM products_fts")).scalar()
+    print(f"✅ Index de recherche reconstruit : {count} produit(s).")
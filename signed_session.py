@@ -0,0 +1,215 @@
+"""Session sans état pour les déploiements serverless : cookie binaire compact, signé, clés versionnées.
+
+SESSION_MODE=signed remplace le SessionMiddleware de Starlette (JSON en base64 signé par
+itsdangerous, renvoyé à chaque réponse) : les champs connus sont empaquetés en binaire (identité
+de l'utilisateur, jeton et contenu du panier {id: quantité}), le reste en JSON compact, et le
+cookie n'est renvoyé que si la session a changé ou approche de son expiration. Avec le panier
+dans le cookie (CART_BACKEND=session) et l'identité signée, les pages courantes n'ont besoin
+d'aucune lecture en base pour le panier ni pour l'utilisateur connecté.
+
+Clés : SESSION_KEYS="2:nouveau-secret,1:ancien-secret" ; la première signe, toutes vérifient.
+Pour une rotation, ajouter la nouvelle clé en tête, puis retirer l'ancienne après SESSION_MAX_AGE.
+Sur Vercel (variable VERCEL définie), le mode signé est activé par défaut.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+SESSION_MODE = os.getenv("SESSION_MODE", "signed" if os.getenv("VERCEL") else "cookie")
+SESSION_COOKIE = "session"
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(14 * 24 * 3600)))
+# Un cookie inchangé n'est renvoyé (prolongé) qu'une fois cet âge atteint.
+SESSION_REFRESH_AFTER = int(os.getenv("SESSION_REFRESH_AFTER", str(24 * 3600)))
+SESSION_CART_MAX_ITEMS = int(os.getenv("SESSION_CART_MAX_ITEMS", "200"))  # Garde le cookie sous 4 Kio
+
+FORMAT_VERSION = 1
+MAC_SIZE = 16
+HEADER = struct.Struct("!BBI")  # version, identifiant de clé, émis à (secondes Unix)
+USER = struct.Struct("!IBI")  # user_id, drapeaux, claims_at
+CART_LINE = struct.Struct("!IH")  # product_id, quantité
+TAG_USER, TAG_CART_TOKEN, TAG_CART, TAG_EXTRA = 1, 2, 3, 127
+FLAG_ADMIN, FLAG_CLAIMS = 1, 2
+USER_KEYS = ("user_id", "username", "is_admin", "claims_at")
+
+
+class SessionFormatError(ValueError):
+    """Cookie tronqué, altéré, expiré ou signé par une clé inconnue."""
+
+
+def parse_keys(raw, fallback_secret):
+    """"2:secret,1:ancien" -> ({2: b"secret", 1: b"ancien"}, 2). Sans SESSION_KEYS : clé 1 dérivée de SECRET_KEY."""
+    keys, current = {}, None
+    for part in (raw or "").split(","):
+        if not part.strip():
+            continue
+        key_id, _, secret = part.strip().partition(":")
+        if not secret or not key_id.isdigit() or not 0 < int(key_id) < 256:
+            raise ValueError(f"SESSION_KEYS invalide : {part!r} (attendu id:secret, id de 1 à 255)")
+        keys[int(key_id)] = secret.encode("utf-8")
+        current = current or int(key_id)
+    if not keys:
+        keys, current = {1: fallback_secret.encode("utf-8")}, 1
+    return keys, current
+
+
+def _pack_str(value, length_format="!B"):
+    raw = value.encode("utf-8")
+    return struct.pack(length_format, len(raw)) + raw
+
+
+def pack_session(session):
+    """Corps binaire d'une session (sans en-tête ni signature)."""
+    parts = []
+    if session.get("user_id") is not None:
+        username = (session.get("username") or "").encode("utf-8")
+        # Nom trop long pour un octet de longueur : identité relue en base plutôt que tronquée.
+        has_claims = "claims_at" in session and len(username) < 256
+        flags = (FLAG_ADMIN if session.get("is_admin") else 0) | (FLAG_CLAIMS if has_claims else 0)
+        parts.append(bytes([TAG_USER]) + USER.pack(int(session["user_id"]), flags, int(session.get("claims_at") or 0))
+                     + (bytes([len(username)]) + username if has_claims else b"\x00"))
+    if session.get("cart_token"):
+        parts.append(bytes([TAG_CART_TOKEN]) + _pack_str(session["cart_token"]))
+    cart = session.get("cart_items")
+    if cart:
+        # Lignes hors des bornes du format binaire ignorées : le middleware ne doit jamais échouer à l'écriture.
+        lines = sorted((int(product_id), min(int(quantity), 0xFFFF)) for product_id, quantity in cart.items()
+                       if 0 <= int(product_id) <= 0xFFFFFFFF and int(quantity) > 0)
+        parts.append(bytes([TAG_CART]) + struct.pack("!H", len(lines))
+                     + b"".join(CART_LINE.pack(product_id, quantity) for product_id, quantity in lines))
+    extra = {key: value for key, value in session.items() if key not in USER_KEYS + ("cart_token", "cart_items")}
+    if extra:
+        parts.append(bytes([TAG_EXTRA]) + _pack_str(json.dumps(extra, separators=(",", ":")), "!H"))
+    return b"".join(parts)
+
+
+def unpack_session(body):
+    session, offset = {}, 0
+    try:
+        while offset < len(body):
+            tag = body[offset]
+            offset += 1
+            if tag == TAG_USER:
+                user_id, flags, claims_at = USER.unpack_from(body, offset)
+                offset += USER.size
+                length = body[offset]
+                username = body[offset + 1:offset + 1 + length].decode("utf-8")
+                offset += 1 + length
+                session["user_id"] = user_id
+                if flags & FLAG_CLAIMS:
+                    session.update(username=username, is_admin=bool(flags & FLAG_ADMIN), claims_at=claims_at)
+            elif tag == TAG_CART_TOKEN:
+                length = body[offset]
+                session["cart_token"] = body[offset + 1:offset + 1 + length].decode("ascii")
+                offset += 1 + length
+            elif tag == TAG_CART:
+                (count,) = struct.unpack_from("!H", body, offset)
+                offset += 2
+                session["cart_items"] = dict(CART_LINE.iter_unpack(body[offset:offset + count * CART_LINE.size]))
+                offset += count * CART_LINE.size
+            elif tag == TAG_EXTRA:
+                (length,) = struct.unpack_from("!H", body, offset)
+                session.update(json.loads(body[offset + 2:offset + 2 + length]))
+                offset += 2 + length
+            else:
+                raise SessionFormatError(f"champ inconnu : {tag}")
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise SessionFormatError(str(e)) from e
+    return session
+
+
+class SessionCodec:
+    """Encode/décode le cookie : base64url(en-tête + corps + HMAC-SHA256 tronqué)."""
+
+    def __init__(self, keys, current_key_id, max_age=SESSION_MAX_AGE):
+        self.keys = keys
+        self.current_key_id = current_key_id
+        self.max_age = max_age
+
+    def _mac(self, key_id, data):
+        return hmac.new(self.keys[key_id], data, hashlib.sha256).digest()[:MAC_SIZE]
+
+    def encode_body(self, body, issued_at=None):
+        data = HEADER.pack(FORMAT_VERSION, self.current_key_id, int(issued_at or time.time())) + body
+        return base64.urlsafe_b64encode(data + self._mac(self.current_key_id, data)).rstrip(b"=").decode("ascii")
+
+    def encode(self, session, issued_at=None):
+        return self.encode_body(pack_session(session), issued_at)
+
+    def decode_raw(self, cookie, now=None):
+        """Renvoie (corps, identifiant de clé, émis à) d'un cookie valide ; SessionFormatError sinon."""
+        try:
+            raw = base64.urlsafe_b64decode(cookie + "=" * (-len(cookie) % 4))
+        except (ValueError, TypeError) as e:
+            raise SessionFormatError("base64 invalide") from e
+        if len(raw) < HEADER.size + MAC_SIZE:
+            raise SessionFormatError("cookie tronqué")
+        data, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+        version, key_id, issued_at = HEADER.unpack_from(data)
+        if version != FORMAT_VERSION or key_id not in self.keys:
+            raise SessionFormatError("version ou clé inconnue")
+        if not hmac.compare_digest(mac, self._mac(key_id, data)):
+            raise SessionFormatError("signature invalide")
+        if self.max_age and issued_at + self.max_age < (now or time.time()):
+            raise SessionFormatError("session expirée")
+        return data[HEADER.size:], key_id, issued_at
+
+    def decode(self, cookie, now=None):
+        return unpack_session(self.decode_raw(cookie, now)[0])
+
+
+class SignedSessionMiddleware:
+    """Remplaçant de starlette.middleware.sessions.SessionMiddleware : même request.session, autre cookie."""
+
+    def __init__(self, app, secret_key, session_keys=None, max_age=SESSION_MAX_AGE,
+                 refresh_after=SESSION_REFRESH_AFTER, same_site="lax", https_only=False):
+        self.app = app
+        self.codec = SessionCodec(*parse_keys(session_keys, secret_key), max_age=max_age)
+        self.refresh_after = refresh_after
+        self.security_flags = "httponly; samesite=" + same_site + ("; secure" if https_only else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        body, key_id, issued_at = b"", None, 0
+        cookie = HTTPConnection(scope).cookies.get(SESSION_COOKIE)
+        if cookie:
+            try:
+                body, key_id, issued_at = self.codec.decode_raw(cookie)
+                scope["session"] = unpack_session(body)
+            except SessionFormatError:
+                body, key_id = b"", None
+                scope["session"] = {}
+        else:
+            scope["session"] = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                header = self.cookie_header(scope["session"], body, key_id, issued_at, had_cookie=bool(cookie))
+                if header:
+                    MutableHeaders(scope=message).append("Set-Cookie", header)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def cookie_header(self, session, previous_body, previous_key_id, issued_at, had_cookie):
+        """En-tête Set-Cookie à envoyer, ou None si le cookie du navigateur est encore bon."""
+        if not session:
+            if had_cookie:
+                return f"{SESSION_COOKIE}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}"
+            return None
+        new_body = pack_session(session)
+        unchanged = new_body == previous_body and previous_key_id == self.codec.current_key_id
+        if unchanged and time.time() - issued_at < self.refresh_after:
+            return None
+        value = self.codec.encode_body(new_body)
+        max_age = f"Max-Age={self.codec.max_age}; " if self.codec.max_age else ""
+        return f"{SESSION_COOKIE}={value}; path=/; {max_age}{self.security_flags}"
@@ -0,0 +1,24 @@
+// Stock et prix en direct : une connexion SSE (/events/products) pour les produits affichés.
+// Les éléments marqués data-live-product="<id>" data-live-field="price|stock" sont mis à jour ;
+// l'événement "live-product" (detail = état du produit) permet à chaque page d'aller plus loin.
+// data-live-since (instant de lecture des données de la page) : seuls les changements postérieurs
+// sont rejoués à la connexion ; sans lui, seuls les changements à venir sont reçus.
+(function () {
+    const elements = document.querySelectorAll('[data-live-product]');
+    if (!elements.length || !window.EventSource) {
+        return;
+    }
+    const ids = [...new Set([...elements].map((element) => element.dataset.liveProduct))];
+    const since = Math.min(...[...document.querySelectorAll('[data-live-since]')].map((element) => Number(element.dataset.liveSince)));
+    const source = new EventSource('/events/products?ids=' + ids.join(',') + (Number.isFinite(since) ? '&since=' + since : ''));
+    source.addEventListener('product', (event) => {
+        const state = JSON.parse(event.data);
+        for (const element of document.querySelectorAll(`[data-live-product="${state.id}"][data-live-field]`)) {
+            const value = state[element.dataset.liveField];
+            if (value !== undefined && value !== null) {
+                element.textContent = value;
+            }
+        }
+        document.dispatchEvent(new CustomEvent('live-product', { detail: state }));
+    });
+})();
@@ -0,0 +1,171 @@
+"""Fichiers statiques empreintés (hash du contenu dans l'URL) et servis précompressés.
+
+Usage : python static_assets.py   (génère les variantes gzip/brotli de static/)
+
+Étape de déploiement, à relancer après chaque modification de static/ : le serveur ne fait que
+servir les variantes existantes et se rabat sur le fichier brut quand elles manquent.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : on se contente alors de gzip
+    brotli = None
+
+STATIC_DIR = "static"
+PRECOMPRESSED_DIR = os.path.join(STATIC_DIR, ".precompressed")
+STATIC_FINGERPRINT = os.getenv("STATIC_FINGERPRINT", "1") == "1"
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html", ".xml")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+HASH_LENGTH = 10
+HASHED_NAME = re.compile(r"^(?P<base>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$" % HASH_LENGTH)
+
+
+class AssetFingerprints:
+    """Empreintes des fichiers de static/, recalculées quand le fichier change (mtime/taille)."""
+
+    def __init__(self, directory=STATIC_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+    def digest(self, rel_path):
+        full_path = os.path.join(self.directory, rel_path)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._hashes.get(rel_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()[:HASH_LENGTH]
+        with self._lock:
+            self._hashes[rel_path] = (key, value)
+        return value
+
+    def url(self, rel_path):
+        rel_path = rel_path.lstrip("/")
+        digest = self.digest(rel_path) if STATIC_FINGERPRINT else None
+        if digest is None:
+            return f"/static/{rel_path}"
+        base, ext = os.path.splitext(rel_path)
+        return f"/static/{base}.{digest}{ext}"
+
+    def resolve(self, path):
+        """Retire l'empreinte d'un chemin demandé : (chemin réel, empreinte à jour ?)."""
+        match = HASHED_NAME.match(path)
+        if match is None:
+            return path, False
+        original = match.group("base") + match.group("ext")
+        digest = self.digest(original)
+        if digest is None:
+            return path, False
+        # Empreinte périmée (ancienne version de la page) : on sert le fichier actuel sans cache long.
+        return original, digest == match.group("hash")
+
+
+fingerprints = AssetFingerprints()
+
+
+def static_url(rel_path):
+    """URL empreintée d'un fichier de static/, pour les templates."""
+    return fingerprints.url(rel_path)
+
+
+def compressed_path(rel_path, digest, encoding):
+    suffix = "br" if encoding == "br" else "gz"
+    return os.path.join(PRECOMPRESSED_DIR, f"{rel_path}.{digest}.{suffix}")
+
+
+def is_compressible(rel_path):
+    return rel_path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def build_precompressed(verbose=False):
+    """Crée les variantes .gz/.br manquantes des fichiers compressibles. Renvoie le nombre créé."""
+    created = 0
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if not os.path.join(root, d).startswith(PRECOMPRESSED_DIR)]
+        for name in files:
+            rel_path = os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, "/")
+            if not is_compressible(rel_path):
+                continue
+            digest = fingerprints.digest(rel_path)
+            with open(os.path.join(STATIC_DIR, rel_path), "rb") as f:
+                data = None
+                for encoding in ("gzip", "br"):
+                    if encoding == "br" and brotli is None:
+                        continue
+                    target = compressed_path(rel_path, digest, encoding)
+                    if os.path.exists(target):
+                        continue
+                    if data is None:
+                        data = f.read()
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    payload = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+                    with open(target, "wb") as out:
+                        out.write(payload)
+                    created += 1
+                    if verbose:
+                        print(f"✅ {rel_path} ({encoding}) : {len(data)} -> {len(payload)} octets")
+    return created
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles qui comprend les URL empreintées, sert les variantes précompressées
+    et pose un Cache-Control immuable sur les URL dont l'empreinte est à jour."""
+
+    async def get_response(self, path, scope):
+        rel_path, fingerprinted = fingerprints.resolve(path)
+        response = None
+        if scope["method"] in ("GET", "HEAD") and is_compressible(rel_path):
+            response = self.precompressed_response(rel_path, scope)
+        if response is None:
+            response = await super().get_response(rel_path, scope)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL
+        if is_compressible(rel_path):
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def precompressed_response(self, rel_path, scope):
+        request_headers = Headers(scope=scope)
+        accepted = {part.split(";")[0].strip() for part in request_headers.get("accept-encoding", "").split(",")}
+        digest = fingerprints.digest(rel_path)
+        if digest is None:
+            return None
+        for encoding, header in (("br", "br"), ("gzip", "gzip")):
+            if encoding not in accepted:
+                continue
+            path = compressed_path(rel_path, digest, encoding)
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            media_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+            response = FileResponse(path, stat_result=stat_result, media_type=media_type,
+                                    headers={"Content-Encoding": header})
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
+
+
+if __name__ == "__main__":
+    count = build_precompressed(verbose=True)
+    print(f"✨ {count} variante(s) compressée(s) générée(s).")
@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+# Décrément conditionnel : la vérification et la mise à jour se font dans la même instruction,
+# il n'y a donc plus de fenêtre entre la lecture du stock et son écriture.
+RESERVE_SQL = text("UPDATE products SET stock = stock - :q WHERE id = :id AND stock >= :q")
+
+
+@dataclass
+class ReservationResult:
+    """Lignes réservées et lignes refusées faute de stock ({product_id: quantité})."""
+    reserved: dict = field(default_factory=dict)
+    failed: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def _normalize(lines):
+    if hasattr(lines, "items"):
+        lines = lines.items()
+    merged = {}
+    for product_id, quantity in lines:
+        if quantity > 0:
+            merged[int(product_id)] = merged.get(int(product_id), 0) + int(quantity)
+    return merged
+
+
+def reserve_stock(db, lines):
+    """Décrémente le stock de chaque ligne si la quantité est disponible.
+
+    `lines` est un dict {product_id: quantité} ou une liste de couples. Les lignes sont envoyées
+    en un seul `executemany` ; si une ligne échoue, on annule ce lot (savepoint) et on rejoue
+    ligne par ligne pour savoir lesquelles ont été refusées. Le commit reste à la charge de l'appelant.
+    """
+    lines = _normalize(lines)
+    result = ReservationResult()
+    if not lines:
+        return result
+
+    params = [{"id": product_id, "q": quantity} for product_id, quantity in lines.items()]
+    savepoint = db.begin_nested()
+    updated = db.execute(RESERVE_SQL, params).rowcount
+    if updated == len(params):
+        savepoint.commit()
+        result.reserved = lines
+        return result
+    savepoint.rollback()
+
+    # Chemin lent (stock insuffisant sur au moins une ligne) : une instruction par ligne.
+    for param in params:
+        if db.execute(RESERVE_SQL, param).rowcount == 1:
+            result.reserved[param["id"]] = param["q"]
+        else:
+            result.failed[param["id"]] = param["q"]
+    return result
+